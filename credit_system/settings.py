@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,11 +44,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the middleware too
+    'loans.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # After authentication, to allow staff users
+    'loans.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -87,6 +92,25 @@ DATABASES = {
     }
 }
 
+# Read replicas: comma-separated host[:port] entries sharing the primary's database and
+# credentials. view-loan, view-loans and check-eligibility read from them. Pointing one at
+# the primary's own host stands in for a replica locally.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['loans.routers.PrimaryReplicaRouter']
+
+# Seconds a customer's reads stay on the primary after a write; keep above replica lag
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -142,6 +166,95 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [],
 }
 
+# Cache Configuration
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_CACHE_URL', 'redis://redis:6379/1'),
+        'OPTIONS': {
+            'socket_connect_timeout': 0.5,
+            'socket_timeout': 0.5,
+        },
+    }
+}
+
+# Credit profile cache: in-process fallback size/TTL and how long to wait before retrying Redis
+CREDIT_CACHE = {
+    'local_maxsize': 10000,
+    'local_timeout': 30,
+    'retry_interval': 30,
+}
+
+# Shared cache of view-loan/view-loans payloads, keyed by the resource's version stamp.
+# Disabled when RESPONSE_CACHE_TIMEOUT is 0.
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 0))
+RESPONSE_CACHE = {
+    'local_maxsize': 1000,
+    'local_timeout': 30,
+    'retry_interval': 30,
+}
+
+# Idempotency-Key on create-loan: how long responses are replayed, and how long duplicates
+# wait for the in-flight request before a 409
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 10))
+IDEMPOTENCY_STORE = {
+    'retry_interval': 30,  # Seconds on the database fallback before retrying Redis
+}
+
+# Admission control (see loans.admission). Rate limits are (requests per minute, burst) token
+# buckets per customer and per client address; 0 per minute disables one. Load is shed per
+# priority once the moving average SQL query time passes its threshold in milliseconds.
+ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', 'False').lower() == 'true'
+RATE_LIMITS = {
+    'customer': (int(os.environ.get('RATE_LIMIT_CUSTOMER_PER_MINUTE', 120)),
+                 int(os.environ.get('RATE_LIMIT_CUSTOMER_BURST', 30))),
+    'client': (int(os.environ.get('RATE_LIMIT_CLIENT_PER_MINUTE', 1200)),
+               int(os.environ.get('RATE_LIMIT_CLIENT_BURST', 200))),
+}
+RATE_LIMIT_STORE = {
+    'local_maxsize': 100000,  # Buckets per process while Redis is down
+    'retry_interval': 30,
+}
+SHED_LATENCY_MS = {
+    'low': float(os.environ.get('SHED_LOW_PRIORITY_LATENCY_MS', 20)),
+    'normal': float(os.environ.get('SHED_NORMAL_PRIORITY_LATENCY_MS', 80)),
+}
+SHED_MAX_PROBABILITY = 0.9
+SHED_RETRY_AFTER = int(os.environ.get('SHED_RETRY_AFTER', 5))
+
+# Request profiling: requests carrying PROFILING_HEADER from staff users or PROFILING_INTERNAL_IPS
+# (addresses or networks) run under cProfile and are stored with their SQL. Off unless enabled.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_HEADER = 'X-Profile'
+PROFILING_INTERNAL_IPS = os.environ.get('PROFILING_INTERNAL_IPS', '127.0.0.1,::1').split(',')
+PROFILING_TOP_FUNCTIONS = 40  # Functions kept per profile for the admin
+PROFILING_KEEP = int(os.environ.get('PROFILING_KEEP', 200))  # Older profiles are deleted
+
+# Async views: requests per ASGI worker process that may hold a database connection at once.
+# Keep workers * this below Postgres max_connections.
+ASYNC_DB_CONCURRENCY = int(os.environ.get('ASYNC_DB_CONCURRENCY', 20))
+
+# Largest number of applications accepted by check-eligibility/batch/
+ELIGIBILITY_BATCH_MAX_SIZE = int(os.environ.get('ELIGIBILITY_BATCH_MAX_SIZE', 5000))
+
+# Largest number of customers accepted by register/batch/
+REGISTRATION_BATCH_MAX_SIZE = int(os.environ.get('REGISTRATION_BATCH_MAX_SIZE', 5000))
+
+# Tenures in months that offer/ quotes when the request names none
+OFFER_TENURES = [int(t) for t in os.environ.get('OFFER_TENURES', '6,12,18,24,36,48,60,84,120').split(',')]
+
+# view-loans/ keyset pagination: default and largest page size, and rows fetched per
+# round-trip when streaming
+VIEW_LOANS_PAGE_SIZE = int(os.environ.get('VIEW_LOANS_PAGE_SIZE', 100))
+VIEW_LOANS_MAX_PAGE_SIZE = int(os.environ.get('VIEW_LOANS_MAX_PAGE_SIZE', 1000))
+VIEW_LOANS_STREAM_CHUNK_SIZE = int(os.environ.get('VIEW_LOANS_STREAM_CHUNK_SIZE', 2000))
+
+# Data files read by the ingestion tasks (.xlsx, .csv or .parquet) and rows per batch
+CUSTOMER_DATA_PATH = os.environ.get('CUSTOMER_DATA_PATH', '/app/customer_data.xlsx')
+LOAN_DATA_PATH = os.environ.get('LOAN_DATA_PATH', '/app/loan_data.xlsx')
+INGEST_CHUNK_SIZE = int(os.environ.get('INGEST_CHUNK_SIZE', 5000))
+
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://redis:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
@@ -149,3 +262,33 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+# Run tasks (including ingest_data --parallel workflows) in-process, for local testing
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False').lower() == 'true'
+CELERY_TASK_EAGER_PROPAGATES = CELERY_TASK_ALWAYS_EAGER
+CELERY_BEAT_SCHEDULE = {
+    'expire-credit-summaries': {
+        'task': 'loans.tasks.expire_credit_summaries',
+        'schedule': crontab(hour=0, minute=5),
+    },
+    'requeue-loan-applications': {
+        'task': 'loans.tasks.requeue_loan_applications',
+        'schedule': 60.0,
+    },
+    'expire-idempotency-keys': {
+        'task': 'loans.tasks.expire_idempotency_keys',
+        'schedule': crontab(minute=15),
+    },
+    'rescore-customers': {
+        'task': 'loans.tasks.rescore_customers',
+        'schedule': crontab(hour=0, minute=30),
+    },
+}
+
+# Queued loan applications pending for longer than this are queued again, in case their
+# task was lost (e.g. the broker was down when they were submitted)
+LOAN_APPLICATION_REQUEUE_SECONDS = int(os.environ.get('LOAN_APPLICATION_REQUEUE_SECONDS', 120))
+
+# Nightly rescoring: customer ids per chunk read into memory, and snapshots checked
+# against the scalar scoring afterwards
+RESCORE_CHUNK_CUSTOMERS = int(os.environ.get('RESCORE_CHUNK_CUSTOMERS', 50000))
+RESCORE_SAMPLE_SIZE = int(os.environ.get('RESCORE_SAMPLE_SIZE', 1000))
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Customer, Loan
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from .models import Customer, IngestionRun, Loan, LoanApplication, RequestProfile
 
 
 @admin.register(Customer)
@@ -16,3 +20,79 @@ class LoanAdmin(admin.ModelAdmin):
                    'tenure', 'monthly_repayment', 'start_date', 'end_date']
     list_filter = ['start_date', 'end_date', 'interest_rate']
     search_fields = ['customer__first_name', 'customer__last_name']
+
+
+@admin.register(LoanApplication)
+class LoanApplicationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'customer', 'loan_amount', 'interest_rate', 'tenure', 'status',
+                   'loan', 'submitted_at', 'processed_at']
+    list_filter = ['status']
+    raw_id_fields = ['customer', 'loan']
+
+
+@admin.register(IngestionRun)
+class IngestionRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'path', 'status', 'rows_processed', 'total_rows',
+                   'rows_ok', 'rows_skipped', 'rows_failed', 'started_at', 'finished_at']
+    list_filter = ['kind', 'status']
+    readonly_fields = ['chunk_timings']
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Captured request profiles; top functions are ordered by cumulative time"""
+    list_display = ['id', 'created_at', 'method', 'path', 'status_code', 'duration_ms',
+                   'query_count', 'sql_time_ms', 'hottest_function', 'requested_by']
+    list_filter = ['view_name', 'status_code']
+    search_fields = ['path', 'requested_by']
+    fields = ['created_at', 'method', 'path', 'view_name', 'status_code', 'requested_by',
+              'duration_ms', 'query_count', 'sql_time_ms', 'stats_download', 'functions_table', 'queries_table']
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:profile_id>/stats/', self.admin_site.admin_view(self.download_stats),
+                 name='loans_requestprofile_stats'),
+        ] + super().get_urls()
+
+    def download_stats(self, request, profile_id):
+        """The raw pstats file, for pstats, snakeviz and the like"""
+        profile = get_object_or_404(RequestProfile, pk=profile_id)
+        response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="request-profile-{profile_id}.prof"'
+        return response
+
+    @admin.display(description='Slowest own time')
+    def hottest_function(self, obj):
+        if not obj.top_functions:
+            return ''
+        hottest = max(obj.top_functions, key=lambda row: row['tottime_ms'])
+        return f"{hottest['function']} ({hottest['tottime_ms']:.1f} ms)"
+
+    @admin.display(description='Stats file')
+    def stats_download(self, obj):
+        url = reverse('admin:loans_requestprofile_stats', args=[obj.pk])
+        return format_html('<a href="{}">request-profile-{}.prof</a>', url, obj.pk)
+
+    @admin.display(description='Top functions')
+    def functions_table(self, obj):
+        rows = format_html_join('', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>', (
+            (row['cumtime_ms'], row['tottime_ms'], row['calls'], row['function'])
+            for row in obj.top_functions
+        ))
+        return format_html(
+            '<table><tr><th>cumulative ms</th><th>own ms</th><th>calls</th><th>function</th></tr>{}</table>', rows
+        )
+
+    @admin.display(description='SQL')
+    def queries_table(self, obj):
+        rows = format_html_join('', '<tr><td>{}</td><td><code>{}</code></td></tr>', (
+            (query['time_ms'], query['sql']) for query in obj.queries
+        ))
+        return format_html('<table><tr><th>ms</th><th>statement</th></tr>{}</table>', rows)
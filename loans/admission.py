@@ -0,0 +1,246 @@
+"""Admission control: per-customer and per-client rate limits, and load shedding
+
+Every request takes a token from its client's bucket, and from its customer's
+bucket when the customer is known from the URL or body. Buckets live in Redis
+and are updated by one Lua script per request; while Redis is unreachable each
+process keeps its own buckets. An empty bucket gets a 429.
+
+Independently, each process tracks the mean SQL query time it observes. Once
+that passes a priority's threshold, a growing share of that priority's
+requests get a 503 before touching the database, so cheap-to-refuse
+eligibility checks make way for reads and writes. HIGH priority (writes) is
+never shed. Both answers carry Retry-After. Off unless ADMISSION_CONTROL_ENABLED.
+"""
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework import status
+from .metrics import DB_QUERY_LATENCY, REQUESTS_SHED, view_label
+
+logger = logging.getLogger(__name__)
+
+LOW = 'low'  # Eligibility checks and offers: read-only, retried cheaply by clients
+NORMAL = 'normal'  # Loan reads
+HIGH = 'high'  # Registrations and loan creation
+
+# KEYS are bucket keys; ARGV holds each bucket's refill rate per second and capacity.
+# Takes a token from every bucket or, if any is empty, from none and returns the
+# 1-based index of the first empty one with the seconds until it refills a token.
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local rate, capacity = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'at')
+    local level = tonumber(state[1]) or capacity
+    local at = tonumber(state[2]) or now
+    level = math.min(capacity, level + math.max(0, now - at) * rate)
+    if level < 1 then
+        return {i, tostring((1 - level) / rate)}
+    end
+    levels[i] = level
+end
+for i, key in ipairs(KEYS) do
+    local rate, capacity = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', levels[i] - 1, 'at', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000) + 1000)
+end
+return {0, '0'}
+"""
+
+
+class RateLimiter:
+    """Token buckets in Redis, with per-process buckets while Redis is down"""
+
+    def __init__(self, alias='default', local_maxsize=100000, retry_interval=30):
+        self.alias = alias
+        self.local_maxsize = local_maxsize
+        self.retry_interval = retry_interval
+        self._script = None
+        self._local = OrderedDict()  # Key -> (tokens, monotonic time of the last update)
+        self._lock = Lock()
+        self._down_until = 0.0
+
+    def take(self, buckets):
+        """Take a token from each (key, rate per second, capacity) bucket
+
+        Returns (None, 0) when admitted, else the key of an empty bucket and
+        the seconds until it has a token again.
+        """
+        if not buckets:
+            return None, 0.0
+        client = self._client()
+        if client is not None:
+            try:
+                index, wait = self._script(
+                    keys=[key for key, _, _ in buckets],
+                    args=[value for _, rate, capacity in buckets for value in (rate, capacity)],
+                    client=client,
+                )
+                return (buckets[int(index) - 1][0], float(wait)) if int(index) else (None, 0.0)
+            except Exception as e:
+                self._mark_down(e)
+        return self._local_take(buckets)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self._down_until = 0.0
+
+    def _client(self):
+        """A Redis client of the cache backend, or None while down or on other backends"""
+        if self._down_until > time.monotonic():
+            return None
+        get_client = getattr(getattr(caches[self.alias], '_cache', None), 'get_client', None)
+        if get_client is None:
+            return None
+        client = get_client(write=True)
+        if self._script is None:
+            self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        return client
+
+    def _mark_down(self, error):
+        self._down_until = time.monotonic() + self.retry_interval
+        logger.warning(f"Rate limit store unavailable, using per-process buckets: {error}")
+
+    def _local_take(self, buckets):
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, rate, capacity in buckets:
+                tokens, at = self._local.get(key, (capacity, now))
+                level = min(capacity, tokens + (now - at) * rate)
+                if level < 1:
+                    return key, (1 - level) / rate
+                levels.append(level)
+            for (key, _, _), level in zip(buckets, levels):
+                self._local[key] = (level - 1, now)
+                self._local.move_to_end(key)
+            while len(self._local) > self.local_maxsize:
+                self._local.popitem(last=False)
+        return None, 0.0
+
+
+class LatencyMonitor:
+    """Exponentially weighted mean time of the SQL queries this process ran"""
+
+    def __init__(self, weight=0.05):
+        self.weight = weight  # Share of each request's mean in the running value
+        self.seconds = 0.0
+
+    def observe(self, seconds, queries):
+        if not queries:
+            return
+        # Racing updates from other threads lose a sample at worst
+        self.seconds += self.weight * (seconds / queries - self.seconds)
+        DB_QUERY_LATENCY.set(self.seconds)
+
+    def clear(self):
+        self.seconds = 0.0
+
+
+limiter = RateLimiter(**getattr(settings, 'RATE_LIMIT_STORE', {}))
+db_latency = LatencyMonitor()
+
+
+def shed_probability(priority):
+    """Share of a priority's requests to refuse at the current query latency
+
+    Grows linearly from 0 at the priority's threshold, capped at
+    SHED_MAX_PROBABILITY so the admitted remainder keeps measuring whether the
+    database recovered.
+    """
+    threshold = settings.SHED_LATENCY_MS.get(priority)
+    if not threshold:
+        return 0.0
+    excess = db_latency.seconds * 1000 / threshold - 1
+    return min(max(excess, 0.0), settings.SHED_MAX_PROBABILITY)
+
+
+def rate_limit_buckets(request, customer_id):
+    client = request.META.get('REMOTE_ADDR') or 'unknown'
+    buckets = []
+    for kind, key in (('customer', customer_id), ('client', client)):
+        per_minute, burst = settings.RATE_LIMITS[kind]
+        if key is not None and per_minute:
+            buckets.append((f'ratelimit:{kind}:{key}', per_minute / 60, burst))
+    return buckets
+
+
+def admission_response(request, priority, customer_id):
+    """The 429 or 503 refusing this request, or None to admit it"""
+    if random.random() < shed_probability(priority):
+        REQUESTS_SHED.labels(view_label(request), priority, 'db_latency').inc()
+        return _refusal(status.HTTP_503_SERVICE_UNAVAILABLE, 'Service is shedding load, retry later',
+                        settings.SHED_RETRY_AFTER)
+
+    key, wait = limiter.take(rate_limit_buckets(request, customer_id))
+    if key is not None:
+        reason = key.split(':')[1] + '_rate_limit'
+        REQUESTS_SHED.labels(view_label(request), priority, reason).inc()
+        return _refusal(status.HTTP_429_TOO_MANY_REQUESTS, 'Too many requests, retry later', wait)
+    return None
+
+
+def _refusal(code, message, retry_after):
+    # A plain JSON response, returned from DRF views and async views alike
+    response = JsonResponse({'error': message}, status=code)
+    response['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def _customer_id(request, kwargs):
+    """The customer a request is about, from the URL or the JSON body; None when unknown"""
+    if 'customer_id' in kwargs:
+        return kwargs['customer_id']
+    if hasattr(request, 'data'):
+        data = request.data  # DRF request
+    else:
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return None
+    if isinstance(data, dict) and isinstance(data.get('customer_id'), int):
+        return data['customer_id']
+    return None
+
+
+def admitted(priority):
+    """Rate limit a view per client and customer, and shed it by priority under database load
+
+    Apply outside the other view decorators, so refused requests do no work.
+    Works on DRF views and async views.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if settings.ADMISSION_CONTROL_ENABLED:
+                    refusal = await sync_to_async(admission_response, thread_sensitive=False)(
+                        request, priority, _customer_id(request, kwargs)
+                    )
+                    if refusal is not None:
+                        return refusal
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.ADMISSION_CONTROL_ENABLED:
+                refusal = admission_response(request, priority, _customer_id(request, kwargs))
+                if refusal is not None:
+                    return refusal
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
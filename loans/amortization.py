@@ -0,0 +1,54 @@
+import numpy as np
+from .utils import calculate_monthly_installments
+
+SCHEDULE_COLUMNS = ['month', 'payment', 'principal', 'interest', 'balance']
+
+
+def amortization_schedule(loan_amount, tenure, interest_rate, monthly_installment=None,
+                          start=1, stop=None):
+    """Principal/interest split and outstanding balance for months start..stop"""
+    P = float(loan_amount)
+    r = float(interest_rate) / (12 * 100)  # Monthly interest rate
+    n = int(tenure)
+    if monthly_installment is None:
+        monthly_installment = calculate_monthly_installments([P], [n], [float(interest_rate)])[0]
+    emi = float(monthly_installment)
+    stop = min(n, stop or n)
+
+    months = np.arange(start, stop + 1, dtype=np.int64)
+    opening = np.maximum(_balance_after(P, r, emi, months - 1), 0.0)
+    interest = opening * r
+    payment = np.minimum(emi, opening + interest)
+    # The final instalment settles whatever rounding left outstanding
+    last = months == n
+    payment[last] = opening[last] + interest[last]
+    principal = payment - interest
+    closing = opening - principal
+
+    return {
+        'month': months,
+        'payment': np.round(payment, 2),
+        'principal': np.round(principal, 2),
+        'interest': np.round(interest, 2),
+        'balance': np.round(closing, 2),
+    }
+
+
+def iter_schedule_rows(loan_amount, tenure, interest_rate, monthly_installment=None, chunk_size=60):
+    """Yield schedule rows one at a time, computing them chunk_size months at once"""
+    for start in range(1, int(tenure) + 1, chunk_size):
+        chunk = amortization_schedule(
+            loan_amount, tenure, interest_rate, monthly_installment,
+            start=start, stop=start + chunk_size - 1
+        )
+        columns = [chunk[name].tolist() for name in SCHEDULE_COLUMNS]
+        for values in zip(*columns):
+            yield dict(zip(SCHEDULE_COLUMNS, values))
+
+
+def _balance_after(P, r, emi, months):
+    """Outstanding balance after the given numbers of payments (closed form)"""
+    if r == 0:
+        return P - emi * months
+    growth = (1 + r) ** months
+    return P * growth - emi * (growth - 1) / r
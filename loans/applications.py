@@ -0,0 +1,123 @@
+"""Loan decisions shared by create-loan and the queued loan applications
+
+create-loan decides an application inside the request. applications/ stores
+it as a LoanApplication and a Celery worker decides it later with the same
+code, taking each customer's pending applications strictly in submission order.
+"""
+import logging
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from .models import Customer, Loan, LoanApplication
+from .utils import calculate_monthly_installment, check_loan_eligibility
+
+logger = logging.getLogger(__name__)
+
+
+def apply_for_loan(customer, loan_amount, interest_rate, tenure):
+    """Check eligibility against committed state and create the loan if approved
+
+    Call inside a transaction holding the customer's row lock, so concurrent
+    applications cannot both pass the EMI check. Returns the new loan (None
+    when rejected) and its monthly installment (0 when rejected).
+    """
+    # Check eligibility against committed state, not the cache
+    is_eligible, credit_score, corrected_rate = check_loan_eligibility(
+        customer,
+        loan_amount,
+        interest_rate,
+        tenure,
+        use_cache=False
+    )
+    if not is_eligible:
+        return None, 0
+
+    # Calculate monthly installment
+    interest_rate_to_use = corrected_rate if corrected_rate else interest_rate
+    monthly_installment = calculate_monthly_installment(loan_amount, tenure, interest_rate_to_use)
+
+    # Create loan
+    start_date = date.today()
+    end_date = start_date + timedelta(days=tenure * 30)  # Approximate
+
+    loan = Loan.objects.create(  # type: ignore
+        customer=customer,
+        loan_amount=loan_amount,
+        tenure=tenure,
+        interest_rate=interest_rate_to_use,
+        monthly_repayment=Decimal(str(monthly_installment)),
+        emis_paid_on_time=0,  # Initialize to 0 for new loans
+        start_date=start_date,
+        end_date=end_date
+    )
+    return loan, monthly_installment
+
+
+def process_pending_applications(customer_id):
+    """Decide a customer's pending applications oldest first; returns how many were decided
+
+    Each application is decided in its own transaction under the customer row
+    lock, which also serializes workers racing on the same customer, so
+    applications are always decided in the order they were submitted.
+    """
+    decided = 0
+    while True:
+        with transaction.atomic():
+            customer = Customer.objects.select_for_update().filter(customer_id=customer_id).first()  # type: ignore
+            if customer is None:
+                return decided  # Deleted along with its applications
+            application = LoanApplication.objects.filter(  # type: ignore
+                customer=customer, status=LoanApplication.PENDING
+            ).order_by('id').first()
+            if application is None:
+                return decided
+            try:
+                with transaction.atomic():
+                    loan, monthly_installment = apply_for_loan(
+                        customer, application.loan_amount, application.interest_rate, application.tenure
+                    )
+            except Exception as e:
+                # Later applications are still decided; this one is not retried
+                logger.exception("Loan application %s failed", application.pk)
+                application.status = LoanApplication.FAILED
+                application.error = str(e)
+            else:
+                application.status = LoanApplication.APPROVED if loan else LoanApplication.REJECTED
+                application.loan = loan
+                application.monthly_installment = monthly_installment
+            application.processed_at = timezone.now()
+            application.save(update_fields=['status', 'loan', 'monthly_installment', 'error', 'processed_at'])
+        decided += 1
+
+
+def stale_application_customers(older_than):
+    """Customers with applications pending for longer than older_than, e.g. after a lost task"""
+    cutoff = timezone.now() - older_than
+    return list(
+        LoanApplication.objects.filter(  # type: ignore
+            status=LoanApplication.PENDING, submitted_at__lt=cutoff
+        ).values_list('customer_id', flat=True).distinct()
+    )
+
+
+def application_status_data(application):
+    """applications/<id>/ response body"""
+    decided = application.status in (LoanApplication.APPROVED, LoanApplication.REJECTED)
+    messages = {
+        LoanApplication.PENDING: 'Loan application is waiting to be processed',
+        LoanApplication.APPROVED: 'Loan approved successfully',
+        LoanApplication.REJECTED: 'Loan not approved due to low credit score or high current EMI',
+        LoanApplication.FAILED: 'Loan application could not be processed',
+    }
+    return {
+        'application_id': application.pk,
+        'customer_id': application.customer_id,
+        'status': application.status,
+        'loan_id': application.loan_id,
+        'loan_approved': application.status == LoanApplication.APPROVED if decided else None,
+        'message': messages[application.status],
+        'monthly_installment': application.monthly_installment,
+        'submitted_at': application.submitted_at,
+        'processed_at': application.processed_at,
+    }
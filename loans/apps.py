@@ -5,3 +5,6 @@ from typing import Literal
 class LoansConfig(AppConfig):
     default_auto_field: str = 'django.db.models.BigAutoField'
     name: str = 'loans'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,168 @@
+"""Async variants of the hot read endpoints, for the ASGI server
+
+DRF views are synchronous, so under ASGI each one occupies a worker thread for
+every database round-trip. These views use the async ORM instead and return the
+same bodies as their DRF counterparts, rendered with the same renderers.
+"""
+import asyncio
+import json
+from functools import wraps
+from itertools import islice
+from weakref import WeakKeyDictionary
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from .admission import LOW, NORMAL, admitted
+from .conditional import customer_loans_version, loan_version, versioned
+from .models import Loan
+from .renderers import FastJSONRenderer
+from .routers import achoose_replica, reads_from_replica, replica_reads
+from .serializers import LoanEligibilitySerializer, loan_detail_from_row, loan_detail_values
+from .utils import aget_credit_profile
+from .views import (
+    _customer_loan_rows,
+    _customer_loans_payload,
+    _loans_page_params,
+    _ndjson_lines,
+    _wants_stream,
+    eligibility_response_data,
+)
+
+
+_db_slots = WeakKeyDictionary()  # Event loop -> semaphore
+
+
+def bounded_db_access(view):
+    """Cap the requests per process that are using the database at once
+
+    Each in-flight async request runs its queries on its own thread and
+    connection, so without a cap a burst of connections exhausts Postgres'
+    max_connections. The connection is released before the slot is, rather than
+    by request_finished once the body is sent; streamed bodies keep theirs.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        slots = _db_slots.get(loop)
+        if slots is None:
+            slots = _db_slots[loop] = asyncio.Semaphore(settings.ASYNC_DB_CONCURRENCY)
+        async with slots:
+            response = await view(request, *args, **kwargs)
+            if not response.streaming:
+                await sync_to_async(_release_connections)()
+        return response
+    return wrapper
+
+
+def _release_connections():
+    """close_old_connections for this request's thread"""
+    for conn in connections.all(initialized_only=True):
+        # An enclosing transaction (ATOMIC_REQUESTS, TestCase) still needs it
+        if not conn.in_atomic_block:
+            conn.close_if_unusable_or_obsolete()
+
+
+@admitted(LOW)
+@bounded_db_access
+async def check_eligibility(request):
+    """Async check-eligibility; accepts a JSON body"""
+    if request.method != 'POST':
+        return _method_not_allowed(request, 'POST')
+    try:
+        payload = json.loads(request.body)
+    except ValueError as e:
+        return _json_response({'detail': f'JSON parse error - {e}'}, status.HTTP_400_BAD_REQUEST)
+
+    serializer = LoanEligibilitySerializer(data=payload)
+    if not serializer.is_valid():
+        return _json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data  # type: ignore
+
+    with replica_reads(await achoose_replica(customer_id=data['customer_id'])):  # type: ignore
+        profile = await aget_credit_profile(data['customer_id'])  # type: ignore
+    if profile is None:
+        return _json_response({'error': 'Customer not found'}, status.HTTP_404_NOT_FOUND)
+    return _json_response(eligibility_response_data(profile, data), status.HTTP_200_OK)
+
+
+# Requests are not cookie-authenticated, as with the DRF views
+check_eligibility.csrf_exempt = True  # type: ignore
+
+
+@admitted(NORMAL)
+@bounded_db_access
+@reads_from_replica('loan')
+@versioned('loan', loan_version)
+async def view_loan(request, loan_id):
+    """Async view-loan"""
+    if request.method != 'GET':
+        return _method_not_allowed(request, 'GET')
+    row = await loan_detail_values(Loan.objects.filter(loan_id=loan_id)).afirst()  # type: ignore
+    loan = loan_detail_from_row(row)
+    if loan is None:
+        return _fast_response({'error': 'Loan not found'}, status.HTTP_404_NOT_FOUND)
+    return _fast_response(loan, status.HTTP_200_OK)
+
+
+@admitted(NORMAL)
+@bounded_db_access
+@reads_from_replica('customer')
+@versioned('customer-loans', customer_loans_version)
+async def view_customer_loans(request, customer_id):
+    """Async view-loans, with the same paging and streaming parameters"""
+    if request.method != 'GET':
+        return _method_not_allowed(request, 'GET')
+    try:
+        cursor, page_size = _loans_page_params(request.GET)
+    except ValueError:
+        return _fast_response(
+            {'error': 'cursor and page_size must be positive integers'}, status.HTTP_400_BAD_REQUEST
+        )
+
+    rows = _customer_loan_rows(customer_id, cursor)
+    if _wants_stream(request.GET):
+        return await _stream_customer_loans(rows)
+
+    if page_size is not None:
+        rows = rows[:page_size + 1]
+    rows = [row async for row in rows]
+    if not rows:
+        return _fast_response({'error': 'Customer not found'}, status.HTTP_404_NOT_FOUND)
+    return _fast_response(_customer_loans_payload(rows, page_size), status.HTTP_200_OK)
+
+
+async def _stream_customer_loans(rows):
+    chunk_size = settings.VIEW_LOANS_STREAM_CHUNK_SIZE
+    # QuerySet.aiterator() evaluates values_list() querysets synchronously on
+    # Django 4.2, so chunks of the server-side cursor are fetched explicitly
+    rows = rows.iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    chunk = await next_chunk()
+    if not chunk:
+        return _fast_response({'error': 'Customer not found'}, status.HTTP_404_NOT_FOUND)
+
+    async def lines(chunk):
+        while chunk:
+            for line in _ndjson_lines(chunk):
+                yield line
+            chunk = await next_chunk()
+
+    return StreamingHttpResponse(lines(chunk), content_type='application/x-ndjson')
+
+
+def _json_response(data, status_code):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def _fast_response(data, status_code):
+    return HttpResponse(FastJSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def _method_not_allowed(request, allowed):
+    response = _json_response({'detail': f'Method "{request.method}" not allowed.'},
+                              status.HTTP_405_METHOD_NOT_ALLOWED)
+    response['Allow'] = allowed
+    return response
@@ -0,0 +1,185 @@
+import logging
+import time
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from threading import Lock
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def seconds_until_midnight_utc():
+    """Seconds left in the current UTC day"""
+    now = datetime.now(timezone.utc)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), timezone.utc)
+    return max(int((midnight - now).total_seconds()), 1)
+
+
+def credit_profile_key(customer_id, day=None):
+    """Cache key for a customer's credit profile on a given UTC day"""
+    return f"credit:profile:{customer_id}:{(day or date.today()).isoformat()}"
+
+
+class CreditCache:
+    """Redis-backed cache that falls back to an in-process LRU while Redis is down"""
+
+    def __init__(self, alias='default', local_maxsize=10000, local_timeout=30, retry_interval=30):
+        self.alias = alias
+        self.local_maxsize = local_maxsize
+        self.local_timeout = local_timeout  # Caps staleness of the per-process fallback
+        self.retry_interval = retry_interval
+        self.counters = Counter()
+        self._local = OrderedDict()
+        self._lock = Lock()
+        self._down_until = 0.0
+        self._pending_deletes = set()
+
+    def get(self, key):
+        value = _MISSING
+        shared = self._shared()
+        if shared is not None:
+            try:
+                value = shared.get(key, _MISSING)
+            except Exception as e:
+                self._mark_down(e)
+                value = self._local_get(key)
+        else:
+            value = self._local_get(key)
+
+        if value is _MISSING:
+            self.counters['misses'] += 1
+            return None
+        self.counters['hits'] += 1
+        return value
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = None
+        shared = self._shared()
+        if shared is not None:
+            try:
+                found = shared.get_many(keys)
+            except Exception as e:
+                self._mark_down(e)
+        if found is None:
+            found = {}
+            for key in keys:
+                value = self._local_get(key)
+                if value is not _MISSING:
+                    found[key] = value
+
+        self.counters['hits'] += len(found)
+        self.counters['misses'] += len(keys) - len(found)
+        return found
+
+    def set_many(self, values, timeout):
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set_many(values, timeout)
+                return
+            except Exception as e:
+                self._mark_down(e)
+        for key, value in values.items():
+            self._local_set(key, value, min(timeout, self.local_timeout))
+
+    def set(self, key, value, timeout):
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, value, timeout)
+                return
+            except Exception as e:
+                self._mark_down(e)
+        self._local_set(key, value, min(timeout, self.local_timeout))
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.delete_many(keys)
+                return
+            except Exception as e:
+                self._mark_down(e)
+        # Replayed against Redis once it is reachable again
+        with self._lock:
+            self._pending_deletes.update(keys)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+            self._pending_deletes.clear()
+        self._down_until = 0.0
+        self.counters.clear()
+
+    def stats(self):
+        total = self.counters['hits'] + self.counters['misses']
+        return {
+            'hits': self.counters['hits'],
+            'misses': self.counters['misses'],
+            'errors': self.counters['errors'],
+            'hit_ratio': self.counters['hits'] / total if total else 0.0,
+            'redis_available': self._down_until <= time.monotonic(),
+        }
+
+    def _shared(self):
+        """Return the shared backend, or None while it is marked down"""
+        if self._down_until > time.monotonic():
+            return None
+        backend = caches[self.alias]
+        if self._pending_deletes:
+            with self._lock:
+                pending, self._pending_deletes = self._pending_deletes, set()
+            try:
+                backend.delete_many(list(pending))
+            except Exception as e:
+                with self._lock:
+                    self._pending_deletes.update(pending)
+                self._mark_down(e)
+                return None
+        return backend
+
+    def _mark_down(self, error):
+        self.counters['errors'] += 1
+        self._down_until = time.monotonic() + self.retry_interval
+        logger.warning(f"Credit cache backend unavailable, using in-process cache: {error}")
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._local[key]
+                return _MISSING
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value, timeout):
+        with self._lock:
+            self._local[key] = (time.monotonic() + timeout, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_maxsize:
+                self._local.popitem(last=False)
+
+
+credit_cache = CreditCache(**getattr(settings, 'CREDIT_CACHE', {}))
+response_cache = CreditCache(**getattr(settings, 'RESPONSE_CACHE', {}))
+
+
+def invalidate_customer(customer_id):
+    """Drop every cached entry derived from a customer's loans"""
+    invalidate_customers([customer_id])
+
+
+def invalidate_customers(customer_ids):
+    """invalidate_customer for many customers in one round-trip"""
+    credit_cache.delete_many([credit_profile_key(customer_id) for customer_id in customer_ids])
@@ -0,0 +1,110 @@
+import asyncio
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework.response import Response
+from .cache import response_cache
+from .models import Customer, Loan
+
+
+def loan_version(loan_id):
+    """Query for when a loan's view-loan payload last changed; empty for an unknown loan
+
+    Every loan write resyncs the customer's current_debt, which moves
+    Customer.updated_at along with direct customer edits.
+    """
+    return Loan.objects.filter(loan_id=loan_id).values_list(  # type: ignore
+        'customer__updated_at', flat=True
+    )
+
+
+def customer_loans_version(customer_id):
+    """Query for when a customer's loan list last changed; empty for an unknown customer"""
+    return Customer.objects.filter(customer_id=customer_id).values_list(  # type: ignore
+        'updated_at', flat=True
+    )
+
+
+def versioned(kind, version):
+    """Conditional GET and shared caching for a read view keyed by one URL argument
+
+    The version stamp becomes the ETag and Last-Modified; matching requests get a
+    304 before the view runs. With RESPONSE_CACHE_TIMEOUT set, 200 payloads are
+    cached under the stamp, so writes that move the stamp retire old entries.
+    Works on DRF views and on plain async views returning rendered JSON.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key = (args or tuple(kwargs.values()))[0]
+                stamp = await version(key).afirst()
+                if stamp is None:
+                    return await view(request, *args, **kwargs)
+
+                etag, last_modified = _validators(kind, key, stamp)
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await _acached_view(view, request, etag, *args, **kwargs)
+                return _with_validators(request, response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = (args or tuple(kwargs.values()))[0]
+            stamp = version(key).first()
+            if stamp is None:
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = _validators(kind, key, stamp)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = _cached_view(view, request, etag, *args, **kwargs)
+            return _with_validators(request, response, etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def _validators(kind, key, stamp):
+    return quote_etag(f'{kind}-{key}-{int(stamp.timestamp() * 1000000)}'), int(stamp.timestamp())
+
+
+def _with_validators(request, response, etag, last_modified):
+    if request.method in ('GET', 'HEAD'):
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+def _cached_view(view, request, etag, *args, **kwargs):
+    timeout = settings.RESPONSE_CACHE_TIMEOUT
+    if not timeout or request.method != 'GET':
+        return view(request, *args, **kwargs)
+
+    cache_key = f'response:{request.get_full_path()}:{etag}'
+    data = response_cache.get(cache_key)
+    if data is not None:
+        return Response(data)
+    response = view(request, *args, **kwargs)
+    if isinstance(response, Response) and response.status_code == 200:
+        response_cache.set(cache_key, response.data, timeout)
+    return response
+
+
+async def _acached_view(view, request, etag, *args, **kwargs):
+    """_cached_view for async views, which cache the rendered body"""
+    timeout = settings.RESPONSE_CACHE_TIMEOUT
+    if not timeout or request.method != 'GET':
+        return await view(request, *args, **kwargs)
+
+    cache_key = f'response:{request.get_full_path()}:{etag}'
+    content = await sync_to_async(response_cache.get, thread_sensitive=False)(cache_key)
+    if content is not None:
+        return HttpResponse(content, content_type='application/json')
+    response = await view(request, *args, **kwargs)
+    if not response.streaming and response.status_code == 200:
+        await sync_to_async(response_cache.set, thread_sensitive=False)(cache_key, response.content, timeout)
+    return response
@@ -0,0 +1,198 @@
+"""Idempotency-Key support for write endpoints
+
+Keys belong to a caller: the customer named in the request body, or else the
+client address. The first request carrying a key runs the view, and its
+response is stored for IDEMPOTENCY_TTL seconds. Retries with the same key get
+that response back without running the view. Retries arriving while the first
+request is still running wait for its result.
+
+The first request marks itself in flight with a Postgres advisory lock on its
+connection. The lock lasts exactly as long as the request, however long the
+view waits on row locks, and Postgres drops it if the worker dies. Stored
+responses live in Redis, or in the idempotency_keys table while Redis is
+unreachable.
+"""
+import hashlib
+import json
+import logging
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05  # Seconds between checks for an in-flight request's result
+
+
+class IdempotencyStore:
+    """Stored responses in Redis, falling back to the database while Redis is down
+
+    Records are dicts with the request fingerprint and the response's status and data.
+    """
+
+    def __init__(self, alias='default', retry_interval=30):
+        self.alias = alias
+        self.retry_interval = retry_interval
+        self._down_until = 0.0
+
+    def get(self, key):
+        shared = self._shared()
+        if shared is not None:
+            try:
+                return shared.get(key)
+            except Exception as e:
+                self._mark_down(e)
+
+        row = IdempotencyKey.objects.filter(key=key, expires_at__gt=timezone.now()).first()  # type: ignore
+        if row is None:
+            return None
+        return {'fingerprint': row.fingerprint, 'status': row.status_code, 'data': row.response}
+
+    def complete(self, key, fingerprint, status_code, data, timeout):
+        """Store the response that replays of the key get"""
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, {'fingerprint': fingerprint, 'status': status_code, 'data': data}, timeout)
+                return
+            except Exception as e:
+                self._mark_down(e)
+
+        IdempotencyKey.objects.update_or_create(  # type: ignore
+            key=key,
+            defaults={
+                'fingerprint': fingerprint,
+                'status_code': status_code,
+                'response': data,
+                'expires_at': timezone.now() + timedelta(seconds=timeout),
+            }
+        )
+
+    def _shared(self):
+        if self._down_until > time.monotonic():
+            return None
+        return caches[self.alias]
+
+    def _mark_down(self, error):
+        self._down_until = time.monotonic() + self.retry_interval
+        logger.warning(f"Idempotency key store unavailable, using the database: {error}")
+
+
+store = IdempotencyStore(**getattr(settings, 'IDEMPOTENCY_STORE', {}))
+
+
+def request_fingerprint(request):
+    """SHA-256 of the parsed request body, independent of key order and whitespace"""
+    body = json.dumps(request.data, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def caller_identity(request):
+    """Whose keys a request uses: the customer named in the body, else the client address"""
+    data = request.data
+    if isinstance(data, dict) and data.get('customer_id') is not None:
+        return f"customer:{data['customer_id']}"
+    return f"client:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def idempotency_key(scope, caller, client_key):
+    """Store key for one caller's Idempotency-Key on an endpoint; fixed length whatever the inputs"""
+    digest = hashlib.sha256(f'{caller}\n{client_key}'.encode()).hexdigest()
+    return f'idempotency:{scope}:{digest}'
+
+
+@contextmanager
+def in_flight(key):
+    """Try to mark key in flight on this connection; yields whether this caller holds it"""
+    # Advisory locks take a signed 64-bit id
+    lock_id = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [lock_id])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [lock_id])
+
+
+def expire_idempotency_keys():
+    """Delete database-held keys past their expiry; returns how many"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()  # type: ignore
+    return deleted
+
+
+def idempotent(scope):
+    """Replay the stored response for requests repeating an Idempotency-Key header
+
+    scope namespaces the keys of one endpoint. Requests without the header run
+    as usual. Reusing a key with a different body gets a 422; a duplicate still
+    waiting after IDEMPOTENCY_WAIT_SECONDS gets a 409 to retry later. Responses
+    with a 5xx status are not stored, so their retries run again.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            client_key = request.headers.get(HEADER)
+            if client_key is None:
+                return view(request, *args, **kwargs)
+            if not client_key or len(client_key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'{HEADER} must be between 1 and {MAX_KEY_LENGTH} characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            key = idempotency_key(scope, caller_identity(request), client_key)
+            fingerprint = request_fingerprint(request)
+            deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+            while True:
+                record = store.get(key)
+                if record is not None:
+                    return _replay(record, fingerprint)
+                with in_flight(key) as acquired:
+                    if acquired:
+                        # The previous holder may have stored its response since the read
+                        record = store.get(key)
+                        if record is not None:
+                            return _replay(record, fingerprint)
+                        return _run_and_store(view, request, key, fingerprint, *args, **kwargs)
+                if time.monotonic() >= deadline:
+                    return Response(
+                        {'error': f'A request with this {HEADER} is still being processed'},
+                        status=status.HTTP_409_CONFLICT,
+                        headers={'Retry-After': '1'}
+                    )
+                time.sleep(POLL_INTERVAL)
+        return wrapper
+    return decorator
+
+
+def _replay(record, fingerprint):
+    if record['fingerprint'] != fingerprint:
+        return Response(
+            {'error': f'{HEADER} was already used for a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    return Response(record['data'], status=record['status'], headers={'Idempotent-Replayed': 'true'})
+
+
+def _run_and_store(view, request, key, fingerprint, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if isinstance(response, Response) and response.status_code < 500:
+        try:
+            store.complete(key, fingerprint, response.status_code, response.data, settings.IDEMPOTENCY_TTL)
+        except Exception:
+            # The view's work is committed either way; only replays are lost
+            logger.exception("Could not store the response for %s", key)
+    return response
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from loans.models import Loan
+
+ENDPOINTS = ['view-loan', 'view-loans', 'check-eligibility']
+
+
+class Command(BaseCommand):
+    help = 'Compare latency of the sync (gunicorn/WSGI) and async (uvicorn/ASGI) servers under many concurrent connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync-url', default='http://localhost:8000',
+                            help='Base URL of the WSGI server, serving /loans/...')
+        parser.add_argument('--async-url', default='http://localhost:8001',
+                            help='Base URL of the ASGI server, serving /loans/async/...')
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='view-loan')
+        parser.add_argument('--connections', type=int, default=500, help='Concurrent connections')
+        parser.add_argument('--seconds', type=float, default=15.0, help='Duration of each run')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+
+    def handle(self, *args, **options):
+        targets = list(Loan.objects.values_list('loan_id', 'customer_id')[:1000])  # type: ignore
+        if not targets:
+            raise CommandError('No loans to request; ingest or seed data first')
+
+        self.stdout.write(
+            f"{options['endpoint']}, {options['connections']} connections, {options['seconds']:.0f}s per server"
+        )
+        self.stdout.write(
+            f"{'server':<8} {'requests':>9} {'req/s':>8} {'errors':>7} "
+            f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for name, base_url, prefix in [
+            ('sync', options['sync_url'], '/loans/'),
+            ('async', options['async_url'], '/loans/async/'),
+        ]:
+            requests = [self.build_request(options['endpoint'], prefix, *target) for target in targets]
+            latencies, errors, elapsed = asyncio.run(self.run(base_url, requests, options))
+            self.report(name, latencies, errors, elapsed)
+
+    def build_request(self, endpoint, prefix, loan_id, customer_id):
+        """(method, path, body) for one request to the endpoint"""
+        if endpoint == 'view-loan':
+            return 'GET', f'{prefix}view-loan/{loan_id}/', None
+        if endpoint == 'view-loans':
+            return 'GET', f'{prefix}view-loans/{customer_id}/', None
+        body = json.dumps({'customer_id': customer_id, 'loan_amount': 100000,
+                           'interest_rate': 12, 'tenure': 24}).encode()
+        return 'POST', f'{prefix}check-eligibility/', body
+
+    async def run(self, base_url, requests, options):
+        url = urlsplit(base_url)
+        host, port = url.hostname, url.port or 80
+        deadline = time.perf_counter() + options['seconds']
+        latencies, errors = [], 0
+
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    code = await asyncio.wait_for(
+                        self.send(host, port, *random.choice(requests)), options['timeout']
+                    )
+                except (OSError, asyncio.TimeoutError, ValueError):
+                    code = None
+                if code is not None and code < 400:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+                    if code is None:
+                        await asyncio.sleep(0.05)  # Back off from refused connections
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['connections'])))
+        return latencies, errors, time.perf_counter() - started
+
+    async def send(self, host, port, method, path, body):
+        """One request on a fresh connection, as the sync gunicorn worker closes each one"""
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            head = f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n'
+            if body is not None:
+                head += f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+            writer.write(head.encode() + b'\r\n' + (body or b''))
+            await writer.drain()
+            response = await reader.read()
+            return int(response.split(b' ', 2)[1])
+        finally:
+            writer.close()
+
+    def report(self, name, latencies, errors, elapsed):
+        if len(latencies) < 2:
+            self.stdout.write(f'{name:<8} {len(latencies):>9} {"":>8} {errors:>7}  too few successful requests')
+            return
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f'{name:<8} {len(latencies):>9,} {len(latencies) / elapsed:>8,.0f} {errors:>7,} '
+            f'{quantiles[49] * 1000:>8.1f} {quantiles[89] * 1000:>8.1f} {quantiles[98] * 1000:>8.1f} '
+            f'{max(latencies) * 1000:>8.1f}'
+        )
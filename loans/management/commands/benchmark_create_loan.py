@@ -0,0 +1,133 @@
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connections
+from rest_framework.test import APIRequestFactory
+from loans.models import Customer
+from loans.views import create_loan
+
+PHONE_PREFIX = '0'  # No real mobile number starts with 0, so seeded ones never clash
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent create-loan requests to check per-customer serialization and throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--same-customer', type=int, default=32,
+                            help='Simultaneous applications for one customer')
+        parser.add_argument('--customers', type=int, default=200,
+                            help='Distinct customers in the throughput run')
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Applications in the throughput run')
+        parser.add_argument('--url', help='POST to a running server (e.g. http://localhost:8000/loans/create-loan/) '
+                                          'instead of calling the view in-process')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded customers and loans')
+
+    def handle(self, *args, **options):
+        self.url = options['url']
+        self.factory = APIRequestFactory()
+        self.run_token = random.randrange(10 ** 6)
+        self.seeded = []  # Ids of the customers this run created; only these are removed
+        try:
+            self.same_customer(options['same_customer'])
+            self.throughput(options['customers'], options['requests'], options['threads'])
+        finally:
+            if not options['keep']:
+                Customer.objects.filter(customer_id__in=self.seeded).delete()  # type: ignore
+
+    def same_customer(self, count):
+        """Every application alone fits the EMI headroom, but only one of them together"""
+        customer = self.seed(1)[0]
+        payload = {'customer_id': customer.customer_id, 'loan_amount': 337000,
+                   'interest_rate': 12, 'tenure': 12}
+        barrier = threading.Barrier(count)
+
+        def apply():
+            barrier.wait()
+            return self.post(payload)
+
+        with ThreadPoolExecutor(count) as pool:
+            results = list(pool.map(lambda _: apply(), range(count)))
+        approved = sum(1 for code, body, _ in results if code == 201 and body.get('loan_approved'))
+
+        emis = sum(
+            (loan.monthly_repayment for loan in customer.loans.all()), Decimal('0')  # type: ignore
+        )
+        limit = customer.monthly_salary * Decimal('0.5')
+        self.stdout.write(f'{count} simultaneous applications for customer {customer.customer_id}:')
+        self.stdout.write(f'  approved: {approved}, total EMI {emis} of {limit} allowed')
+        if emis > limit:
+            self.stderr.write('  OVER-APPROVED: EMIs exceed 50% of salary')
+        else:
+            self.stdout.write('  no over-approval')
+
+    def throughput(self, customer_count, count, threads):
+        customers = self.seed(customer_count)
+        # Small loans keep most applications approved, so each one writes a loan
+        payloads = [
+            {'customer_id': customers[i % customer_count].customer_id, 'loan_amount': 10000,
+             'interest_rate': 14, 'tenure': 12}
+            for i in range(count)
+        ]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(self.post, payloads))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for _, _, latency in results)
+        codes = {}
+        for code, _, _ in results:
+            codes[code] = codes.get(code, 0) + 1
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(f'{count} applications over {customer_count} customers, {threads} threads:')
+        self.stdout.write(f'  {count / elapsed:,.0f} requests/sec, status codes {codes}')
+        self.stdout.write(
+            f'  latency p50 {quantiles[49] * 1000:.1f} ms, p95 {quantiles[94] * 1000:.1f} ms, '
+            f'p99 {quantiles[98] * 1000:.1f} ms'
+        )
+
+    def seed(self, count):
+        start = len(self.seeded)
+        # 13 digits: the prefix, this run's token and a per-run counter
+        customers = Customer.objects.bulk_create([  # type: ignore
+            Customer(
+                first_name='Load', last_name=f'Test {start + i}', age=35,
+                phone_number=f'{PHONE_PREFIX}{self.run_token:06d}{start + i:06d}',
+                monthly_salary=100000, approved_limit=3600000,
+            )
+            for i in range(count)
+        ])
+        self.seeded.extend(customer.customer_id for customer in customers)
+        return customers
+
+    def post(self, payload):
+        started = time.perf_counter()
+        try:
+            if self.url:
+                code, body = self.post_http(payload)
+            else:
+                response = create_loan(self.factory.post('/loans/create-loan/', payload, format='json'))
+                code, body = response.status_code, response.data
+        finally:
+            # Worker threads each hold their own connection
+            connections.close_all()
+        return code, body, time.perf_counter() - started
+
+    def post_http(self, payload):
+        request = urllib.request.Request(
+            self.url, data=json.dumps(payload).encode(),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b'{}')
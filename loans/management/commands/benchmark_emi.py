@@ -0,0 +1,63 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from loans.amortization import amortization_schedule
+from loans.utils import calculate_monthly_installment, calculate_monthly_installments
+
+
+class Command(BaseCommand):
+    help = 'Compare the scalar EMI/amortization path with the vectorized engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100000, help='Number of loans to price')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing runs per path (best is reported)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        size, repeat = options['size'], options['repeat']
+        rng = np.random.default_rng(options['seed'])
+        amounts = np.round(rng.uniform(10000, 5000000, size), 2)
+        tenures = rng.integers(6, 361, size)
+        rates = np.round(rng.uniform(5, 24, size), 2)
+        terms = list(zip(amounts.tolist(), tenures.tolist(), rates.tolist()))
+
+        scalar = self.best_of(repeat, lambda: [calculate_monthly_installment(*t) for t in terms])
+        vector = self.best_of(repeat, lambda: calculate_monthly_installments(amounts, tenures, rates))
+        self.report(f'EMI for {size} loans', scalar, vector)
+
+        emis = calculate_monthly_installments(amounts, tenures, rates)
+        mismatches = sum(
+            a != calculate_monthly_installment(*t) for a, t in zip(emis.tolist(), terms)
+        )
+        self.stdout.write(f'  EMI mismatches vs scalar: {mismatches}')
+
+        scalar = self.best_of(repeat, lambda: self.scalar_schedule(5000000, 360, 12.5))
+        vector = self.best_of(repeat, lambda: amortization_schedule(5000000, 360, 12.5))
+        self.report('360-month amortization schedule', scalar, vector)
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def report(self, label, scalar, vector):
+        self.stdout.write(label)
+        self.stdout.write(f'  scalar:     {scalar * 1000:10.3f} ms')
+        self.stdout.write(f'  vectorized: {vector * 1000:10.3f} ms  ({scalar / vector:.1f}x)')
+
+    def scalar_schedule(self, amount, tenure, rate):
+        """Month-by-month loop, as a scalar implementation would build it"""
+        emi = calculate_monthly_installment(amount, tenure, rate)
+        r = rate / (12 * 100)
+        balance = float(amount)
+        rows = []
+        for month in range(1, tenure + 1):
+            interest = balance * r
+            payment = balance + interest if month == tenure else min(emi, balance + interest)
+            balance -= payment - interest
+            rows.append((month, round(payment, 2), round(payment - interest, 2),
+                         round(interest, 2), round(balance, 2)))
+        return rows
@@ -0,0 +1,133 @@
+import re
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from loans.models import Loan
+from loans.utils import credit_score_aggregates
+
+EXECUTION_TIME = re.compile(r'Execution Time: ([\d.]+) ms')
+
+
+class Command(BaseCommand):
+    help = 'Seed a large loan table and compare EXPLAIN ANALYZE of hot queries with and without the hot-path indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=20000, help='Customers to seed')
+        parser.add_argument('--loans-per-customer', type=int, default=50, help='Loans seeded per customer')
+        parser.add_argument('--repeat', type=int, default=5, help='EXPLAIN ANALYZE runs per query (best is reported)')
+        parser.add_argument('--plans', action='store_true', help='Print the full plans')
+
+    def handle(self, *args, **options):
+        # The queries run against a temporary copy that shadows the loans table in
+        # this session only, so the real table is never locked or written to
+        with transaction.atomic():
+            hot_indexes = self.create_scratch_table()
+            self.seed(options['customers'], options['loans_per_customer'])
+            customer_id = options['customers'] // 2 + 1
+            batch = list(range(1, min(options['customers'], 1000) + 1))
+
+            before = self.explain_all(customer_id, batch, options)
+            with connection.cursor() as cursor:
+                for definition in hot_indexes:
+                    cursor.execute(definition)
+                cursor.execute(f'ANALYZE {Loan._meta.db_table}')  # type: ignore
+            after = self.explain_all(customer_id, batch, options)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'query':<28} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+        for name in after:
+            (before_ms, before_plan), (after_ms, after_plan) = before[name], after[name]
+            self.stdout.write(f'{name:<28} {before_ms:>10.3f} {after_ms:>10.3f} {before_ms / after_ms:>7.1f}x')
+            self.stdout.write(f'  before: {self.scan_node(before_plan)}')
+            self.stdout.write(f'  after:  {self.scan_node(after_plan)}')
+            if options['plans']:
+                for label, plan in (('before', before_plan), ('after', after_plan)):
+                    self.stdout.write(f'  --- {label} ---')
+                    for line in plan:
+                        self.stdout.write(f'  {line}')
+        self.stdout.write(
+            'Note: the seeded rows are never vacuumed, so covering-index reads still visit the heap; '
+            'on autovacuumed tables they can run as index-only scans.'
+        )
+
+    def create_scratch_table(self):
+        """Create an empty temporary loans table with all but the hot-path indexes
+
+        Returns the statements creating the hot-path indexes on it, taken from the
+        real table's definitions.
+        """
+        table = Loan._meta.db_table  # type: ignore
+        hot = {index.name for index in Loan._meta.indexes}  # type: ignore
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT current_schema()')
+            schema = cursor.fetchone()[0]
+            cursor.execute('SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = %s AND tablename = %s',
+                           [schema, table])
+            indexes = cursor.fetchall()
+            cursor.execute(f'CREATE TEMP TABLE {table} (LIKE {schema}.{table} INCLUDING DEFAULTS) ON COMMIT DROP')
+            # Temporary tables come first on the search path, so unqualified queries read the copy
+            definitions = {name: definition.replace(f' ON {schema}.{table} ', f' ON pg_temp.{table} ')
+                           for name, definition in indexes}
+            for name, definition in definitions.items():
+                if name not in hot:
+                    cursor.execute(definition)
+        return [definition for name, definition in definitions.items() if name in hot]
+
+    def seed(self, customers, loans_per_customer):
+        """Bulk insert synthetic loans of customers 1 to customers into the scratch table
+
+        Loans are assigned to random customers, so each customer's rows are spread
+        over the heap as they are when loans accumulate over time.
+        """
+        self.stdout.write(f'Seeding {customers * loans_per_customer} loans of {customers} customers...')
+        loan_table = Loan._meta.db_table  # type: ignore
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT setseed(0.42)')
+            cursor.execute(f"""
+                INSERT INTO {loan_table} (loan_id, customer_id, loan_amount, tenure, interest_rate,
+                                          monthly_repayment, emis_paid_on_time, start_date, end_date,
+                                          created_at)
+                SELECT n, 1 + (random() * %s)::int, round((10000 + random() * 990000)::numeric, 2),
+                       tenure, 12, round((500 + random() * 40000)::numeric, 2), tenure / 2,
+                       start_date, start_date + tenure * 30, now()
+                FROM (
+                    SELECT n, (6 + random() * 114)::int AS tenure,
+                           DATE '2015-01-01' + (random() * 4000)::int AS start_date
+                    FROM generate_series(1, %s) AS n
+                ) AS generated
+            """, [customers - 1, customers * loans_per_customer])
+            cursor.execute(f'ANALYZE {loan_table}')
+
+    def explain_all(self, customer_id, batch, options):
+        today = date.today()
+        loans = Loan.objects.all()  # type: ignore
+        queries = {
+            'active EMIs and debt': loans.filter(customer_id=customer_id, end_date__gt=today)
+            .values('customer_id').annotate(emi=Sum('monthly_repayment'), debt=Sum('loan_amount')),
+            'current-year loan count': loans.filter(
+                customer_id=customer_id,
+                start_date__gte=date(today.year, 1, 1), start_date__lt=date(today.year + 1, 1, 1),
+            ).values('customer_id').annotate(count=Count('loan_id')),
+            'score aggregates': loans.filter(customer_id=customer_id)
+            .values('customer_id').annotate(**credit_score_aggregates(today)),
+            # Shape of the nightly expiry query for a batch of summaries
+            'expired loans (batch)': loans.filter(
+                customer_id__in=batch, end_date__gt=today - timedelta(days=30), end_date__lte=today,
+            ).values('customer_id').annotate(debt=Sum('loan_amount'), emi=Sum('monthly_repayment')),
+        }
+        return {name: self.explain(queryset, options['repeat']) for name, queryset in queries.items()}
+
+    def scan_node(self, plan):
+        """The plan line that reads the loans table"""
+        line = next((line for line in plan if 'Scan' in line), plan[0])
+        return line.strip().lstrip('-> ').split('  (')[0]
+
+    def explain(self, queryset, repeat):
+        best = None
+        for _ in range(repeat):
+            plan = queryset.order_by().explain(analyze=True, buffers=True).splitlines()
+            ms = float(EXECUTION_TIME.search('\n'.join(plan)).group(1))
+            if best is None or ms < best[0]:
+                best = (ms, plan)
+        return best
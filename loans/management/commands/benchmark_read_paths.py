@@ -0,0 +1,89 @@
+import time
+from datetime import date
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from loans.models import Customer, Loan
+from loans.serializers import CustomerLoanSerializer, LoanDetailSerializer
+from loans.views import view_customer_loans, view_loan
+
+
+@api_view(['GET'])
+def serializer_view_loan(request, loan_id):
+    """The ModelSerializer read path view-loan used before the .values() fast path"""
+    try:
+        loan = Loan.objects.select_related('customer').get(loan_id=loan_id)  # type: ignore
+        return Response(LoanDetailSerializer(loan).data, status=status.HTTP_200_OK)
+    except Loan.DoesNotExist:  # type: ignore
+        return Response({'error': 'Loan not found'}, status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(['GET'])
+def serializer_view_customer_loans(request, customer_id):
+    """The ModelSerializer read path view-loans used before the .values() fast path"""
+    try:
+        customer = Customer.objects.get(customer_id=customer_id)  # type: ignore
+        loans = Loan.objects.filter(customer=customer).order_by('loan_id')  # type: ignore
+        return Response(CustomerLoanSerializer(loans, many=True).data, status=status.HTTP_200_OK)
+    except Customer.DoesNotExist:  # type: ignore
+        return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
+
+
+class Command(BaseCommand):
+    help = 'Compare requests/sec of the serializer and .values() read paths for view-loan and view-loans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=200, help='Loans seeded for the view-loans customer')
+        parser.add_argument('--seconds', type=float, default=3.0, help='Time spent on each path')
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        # Seeded rows are rolled back at the end
+        with transaction.atomic():
+            customer, loan_id = self.seed(options['loans'])
+            cases = [
+                ('view-loan', serializer_view_loan, view_loan, loan_id,
+                 factory.get(f'/loans/view-loan/{loan_id}/')),
+                (f"view-loans ({options['loans']} loans)", serializer_view_customer_loans,
+                 view_customer_loans, customer.customer_id,
+                 factory.get(f'/loans/view-loans/{customer.customer_id}/')),
+            ]
+            self.stdout.write(f"{'endpoint':<24} {'serializer req/s':>17} {'values req/s':>13} {'speedup':>8}  identical")
+            for name, old_view, new_view, key, request in cases:
+                old_body, old_rate = self.measure(old_view, request, key, options['seconds'])
+                new_body, new_rate = self.measure(new_view, request, key, options['seconds'])
+                self.stdout.write(
+                    f'{name:<24} {old_rate:>17,.0f} {new_rate:>13,.0f} {new_rate / old_rate:>7.1f}x  '
+                    f'{old_body == new_body}'
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        customer = Customer.objects.create(  # type: ignore
+            first_name='Bench', last_name='Reader', age=40, phone_number='B-read-0001',
+            monthly_salary=150000, approved_limit=5400000
+        )
+        loans = Loan.objects.bulk_create([  # type: ignore
+            Loan(
+                customer=customer, loan_amount=Decimal(100000 + i), tenure=60,
+                interest_rate=Decimal('11.25'), monthly_repayment=Decimal('2187.50'),
+                emis_paid_on_time=i % 60, start_date=date(2020, 1, 1), end_date=date(2025, 1, 1)
+            )
+            for i in range(count)
+        ])
+        return customer, loans[0].loan_id
+
+    def measure(self, view, request, key, seconds):
+        """Run the view through DRF, rendering included, for the given time"""
+        count, body = 0, None
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            response = view(request, key)
+            body = response.render().content
+            count += 1
+        return body, count / (time.perf_counter() - started)
@@ -0,0 +1,145 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.db import connection
+from loans.models import CreditScoreSnapshot, Customer, CustomerCreditSummary, Loan, LoanApplication
+from loans.summaries import rebuild_credit_summaries
+from loans.tasks import reset_id_sequences
+
+PHONE_PREFIX = '5'  # Real mobile numbers start with 6-9, so generated ones never clash
+
+FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Krishna', 'Ishaan', 'Rohan',
+    'Ananya', 'Diya', 'Aadhya', 'Saanvi', 'Pari', 'Anika', 'Navya', 'Myra', 'Sara', 'Priya',
+]
+LAST_NAMES = [
+    'Sharma', 'Verma', 'Patel', 'Reddy', 'Nair', 'Iyer', 'Gupta', 'Singh', 'Kumar', 'Das',
+    'Mehta', 'Joshi', 'Rao', 'Chopra', 'Bose', 'Kapoor', 'Malhotra', 'Pillai', 'Shetty', 'Khan',
+]
+
+
+class Command(BaseCommand):
+    help = 'Bulk generate realistic customers and loans for load testing (e.g. 1M customers, 10M loans)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=100000, help='Customers to generate')
+        parser.add_argument('--loans', type=int, default=1000000, help='Loans to generate')
+        parser.add_argument('--batch-size', type=int, default=500000, help='Rows per INSERT statement')
+        parser.add_argument('--summary-batch-size', type=int, default=20000,
+                            help='Customers per credit summary rebuild')
+        parser.add_argument('--no-summaries', action='store_true',
+                            help='Leave credit summaries to be built lazily on first read')
+        parser.add_argument('--seed', type=float, default=0.42, help='Random seed in [-1, 1] for repeatable data')
+        parser.add_argument('--delete', action='store_true', help='Remove previously generated data and exit')
+
+    def handle(self, *args, **options):
+        if options['delete']:
+            return self.delete()
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT setseed(%s)', [options['seed']])
+            first_id = self.max_id(cursor, Customer, 'customer_id') + 1
+            self.generate('customers', options['customers'], options['batch_size'],
+                          lambda start, count: self.insert_customers(cursor, first_id + start, count))
+            if options['customers']:
+                loan_offset = self.max_id(cursor, Loan, 'loan_id')
+                self.generate('loans', options['loans'], options['batch_size'],
+                              lambda start, count: self.insert_loans(
+                                  cursor, loan_offset + start, count, first_id, options['customers']))
+            cursor.execute(f'ANALYZE {Customer._meta.db_table}')  # type: ignore
+            cursor.execute(f'ANALYZE {Loan._meta.db_table}')  # type: ignore
+        reset_id_sequences(Customer, Loan)
+
+        if options['customers'] and not options['no_summaries']:
+            last_id = first_id + options['customers'] - 1
+            self.generate('credit summaries', options['customers'], options['summary_batch_size'],
+                          lambda start, count: rebuild_credit_summaries(
+                              range(first_id + start, min(first_id + start + count, last_id + 1))))
+
+    def generate(self, label, total, batch_size, insert):
+        started = time.perf_counter()
+        for start in range(0, total, batch_size):
+            count = min(batch_size, total - start)
+            insert(start, count)
+            done = start + count
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{label}: {done:,}/{total:,} ({done / elapsed:,.0f} rows/sec)')
+        if total:
+            self.stdout.write(self.style.SUCCESS(
+                f'Generated {total:,} {label} in {time.perf_counter() - started:.1f}s'
+            ))
+
+    def max_id(self, cursor, model, column):
+        cursor.execute(f'SELECT COALESCE(MAX({column}), 0) FROM {model._meta.db_table}')
+        return cursor.fetchone()[0]
+
+    def insert_customers(self, cursor, first_id, count):
+        # Salaries are log-uniform between 15k and ~180k; the limit follows register's rule
+        cursor.execute(f"""
+            INSERT INTO {Customer._meta.db_table} (customer_id, first_name, last_name, age, phone_number,
+                                                   monthly_salary, approved_limit, current_debt,
+                                                   created_at, updated_at)
+            SELECT id, first_name, last_name, age, %s || lpad(id::text, 9, '0'),
+                   salary, round(36 * salary / 100000) * 100000, 0, now(), now()
+            FROM (
+                SELECT id,
+                       (%s::text[])[1 + floor(random() * %s)::int] AS first_name,
+                       (%s::text[])[1 + floor(random() * %s)::int] AS last_name,
+                       21 + floor(random() * 45)::int AS age,
+                       round(15000 * exp(random() * 2.5) / 1000) * 1000 AS salary
+                FROM generate_series(%s, %s) AS id
+            ) AS generated
+        """, [PHONE_PREFIX, FIRST_NAMES, len(FIRST_NAMES), LAST_NAMES, len(LAST_NAMES),
+              first_id, first_id + count - 1])
+
+    def insert_loans(self, cursor, first_loan_id, count, first_customer_id, customers):
+        """Loans spread randomly over the generated customers, with EMIs from the real formula"""
+        days = (date.today() - date(2015, 1, 1)).days
+        cursor.execute(f"""
+            INSERT INTO {Loan._meta.db_table} (loan_id, customer_id, loan_amount, tenure, interest_rate,
+                                               monthly_repayment, emis_paid_on_time, start_date, end_date,
+                                               created_at)
+            SELECT loan_id, customer_id, amount, tenure, rate,
+                   round(amount * (rate / 1200) * power(1 + rate / 1200, tenure)
+                         / (power(1 + rate / 1200, tenure) - 1), 2),
+                   floor(tenure * (0.5 + random() * 0.5))::int,
+                   start_date, start_date + tenure * 30, now()
+            FROM (
+                SELECT %s + n AS loan_id,
+                       %s + floor(random() * %s)::int AS customer_id,
+                       round((10000 + power(random(), 2) * 1990000)::numeric, -3) AS amount,
+                       6 * (1 + floor(random() * 20)::int) AS tenure,
+                       round((8 + random() * 12)::numeric, 2) AS rate,
+                       DATE '2015-01-01' + floor(random() * %s)::int AS start_date
+                FROM generate_series(1, %s) AS n
+            ) AS generated
+        """, [first_loan_id, first_customer_id, customers, days, count])
+
+    def delete(self):
+        # Only numbers in the exact generated form, which encodes the customer's own id;
+        # a real number that merely starts with the prefix never matches
+        generated = (
+            f"SELECT customer_id FROM {Customer._meta.db_table} "  # type: ignore
+            f"WHERE phone_number = %s || lpad(customer_id::text, 9, '0')"
+        )
+        pattern = [PHONE_PREFIX]
+        # Set-based deletes; the ORM would cascade row by row through the loan signals
+        with connection.cursor() as cursor:
+            # Applications reference loans as well as customers
+            cursor.execute(
+                f'DELETE FROM {LoanApplication._meta.db_table} WHERE customer_id IN ({generated})',  # type: ignore
+                pattern
+            )
+            cursor.execute(f'DELETE FROM {Loan._meta.db_table} WHERE customer_id IN ({generated})', pattern)  # type: ignore
+            loans = cursor.rowcount
+            for model in (CustomerCreditSummary, CreditScoreSnapshot):
+                cursor.execute(
+                    f'DELETE FROM {model._meta.db_table} WHERE customer_id IN ({generated})',  # type: ignore
+                    pattern
+                )
+            cursor.execute(
+                f'DELETE FROM {Customer._meta.db_table} WHERE customer_id IN ({generated})',  # type: ignore
+                pattern
+            )
+            customers = cursor.rowcount
+        self.stdout.write(self.style.SUCCESS(f'Deleted {customers:,} generated customers and {loans:,} loans'))
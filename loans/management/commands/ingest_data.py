@@ -1,21 +1,84 @@
+import resource
 from django.core.management.base import BaseCommand
-from loans.tasks import ingest_customer_data, ingest_loan_data
+from loans.tasks import ingest_customers, ingest_loans, parallel_ingestion
 
 
 class Command(BaseCommand):
-    help = 'Ingest customer and loan data from Excel files'
+    help = 'Ingest customer and loan data from Excel, CSV or Parquet files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', help='Customer data file (default: CUSTOMER_DATA_PATH)')
+        parser.add_argument('--loans', help='Loan data file (default: LOAN_DATA_PATH)')
+        parser.add_argument('--chunk-size', type=int, help='Rows per batch')
+        parser.add_argument(
+            '--update-existing',
+            action='store_true',
+            help='Overwrite rows whose ids already exist instead of skipping them',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Start over instead of resuming an unfinished run of the same file',
+        )
+        parser.add_argument(
+            '--parallel',
+            type=int,
+            default=0,
+            help='Split each file into N row ranges and ingest them on Celery workers',
+        )
+        parser.add_argument(
+            '--wait',
+            action='store_true',
+            help='With --parallel, block until the workflow finishes and print its totals',
+        )
     
     def handle(self, *args, **options):
+        chunk_size, update_existing = options['chunk_size'], options['update_existing']
+        resume = not options['restart']
+        if options['parallel']:
+            return self.handle_parallel(options)
         self.stdout.write('Starting data ingestion...')
         
         # Ingest customer data
         self.stdout.write('Ingesting customer data...')
-        customer_result = ingest_customer_data()
-        self.stdout.write(f'Customer data: {customer_result}')
+        result = ingest_customers(options['customers'], chunk_size, update_existing, resume)
+        self.report('Customer data', 'customers', result)
         
         # Ingest loan data
         self.stdout.write('Ingesting loan data...')
-        loan_result = ingest_loan_data()
-        self.stdout.write(f'Loan data: {loan_result}')
+        result = ingest_loans(options['loans'], chunk_size, update_existing, resume)
+        self.report('Loan data', 'loans', result)
         
-        self.stdout.write('Data ingestion completed successfully!')
\ No newline at end of file
+        self.stdout.write('Data ingestion completed successfully!')
+
+    def report(self, label, noun, result):
+        rate = result['rows'] / result['seconds'] if result['seconds'] else 0
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+        self.stdout.write(
+            f"{label}: Successfully ingested {result['ok']} {noun} "
+            f"({result['rows']} rows, {result['skipped']} skipped, {result['failed']} failed) "
+            f"in {result['seconds']:.2f}s, "
+            f"{rate:,.0f} rows/sec, peak RSS {peak_rss_mb:.0f} MiB"
+        )
+
+    def handle_parallel(self, options):
+        workflow = parallel_ingestion(
+            options['customers'],
+            options['loans'],
+            options['parallel'],
+            options['chunk_size'],
+            options['update_existing'],
+            not options['restart'],
+        )
+        result = workflow.apply_async()
+        self.stdout.write(f"Dispatched parallel ingestion {result.id} across {options['parallel']} ranges per file")
+        if not options['wait']:
+            return
+
+        outcome = result.get()
+        for key, label in [('customers', 'Customer data'), ('loans', 'Loan data')]:
+            totals = outcome[key]
+            self.report(label, key, totals)
+            for error in totals['errors']:
+                self.stderr.write(f'  {label} error: {error}')
+        self.stdout.write('Data ingestion completed successfully!')
@@ -0,0 +1,58 @@
+import time
+from django.core.management.base import BaseCommand
+from loans.models import IngestionRun
+
+
+class Command(BaseCommand):
+    help = 'Show progress and throughput of ingestion runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run', type=int, help='Only show this run id')
+        parser.add_argument('--all', action='store_true', help='Include completed and failed runs')
+        parser.add_argument('--limit', type=int, default=20, help='Maximum runs to list')
+        parser.add_argument(
+            '--watch',
+            type=float,
+            metavar='SECONDS',
+            help='Refresh every SECONDS until no listed run is still running',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            runs = self.runs(options)
+            if not runs:
+                self.stdout.write('No ingestion runs found')
+            for run in runs:
+                self.show(run)
+            if not options['watch'] or not any(run.status == IngestionRun.RUNNING for run in runs):
+                return
+            time.sleep(options['watch'])
+            self.stdout.write('')
+
+    def runs(self, options):
+        runs = IngestionRun.objects.all()  # type: ignore
+        if options['run']:
+            runs = runs.filter(pk=options['run'])
+        elif not options['all']:
+            runs = runs.filter(status=IngestionRun.RUNNING)
+        return list(runs[:options['limit']])
+
+    def show(self, run):
+        progress = run.progress()
+        stop = run.stop_row if run.stop_row is not None else 'end'
+        eta = progress['eta_seconds']
+        self.stdout.write(
+            f"Run {run.pk} [{run.status}] {run.kind} from {run.path} (rows {run.start_row}-{stop}): "
+            f"{progress['percent']:.1f}% ({run.rows_processed}/{run.total_rows} rows, "
+            f"{run.chunks_committed} chunks), {run.rows_ok} ok, {run.rows_skipped} skipped, "
+            f"{run.rows_failed} failed, {progress['rows_per_second']:,.0f} rows/sec"
+            + (f", ETA {eta:.0f}s" if eta is not None else '')
+        )
+        if run.chunk_timings:
+            recent = run.chunk_timings[-10:]
+            self.stdout.write(
+                f"  last chunk {recent[-1]:.3f}s, mean of last {len(recent)} "
+                f"{sum(recent) / len(recent):.3f}s, slowest {max(run.chunk_timings):.3f}s"
+            )
+        if run.error:
+            self.stdout.write(f"  error: {run.error}")
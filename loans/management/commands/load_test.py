@@ -0,0 +1,286 @@
+import json
+import logging
+import random
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from loans.models import Customer, Loan
+
+DEFAULT_MIX = 'register=5,check-eligibility=40,create-loan=10,view-loan=30,view-loans=15'
+PHONE_PREFIX = '4'  # Marks customers registered by load tests; real numbers may share it, so never delete by it
+
+
+class Command(BaseCommand):
+    help = 'Drive a weighted mix of all endpoints and save latency, throughput and queries per request as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f'Endpoint weights as name=weight pairs (default: {DEFAULT_MIX})')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--seconds', type=float, default=30.0, help='Duration of the measured run')
+        parser.add_argument('--requests', type=int,
+                            help='Stop the measured run after this many requests instead of after --seconds')
+        parser.add_argument('--warmup', type=float, default=3.0, help='Unmeasured seconds before the run')
+        parser.add_argument('--url', help='Base URL of a running server (e.g. http://localhost:8000); '
+                                          'by default requests go through the Django stack in-process, '
+                                          'which also counts SQL queries per request')
+        parser.add_argument('--output', default='load_report.json', help='Where to write the JSON report')
+        parser.add_argument('--compare', help='Earlier report to print deltas against')
+        parser.add_argument('--seed', type=int, help='Random seed for the request sequence')
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        ids = self.id_ranges()
+        self.url = options['url']
+        self.rng_lock = threading.Lock()
+        if options['requests'] is not None and options['requests'] < 1:
+            raise CommandError('--requests must be at least 1')
+
+        # Expected 404s for ids that fell in gaps would otherwise flood stderr
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            if options['warmup']:
+                self.rng = random.Random(options['seed'])
+                self.run(mix, ids, options['threads'], options['warmup'])
+            # The measured run draws the same sequence whatever the warmup drew
+            self.rng = random.Random(options['seed'])
+            results, elapsed = self.run(mix, ids, options['threads'], options['seconds'], options['requests'])
+        finally:
+            request_logger.setLevel(level)
+        report = self.build_report(results, elapsed, mix, ids, options)
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.print_report(report)
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.print_comparison(json.load(f), report)
+        self.stdout.write(f"Report saved to {options['output']}")
+
+    def parse_mix(self, value):
+        mix = {}
+        for pair in value.split(','):
+            name, _, weight = pair.partition('=')
+            name = name.strip()
+            if name not in self.requests:
+                raise CommandError(f"Unknown endpoint '{name}'; choose from {', '.join(self.requests)}")
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f"Invalid weight for '{name}': {weight!r}")
+        if not any(weight > 0 for weight in mix.values()):
+            raise CommandError('The mix needs at least one positive weight')
+        return mix
+
+    def id_ranges(self):
+        customers = Customer.objects.aggregate(low=Min('customer_id'), high=Max('customer_id'))  # type: ignore
+        loans = Loan.objects.aggregate(low=Min('loan_id'), high=Max('loan_id'))  # type: ignore
+        if customers['low'] is None or loans['low'] is None:
+            raise CommandError('No customers or loans to request; run generate_data first')
+        return {'customer': (customers['low'], customers['high']), 'loan': (loans['low'], loans['high'])}
+
+    def run(self, mix, ids, threads, seconds, requests=None):
+        """Send requests from threads clients for seconds, or until requests were sent in total"""
+        names, weights = list(mix), list(mix.values())
+        deadline = time.perf_counter() + seconds if requests is None else float('inf')
+        remaining = requests
+
+        def client():
+            nonlocal remaining
+            results = []
+            session = Client()
+            try:
+                while time.perf_counter() < deadline:
+                    with self.rng_lock:
+                        if remaining is not None:
+                            if not remaining:
+                                break
+                            remaining -= 1
+                        name = self.rng.choices(names, weights)[0]
+                        method, path, payload = self.requests[name](self, ids)
+                    results.append((name, *self.send(session, method, path, payload)))
+            finally:
+                # Worker threads each hold their own connection
+                connections.close_all()
+            return results
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            futures = [pool.submit(client) for _ in range(threads)]
+            results = [result for future in futures for result in future.result()]
+        return results, time.perf_counter() - started
+
+    def send(self, session, method, path, payload):
+        """(status, seconds, queries) for one request; queries is None over HTTP"""
+        if self.url:
+            started = time.perf_counter()
+            code = self.send_http(method, path, payload)
+            return code, time.perf_counter() - started, None
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if method == 'POST':
+                response = session.post(path, payload, content_type='application/json')
+            else:
+                response = session.get(path)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, len(queries.captured_queries)
+
+    def send_http(self, method, path, payload):
+        request = urllib.request.Request(
+            self.url.rstrip('/') + path, method=method,
+            data=json.dumps(payload).encode() if payload is not None else None,
+            headers={'Content-Type': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+        except OSError:
+            return 0
+
+    # Request builders: (method, path, JSON payload) for random existing rows
+
+    def register(self, ids):
+        return 'POST', '/loans/register/', {
+            'first_name': 'Load', 'last_name': 'Test', 'age': self.rng.randint(21, 65),
+            'monthly_income': self.rng.randrange(20000, 200000, 1000),
+            'phone_number': f'{PHONE_PREFIX}{self.rng.randrange(10 ** 9):09d}',
+        }
+
+    def application(self, ids):
+        return {
+            'customer_id': self.rng.randint(*ids['customer']),
+            'loan_amount': self.rng.randrange(10000, 1000000, 1000),
+            'interest_rate': round(self.rng.uniform(8, 20), 2),
+            'tenure': self.rng.choice([6, 12, 24, 36, 60]),
+        }
+
+    def check_eligibility(self, ids):
+        return 'POST', '/loans/check-eligibility/', self.application(ids)
+
+    def create_loan(self, ids):
+        return 'POST', '/loans/create-loan/', self.application(ids)
+
+    def view_loan(self, ids):
+        return 'GET', f"/loans/view-loan/{self.rng.randint(*ids['loan'])}/", None
+
+    def view_loans(self, ids):
+        return 'GET', f"/loans/view-loans/{self.rng.randint(*ids['customer'])}/", None
+
+    requests = {
+        'register': register,
+        'check-eligibility': check_eligibility,
+        'create-loan': create_loan,
+        'view-loan': view_loan,
+        'view-loans': view_loans,
+    }
+
+    def build_report(self, results, elapsed, mix, ids, options):
+        endpoints = {}
+        for name in mix:
+            rows = [row for row in results if row[0] == name]
+            if rows:
+                endpoints[name] = self.summarize(rows, elapsed)
+        return {
+            'commit': self.git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'target': options['url'] or 'in-process',
+            'threads': options['threads'],
+            'seconds': round(elapsed, 3),
+            'mix': mix,
+            'data': {
+                'customers': Customer.objects.count(),  # type: ignore
+                'loans': Loan.objects.count(),  # type: ignore
+                'customer_ids': list(ids['customer']),
+                'loan_ids': list(ids['loan']),
+            },
+            'overall': self.summarize(results, elapsed),
+            'endpoints': endpoints,
+        }
+
+    def summarize(self, rows, elapsed):
+        latencies = sorted(seconds * 1000 for _, _, seconds, _ in rows)
+        queries = [count for _, _, _, count in rows if count is not None]
+        codes = {}
+        for _, code, _, _ in rows:
+            codes[str(code)] = codes.get(str(code), 0) + 1
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'requests': len(rows),
+            'throughput_rps': round(len(rows) / elapsed, 2),
+            'status_codes': codes,
+            'errors': sum(count for code, count in codes.items() if not code.startswith(('2', '3', '4'))),
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 3),
+                'p50': round(quantiles[49], 3),
+                'p95': round(quantiles[94], 3),
+                'p99': round(quantiles[98], 3),
+                'max': round(latencies[-1], 3),
+            },
+            'queries_per_request': {
+                'mean': round(statistics.fmean(queries), 2),
+                'max': max(queries),
+            } if queries else None,
+        }
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['overall']['requests']:,} requests in {report['seconds']:.1f}s on {report['threads']} threads "
+            f"against {report['target']} ({report['data']['customers']:,} customers, "
+            f"{report['data']['loans']:,} loans)"
+        )
+        self.stdout.write(
+            f"{'endpoint':<18} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'queries':>8}  status codes"
+        )
+        for name, stats in [*report['endpoints'].items(), ('overall', report['overall'])]:
+            latency, queries = stats['latency_ms'], stats['queries_per_request']
+            self.stdout.write(
+                f"{name:<18} {stats['requests']:>9,} {stats['throughput_rps']:>8,.1f} {latency['p50']:>8.2f} "
+                f"{latency['p95']:>8.2f} {latency['p99']:>8.2f} "
+                f"{queries['mean'] if queries else '-':>8}  {stats['status_codes']}"
+            )
+
+    def print_comparison(self, baseline, report):
+        self.stdout.write(f"Change against {baseline.get('commit') or 'baseline'}:")
+        for name, stats in [*report['endpoints'].items(), ('overall', report['overall'])]:
+            before = baseline['overall'] if name == 'overall' else baseline['endpoints'].get(name)
+            if before is None:
+                continue
+            self.stdout.write(
+                f"{name:<18} p95 {self.change(before['latency_ms']['p95'], stats['latency_ms']['p95'])}, "
+                f"p99 {self.change(before['latency_ms']['p99'], stats['latency_ms']['p99'])}, "
+                f"req/s {self.change(before['throughput_rps'], stats['throughput_rps'])}"
+            )
+
+    def change(self, before, after):
+        if not before:
+            return 'n/a'
+        return f'{(after - before) / before * 100:+.1f}%'
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from loans.models import CustomerCreditSummary
+from loans.summaries import (
+    SUMMARY_FIELDS,
+    compute_credit_summaries,
+    expire_credit_summaries,
+    rebuild_credit_summaries,
+)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild customer credit summaries from the loans table and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drift, do not rewrite summaries',
+        )
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            # Expiry is routine maintenance, so it is not counted as drift
+            expire_credit_summaries()
+
+        expected = compute_credit_summaries()
+        stored = CustomerCreditSummary.objects.in_bulk(expected.keys())  # type: ignore
+
+        drifted = []
+        for customer_id, summary in expected.items():
+            current = stored.get(customer_id)
+            if current is None:
+                if not summary.loan_count:
+                    continue  # Customers without loans get their summary on first read
+                self.stdout.write(f'Customer {customer_id}: summary missing')
+                drifted.append(customer_id)
+                continue
+            changes = [
+                f'{field} {getattr(current, field)} -> {getattr(summary, field)}'
+                for field in SUMMARY_FIELDS
+                if getattr(current, field) != getattr(summary, field)
+            ]
+            if changes:
+                self.stdout.write(f'Customer {customer_id}: ' + ', '.join(changes))
+                drifted.append(customer_id)
+
+        self.stdout.write(f'{len(drifted)} of {len(expected)} summaries drifted')
+        if drifted and not options['dry_run']:
+            rebuild_credit_summaries(drifted)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(drifted)} summaries'))
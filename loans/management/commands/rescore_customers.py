@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from loans.scoring import rescore_customers
+
+
+class Command(BaseCommand):
+    help = 'Recompute every customer\'s score snapshot now, as the nightly task does'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Customer ids per chunk (default: RESCORE_CHUNK_CUSTOMERS)')
+        parser.add_argument('--sample', type=int, help='Snapshots to check against calculate_credit_score '
+                                                       '(default: RESCORE_SAMPLE_SIZE)')
+
+    def handle(self, *args, **options):
+        result = rescore_customers(options['chunk_size'], options['sample'])
+        per_million = result['seconds_per_million_loans']
+        self.stdout.write(
+            f"Rescored {result['customers']:,} customers from {result['loans']:,} loans in "
+            f"{result['seconds']:.1f}s" + (f" ({per_million:.1f}s per million loans)" if per_million else '')
+        )
+        for mismatch in result['mismatches']:
+            self.stdout.write(self.style.ERROR(f'Mismatch: {mismatch}'))
+        style = self.style.ERROR if result['mismatches'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"{len(result['mismatches'])} of {result['sampled']} sampled snapshots differ from calculate_credit_score"
+        ))
@@ -0,0 +1,128 @@
+"""Prometheus metrics for request latency, SQL usage and Celery task durations
+
+Set PROMETHEUS_MULTIPROC_DIR to a directory shared by every gunicorn, uvicorn and
+Celery worker process so /metrics reports all of them, not just the process
+that happens to serve the scrape.
+"""
+import os
+import socket
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess, values
+
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    # Files are named per process; containers sharing the directory each number pids from 1
+    values.ValueClass = values.MultiProcessValue(lambda: f'{socket.gethostname()}_{os.getpid()}')
+
+REQUEST_LATENCY = Histogram(
+    'credit_request_duration_seconds', 'Time to produce a response, per view',
+    ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'credit_request_db_queries', 'SQL queries executed per request',
+    ['view', 'method'],
+    buckets=(0, 1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50, 100, 250),
+)
+REQUEST_SQL_TIME = Histogram(
+    'credit_request_db_seconds', 'Time spent executing SQL per request',
+    ['view', 'method'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+TASK_DURATION = Histogram(
+    'credit_celery_task_duration_seconds', 'Celery task run time',
+    ['task', 'state'],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400),
+)
+REQUESTS_SHED = Counter(
+    'credit_requests_shed', 'Requests refused by admission control',
+    ['view', 'priority', 'reason'],
+)
+DB_QUERY_LATENCY = Gauge(
+    'credit_db_query_latency_seconds', 'Moving average SQL query time that load shedding acts on',
+    multiprocess_mode='max',
+)
+
+
+# Timers measuring the current request, outermost first; copied into the
+# threads async views query from
+_current_timers = ContextVar('query_timers', default=())
+
+
+class QueryTimer:
+    """Counts and times the SQL executed on any connection while measuring
+
+    With capture_sql, the statements and their durations are kept too.
+    """
+
+    def __init__(self, capture_sql=False):
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements = [] if capture_sql else None
+
+    @contextmanager
+    def measuring(self):
+        token = _current_timers.set(_current_timers.get() + (self,))
+        try:
+            yield self
+        finally:
+            _current_timers.reset(token)
+
+    def record(self, sql, many, seconds):
+        self.queries += 1
+        self.seconds += seconds
+        if self.statements is not None:
+            self.statements.append({'sql': sql, 'many': many, 'time_ms': round(seconds * 1000, 3)})
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper feeding the current request's QueryTimers"""
+    timers = _current_timers.get()
+    if not timers:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        for timer in timers:
+            timer.record(sql, many, seconds)
+
+
+def install_query_recorder(connection):
+    # Connections are per thread, and async views query from sync_to_async
+    # threads, so the wrapper lives on every connection rather than being
+    # pushed by the middleware. First in the list, as execute_wrapper() pops the last.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def view_label(request):
+    """The URL name of the matched view; unmatched paths share one label to bound cardinality"""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else '<unmatched>'
+
+
+def observe_request(request, response, seconds, timer):
+    view = view_label(request)
+    REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(seconds)
+    REQUEST_QUERIES.labels(view, request.method).observe(timer.queries)
+    REQUEST_SQL_TIME.labels(view, request.method).observe(timer.seconds)
+
+
+def observe_task(task_name, state, seconds):
+    TASK_DURATION.labels(task_name, state).observe(seconds)
+
+
+def metrics_view(request):
+    """Prometheus text exposition of all metrics"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
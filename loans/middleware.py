@@ -0,0 +1,61 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .admission import db_latency
+from .metrics import QueryTimer, observe_request
+from .profiling import profile_request, profiling_requested
+
+
+class RequestMetricsMiddleware:
+    """Record latency, SQL query count and SQL time for every request, per view
+
+    Queries are counted by an execute wrapper on each connection, so this works
+    with DEBUG off. Streamed bodies are timed up to the first byte only. The SQL
+    time also feeds the latency that admission control sheds load on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with QueryTimer().measuring() as timer:
+            response = self.get_response(request)
+        observe_request(request, response, time.perf_counter() - started, timer)
+        db_latency.observe(timer.seconds, timer.queries)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with QueryTimer().measuring() as timer:
+            response = await self.get_response(request)
+        observe_request(request, response, time.perf_counter() - started, timer)
+        db_latency.observe(timer.seconds, timer.queries)
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile requests that opt in with the profiling header; see loans.profiling
+
+    Only the sync stack is profiled. The async views run their queries on other
+    threads, which cProfile would not see, so their requests pass straight through.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        if profiling_requested(request):
+            return profile_request(request, self.get_response)
+        return self.get_response(request)
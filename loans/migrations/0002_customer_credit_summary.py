@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerCreditSummary',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='credit_summary', serialize=False, to='loans.customer')),
+                ('total_emis', models.IntegerField(default=0)),
+                ('emis_paid_on_time', models.IntegerField(default=0)),
+                ('loan_count', models.IntegerField(default=0)),
+                ('loans_per_year', models.JSONField(default=dict)),
+                ('total_volume', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('active_debt', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('active_monthly_emi', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('active_as_of', models.DateField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'customer_credit_summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0002_customer_credit_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('path', models.CharField(max_length=500)),
+                ('fingerprint', models.CharField(db_index=True, max_length=64)),
+                ('start_row', models.IntegerField(default=0)),
+                ('stop_row', models.IntegerField(blank=True, null=True)),
+                ('total_rows', models.IntegerField(default=0)),
+                ('chunk_size', models.IntegerField()),
+                ('update_existing', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('chunks_committed', models.IntegerField(default=0)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('rows_ok', models.IntegerField(default=0)),
+                ('rows_skipped', models.IntegerField(default=0)),
+                ('rows_failed', models.IntegerField(default=0)),
+                ('chunk_timings', models.JSONField(default=list)),
+                ('task_id', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'ingestion_runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:13
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Concurrent index builds don't block loan writes, but can't run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('loans', '0003_ingestion_run'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'end_date'], include=('monthly_repayment', 'loan_amount'), name='loans_customer_end_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'start_date'], name='loans_customer_start_idx'),
+        ),
+    ]
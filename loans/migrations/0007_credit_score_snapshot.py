@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0006_request_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditScoreSnapshot',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score_snapshot', serialize=False, to='loans.customer')),
+                ('as_of', models.DateField()),
+                ('credit_score', models.FloatField()),
+                ('active_debt', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('active_monthly_emi', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'credit_score_snapshots',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0009_loan_application'),
+    ]
+
+    operations = [
+        # In-flight claims are no longer stored; only completed responses are
+        migrations.RunSQL(
+            'DELETE FROM idempotency_keys WHERE status_code IS NULL',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='status_code',
+            field=models.IntegerField(),
+        ),
+    ]
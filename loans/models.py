@@ -1,5 +1,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
+from datetime import timedelta
 from decimal import Decimal
 
 
@@ -26,6 +28,7 @@ class Customer(models.Model):
         validators=[MinValueValidator(Decimal('0.00'))]
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Version stamp for conditional GETs
 
     class Meta:
         db_table = 'customers'
@@ -62,6 +65,16 @@ class Loan(models.Model):
 
     class Meta:
         db_table = 'loans'
+        indexes = [
+            # Active-loan lookups (end_date > today) read EMI and amount from the index alone
+            models.Index(
+                fields=['customer', 'end_date'],
+                include=['monthly_repayment', 'loan_amount'],
+                name='loans_customer_end_date_idx',
+            ),
+            # Per-year activity is counted with start_date ranges
+            models.Index(fields=['customer', 'start_date'], name='loans_customer_start_idx'),
+        ]
 
     def __str__(self):
         return f"Loan {self.loan_id} - {getattr(self.customer, 'first_name', 'Unknown')}"
@@ -75,4 +88,205 @@ class Loan(models.Model):
         if self.emis_paid_on_time > self.tenure:
             raise ValidationError("EMIs paid on time cannot exceed total tenure")
         if self.start_date and self.end_date and self.start_date >= self.end_date:
-            raise ValidationError("End date must be after start date")
\ No newline at end of file
+            raise ValidationError("End date must be after start date")
+
+
+class CustomerCreditSummary(models.Model):
+    """Denormalized loan history per customer, maintained incrementally"""
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='credit_summary'
+    )
+    total_emis = models.IntegerField(default=0)
+    emis_paid_on_time = models.IntegerField(default=0)
+    loan_count = models.IntegerField(default=0)
+    loans_per_year = models.JSONField(default=dict)  # {"2024": 2, ...}
+    total_volume = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    active_debt = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    active_monthly_emi = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    active_as_of = models.DateField()  # Day the active_* fields were computed for
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'customer_credit_summaries'
+
+    def __str__(self):
+        return f"Credit summary for customer {self.customer_id}"  # type: ignore
+
+
+class CreditScoreSnapshot(models.Model):
+    """Credit score and active EMI load per customer, recomputed in bulk each night"""
+    # Writes committed this long before a snapshot's loans were read may still be
+    # missing from it, as their updated_at is stamped before they commit
+    WRITE_MARGIN = timedelta(minutes=1)
+
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score_snapshot'
+    )
+    as_of = models.DateField()  # Day the score was computed for
+    credit_score = models.FloatField()
+    active_debt = models.DecimalField(max_digits=14, decimal_places=2)
+    active_monthly_emi = models.DecimalField(max_digits=14, decimal_places=2)
+    computed_at = models.DateTimeField()  # When the customer's loans were read
+
+    class Meta:
+        db_table = 'credit_score_snapshots'
+
+    def __str__(self):
+        return f"Score snapshot for customer {self.customer_id} on {self.as_of}"  # type: ignore
+
+    def is_current(self, customer, today):
+        """Whether the snapshot still describes the customer today"""
+        return self.as_of == today and customer.updated_at <= self.computed_at - self.WRITE_MARGIN
+
+
+class IngestionRun(models.Model):
+    """Checkpointed progress of one ingestion pass over a file or a row range of it"""
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(RUNNING, 'Running'), (COMPLETED, 'Completed'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=20)  # 'customers' or 'loans'
+    path = models.CharField(max_length=500)
+    fingerprint = models.CharField(max_length=64, db_index=True)  # SHA-256 of the file
+    start_row = models.IntegerField(default=0)
+    stop_row = models.IntegerField(null=True, blank=True)
+    total_rows = models.IntegerField(default=0)
+    chunk_size = models.IntegerField()
+    update_existing = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=RUNNING)
+    chunks_committed = models.IntegerField(default=0)
+    rows_processed = models.IntegerField(default=0)
+    rows_ok = models.IntegerField(default=0)
+    rows_skipped = models.IntegerField(default=0)
+    rows_failed = models.IntegerField(default=0)
+    chunk_timings = models.JSONField(default=list)  # Seconds per committed chunk
+    task_id = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'ingestion_runs'
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Ingestion run {self.pk} ({self.kind}, {self.status})"
+
+    @property
+    def next_row(self) -> int:
+        """First source row not yet committed; every committed chunk spans chunk_size rows"""
+        return self.start_row + self.chunks_committed * self.chunk_size  # type: ignore
+
+    @property
+    def seconds(self) -> float:
+        return sum(self.chunk_timings)  # type: ignore
+
+    def record_chunk(self, rows, skipped, failed, seconds):
+        """Advance the checkpoint; call inside the transaction that wrote the chunk"""
+        self.chunks_committed += 1  # type: ignore
+        self.rows_processed += rows  # type: ignore
+        self.rows_ok += rows - skipped - failed  # type: ignore
+        self.rows_skipped += skipped  # type: ignore
+        self.rows_failed += failed  # type: ignore
+        self.chunk_timings.append(round(seconds, 4))  # type: ignore
+        self.save(update_fields=[
+            'chunks_committed', 'rows_processed', 'rows_ok', 'rows_skipped', 'rows_failed',
+            'chunk_timings', 'updated_at',
+        ])
+
+    def progress(self):
+        """Snapshot suitable for Celery task state and the ingestion_status command"""
+        seconds = self.seconds
+        rate = self.rows_processed / seconds if seconds else 0.0
+        done = min(self.next_row - self.start_row, self.total_rows)  # type: ignore
+        return {
+            'run': self.pk,
+            'kind': self.kind,
+            'status': self.status,
+            'total_rows': self.total_rows,
+            'rows_processed': self.rows_processed,
+            'rows_ok': self.rows_ok,
+            'rows_skipped': self.rows_skipped,
+            'rows_failed': self.rows_failed,
+            'chunks_committed': self.chunks_committed,
+            'percent': 100.0 * done / self.total_rows if self.total_rows else 100.0,  # type: ignore
+            'rows_per_second': rate,
+            'eta_seconds': (self.total_rows - done) / rate if rate and self.status == self.RUNNING else None,
+        }
+
+
+class RequestProfile(models.Model):
+    """cProfile capture of one opted-in request, with the SQL it executed"""
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.IntegerField()
+    requested_by = models.CharField(max_length=150)  # Staff username or client address
+    duration_ms = models.FloatField()
+    query_count = models.IntegerField()
+    sql_time_ms = models.FloatField()
+    queries = models.JSONField(default=list)  # [{'sql', 'many', 'time_ms'}] in execution order
+    top_functions = models.JSONField(default=list)  # Highest cumulative time first
+    stats = models.BinaryField()  # Marshalled pstats data, as written by cProfile's dump_stats
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'request_profiles'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class IdempotencyKey(models.Model):
+    """Stored response of an Idempotency-Key, kept here while Redis is unreachable"""
+    key = models.CharField(max_length=300, primary_key=True)  # Endpoint scope and a hash of caller and key
+    fingerprint = models.CharField(max_length=64)  # SHA-256 of the request body
+    status_code = models.IntegerField()
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'idempotency_keys'
+
+    def __str__(self):
+        return self.key
+
+
+class LoanApplication(models.Model):
+    """Loan application submitted for a Celery worker to decide, in order per customer"""
+    PENDING = 'pending'
+    APPROVED = 'approved'
+    REJECTED = 'rejected'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (APPROVED, 'Approved'), (REJECTED, 'Rejected'), (FAILED, 'Failed')]
+
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='loan_applications')
+    loan_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    tenure = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    loan = models.OneToOneField(Loan, null=True, blank=True, on_delete=models.SET_NULL, related_name='application')
+    monthly_installment = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'loan_applications'
+        indexes = [
+            # Workers take a customer's pending applications oldest first
+            models.Index(fields=['customer', 'id'], condition=models.Q(status='pending'),
+                         name='loan_applications_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"Loan application {self.pk} ({self.status})"
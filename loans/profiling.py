@@ -0,0 +1,101 @@
+"""On-demand cProfile captures of single requests
+
+A request is profiled when PROFILING_ENABLED is on, it carries the
+PROFILING_HEADER header and it comes from a staff user or one of
+PROFILING_INTERNAL_IPS. Captures are listed in the admin under Request profiles.
+"""
+import cProfile
+import ipaddress
+import logging
+import marshal
+import pstats
+import time
+from django.conf import settings
+from django.db import DatabaseError
+from .metrics import QueryTimer, view_label
+from .models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+
+def profiling_requested(request):
+    """Whether this request opted in to profiling and may do so"""
+    # The header is checked first, so other requests never load the session user
+    if not settings.PROFILING_ENABLED or settings.PROFILING_HEADER not in request.headers:
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    return is_internal_address(request.META.get('REMOTE_ADDR'))
+
+
+def is_internal_address(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        ip in ipaddress.ip_network(network.strip(), strict=False)
+        for network in settings.PROFILING_INTERNAL_IPS if network.strip()
+    )
+
+
+def profile_request(request, get_response):
+    """Run the rest of the stack under cProfile, store the capture and return the response
+
+    The response carries an X-Profile-Id header with the stored profile's id.
+    Streamed bodies are produced after this returns and are not profiled.
+    """
+    # Before the view runs: DRF views replace request.user with their own (anonymous) user
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        requested_by = user.get_username()
+    else:
+        requested_by = request.META.get('REMOTE_ADDR', '')
+
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    with QueryTimer(capture_sql=True).measuring() as timer:
+        response = profiler.runcall(get_response, request)
+    duration = time.perf_counter() - started
+    profiler.create_stats()
+    stats = marshal.dumps(profiler.stats)  # type: ignore
+    functions = top_functions(profiler, settings.PROFILING_TOP_FUNCTIONS)
+
+    try:
+        profile = RequestProfile.objects.create(  # type: ignore
+            method=request.method,
+            path=request.get_full_path()[:500],
+            view_name=view_label(request),
+            status_code=response.status_code,
+            requested_by=requested_by,
+            duration_ms=round(duration * 1000, 3),
+            query_count=timer.queries,
+            sql_time_ms=round(timer.seconds * 1000, 3),
+            queries=timer.statements,
+            top_functions=functions,
+            stats=stats,
+        )
+        RequestProfile.objects.filter(pk__lte=profile.pk - settings.PROFILING_KEEP).delete()  # type: ignore
+    except DatabaseError:
+        logger.exception("Could not store the profile of %s %s", request.method, request.path)
+        return response
+    response['X-Profile-Id'] = str(profile.pk)
+    return response
+
+
+def top_functions(profiler, limit):
+    """The limit functions with the most cumulative time, as JSON-ready rows"""
+    stats = pstats.Stats(profiler)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    rows = []
+    for function in stats.fcn_list[:limit]:  # type: ignore
+        primitive_calls, calls, own_time, cumulative_time, _ = stats.stats[function]  # type: ignore
+        rows.append({
+            'function': pstats.func_std_string(function),
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'tottime_ms': round(own_time * 1000, 3),
+            'cumtime_ms': round(cumulative_time * 1000, 3),
+        })
+    return rows
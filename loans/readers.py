@@ -0,0 +1,143 @@
+import hashlib
+from pathlib import Path
+import pandas as pd
+
+
+def iter_batches(path, batch_size, start=0, stop=None):
+    """Yield DataFrames of at most batch_size rows without loading the whole file
+
+    start/stop select a half-open range of data rows (the header is not counted).
+    Every batch but the last covers exactly batch_size source rows, so a batch
+    index can be turned back into a row offset when resuming.
+    """
+    reader = _reader_for(path, _BATCH_READERS)
+    return reader(path, batch_size, start, stop)
+
+
+def count_rows(path):
+    """Number of data rows in a file, read without materialising it"""
+    return _reader_for(path, _ROW_COUNTERS)(path)
+
+
+def file_fingerprint(path, block_size=1 << 20):
+    """SHA-256 of a file's contents, used to recognise the same file on resume"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def split_rows(total, parts):
+    """Split total rows into at most `parts` contiguous (start, stop) ranges"""
+    parts = max(1, min(parts, total))
+    size = -(-total // parts)
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def _reader_for(path, readers):
+    suffix = Path(path).suffix.lower()
+    try:
+        return readers[suffix]
+    except KeyError:
+        raise ValueError(f"Unsupported data file type: {suffix or path}")
+
+
+def _iter_xlsx(path, batch_size, start, stop):
+    from openpyxl import load_workbook
+
+    # Read-only mode parses the sheet lazily instead of building every cell
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        header = next(sheet.iter_rows(max_row=1, values_only=True), None)
+        if header is None:
+            return
+        rows = sheet.iter_rows(
+            min_row=start + 2,
+            max_row=stop + 1 if stop is not None else None,
+            values_only=True
+        )
+        batch, consumed = [], 0
+        for row in rows:
+            consumed += 1
+            # Blank rows are dropped but still count towards the batch size
+            if not all(value is None for value in row):
+                batch.append(row)
+            if consumed == batch_size:
+                yield pd.DataFrame.from_records(batch, columns=header)
+                batch, consumed = [], 0
+        if consumed:
+            yield pd.DataFrame.from_records(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def _iter_csv(path, batch_size, start, stop):
+    nrows = stop - start if stop is not None else None
+    if nrows == 0:
+        return
+    with pd.read_csv(
+        path, chunksize=batch_size, skiprows=range(1, start + 1), nrows=nrows
+    ) as reader:
+        yield from reader
+
+
+def _iter_parquet(path, batch_size, start, stop):
+    parquet_file = _parquet_file(path)
+    offset = 0
+    for index in range(parquet_file.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(index).num_rows
+        group_start, offset = offset, offset + group_rows
+        # Row groups outside the range are skipped without being decoded
+        if offset <= start or (stop is not None and group_start >= stop):
+            continue
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=[index]):
+            batch_start, group_start = group_start, group_start + batch.num_rows
+            low = max(start - batch_start, 0)
+            high = batch.num_rows if stop is None else min(stop - batch_start, batch.num_rows)
+            if low < high:
+                yield batch.slice(low, high - low).to_pandas()
+
+
+def _count_xlsx(path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        # Blank rows count too, so ranges line up with sheet row numbers
+        return sum(1 for _ in workbook.active.iter_rows(min_row=2, values_only=True))
+    finally:
+        workbook.close()
+
+
+def _count_csv(path):
+    with pd.read_csv(path, usecols=[0], chunksize=100000) as reader:
+        return sum(len(chunk) for chunk in reader)
+
+
+def _count_parquet(path):
+    return _parquet_file(path).metadata.num_rows
+
+
+def _parquet_file(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires pyarrow (pip install pyarrow)")
+    return pq.ParquetFile(path)
+
+
+_BATCH_READERS = {
+    '.xlsx': _iter_xlsx,
+    '.xlsm': _iter_xlsx,
+    '.csv': _iter_csv,
+    '.parquet': _iter_parquet,
+}
+
+_ROW_COUNTERS = {
+    '.xlsx': _count_xlsx,
+    '.xlsm': _count_xlsx,
+    '.csv': _count_csv,
+    '.parquet': _count_parquet,
+}
@@ -0,0 +1,104 @@
+import asyncio
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from .cache import credit_cache
+
+# Database alias that reads in the current request go to; None means the primary
+_read_alias = ContextVar('read_alias', default=None)
+
+
+class PrimaryReplicaRouter:
+    """Send reads to a replica inside replica_reads() blocks, everything else to the primary
+
+    Reads are only moved for code that opts in, so transactions, row locks and
+    read-modify-write paths keep reading the primary they write to.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def pin_key(kind, key):
+    return f"replica:pin:{kind}:{key}"
+
+
+def pin_to_primary(customer_id, loan_id=None):
+    """Keep reads for a customer (and loan) on the primary while replicas catch up on a write"""
+    if not settings.DATABASE_REPLICAS:
+        return
+    keys = [pin_key('customer', customer_id)]
+    if loan_id is not None:
+        keys.append(pin_key('loan', loan_id))
+    credit_cache.set_many(dict.fromkeys(keys, True), settings.REPLICA_PIN_SECONDS)
+
+
+def choose_replica(customer_id=None, loan_id=None):
+    """A replica alias for reads about this customer or loan, or None for the primary"""
+    if not settings.DATABASE_REPLICAS:
+        return None
+    keys = []
+    if customer_id is not None:
+        keys.append(pin_key('customer', customer_id))
+    if loan_id is not None:
+        keys.append(pin_key('loan', loan_id))
+    if keys and credit_cache.get_many(keys):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+async def achoose_replica(customer_id=None, loan_id=None):
+    return await sync_to_async(choose_replica, thread_sensitive=False)(customer_id, loan_id)
+
+
+def current_read_alias():
+    """The alias ORM reads go to right now; None for the primary"""
+    return _read_alias.get()
+
+
+@contextmanager
+def replica_reads(alias):
+    """Route ORM reads in the block to alias (None keeps them on the primary)"""
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def reads_from_replica(kind):
+    """Serve a view keyed by one customer or loan URL argument from a replica
+
+    kind is 'customer' or 'loan'. Streamed bodies keep reading from the cursor
+    the view opened. Works on DRF views and async views.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key = (args or tuple(kwargs.values()))[0]
+                with replica_reads(await achoose_replica(**{f'{kind}_id': key})):
+                    return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = (args or tuple(kwargs.values()))[0]
+            with replica_reads(choose_replica(**{f'{kind}_id': key})):
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -23,6 +23,13 @@ class CustomerRegistrationSerializer(serializers.Serializer):
         return value
 
 
+class BulkCustomerRegistrationSerializer(CustomerRegistrationSerializer):
+    """Registration fields only; register/batch/ checks every phone number in one query"""
+
+    def validate_phone_number(self, value):
+        return value
+
+
 class LoanEligibilitySerializer(serializers.Serializer):
     customer_id = serializers.IntegerField()
     loan_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
@@ -37,6 +44,23 @@ class LoanCreationSerializer(serializers.Serializer):
     tenure = serializers.IntegerField()
 
 
+class LoanOfferSerializer(serializers.Serializer):
+    interest_rate = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal('0'))
+    tenures = serializers.CharField(required=False)
+
+    def validate_tenures(self, value):
+        """Comma-separated tenures in months, returned sorted without duplicates"""
+        try:
+            tenures = sorted({int(tenure) for tenure in value.split(',') if tenure.strip()})
+        except ValueError:
+            raise serializers.ValidationError("Expected comma-separated whole numbers of months.")
+        if not tenures:
+            raise serializers.ValidationError("Expected at least one tenure.")
+        if tenures[0] < 1 or tenures[-1] > 360:
+            raise serializers.ValidationError("Tenures must be between 1 and 360 months.")
+        return tenures
+
+
 class LoanDetailSerializer(serializers.ModelSerializer):
     customer = CustomerSerializer()
     
@@ -55,4 +79,30 @@ class CustomerLoanSerializer(serializers.ModelSerializer):
                  'monthly_repayment', 'repayments_left']
     
     def get_repayments_left(self, obj):
-        return obj.repayments_left
\ No newline at end of file
+        return obj.repayments_left
+
+
+def loan_detail_data(loans):
+    """LoanDetailSerializer output for the first loan of a queryset, from one .values() query
+
+    Returns None when there is no loan. Decimals are left for the renderer to format.
+    """
+    return loan_detail_from_row(loan_detail_values(loans).first())
+
+
+def loan_detail_values(loans):
+    """The .values() query behind loan_detail_data"""
+    loan_fields = [field for field in LoanDetailSerializer.Meta.fields if field != 'customer']
+    return loans.values(*loan_fields, *[f'customer__{field}' for field in CustomerSerializer.Meta.fields])
+
+
+def loan_detail_from_row(row):
+    """Nest a loan_detail_values row the way LoanDetailSerializer does"""
+    if row is None:
+        return None
+    customer_fields = CustomerSerializer.Meta.fields
+    return {
+        field: {name: row[f'customer__{name}'] for name in customer_fields}
+        if field == 'customer' else row[field]
+        for field in LoanDetailSerializer.Meta.fields
+    }
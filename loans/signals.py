@@ -0,0 +1,70 @@
+import time
+from celery.signals import task_postrun, task_prerun
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import invalidate_customer
+from .metrics import install_query_recorder, observe_task
+from .models import Customer, Loan
+from .routers import pin_to_primary
+from .summaries import rebuild_credit_summaries, record_new_loan
+
+
+@receiver(post_save, sender=Loan)
+def update_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    """Keep the customer's credit summary in step with loan writes"""
+    if raw:
+        return
+    if created:
+        record_new_loan(instance)
+    else:
+        rebuild_credit_summaries([instance.customer_id])
+    _invalidate_on_commit(instance.customer_id, instance.loan_id)
+
+
+@receiver(post_delete, sender=Loan)
+def update_summary_on_delete(sender, instance, origin=None, **kwargs):
+    """Rebuild the customer's credit summary after a loan is removed"""
+    # Deleting a customer cascades to its loans and takes the summary with it
+    if isinstance(origin, Customer) or getattr(origin, 'model', None) is Customer:
+        return
+    rebuild_credit_summaries([instance.customer_id])
+    _invalidate_on_commit(instance.customer_id, instance.loan_id)
+
+
+@receiver(post_save, sender=Customer)
+def invalidate_customer_on_save(sender, instance, created, raw=False, **kwargs):
+    """Salary and limit changes alter cached credit profiles"""
+    if not created and not raw:
+        _invalidate_on_commit(instance.customer_id)
+
+
+def _invalidate_on_commit(customer_id, loan_id=None):
+    # Invalidating before commit would let a concurrent reader re-cache old rows
+    def invalidate():
+        invalidate_customer(customer_id)
+        pin_to_primary(customer_id, loan_id)
+    transaction.on_commit(invalidate)
+
+
+@receiver(connection_created)
+def record_connection_queries(sender, connection, **kwargs):
+    """Count each connection's queries towards the request metrics"""
+    install_query_recorder(connection)
+
+
+_task_started = {}  # Task id -> start time, for the tasks running in this worker process
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_duration(task_id=None, task=None, state=None, **kwargs):
+    """Task durations by name and final state, e.g. the ingestion tasks"""
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        observe_task(task.name, state or 'UNKNOWN', time.perf_counter() - started)
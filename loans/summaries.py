@@ -0,0 +1,203 @@
+from decimal import Decimal
+from datetime import date
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import ExtractYear
+from .models import Customer, CustomerCreditSummary, Loan
+
+SUMMARY_FIELDS = [
+    'total_emis', 'emis_paid_on_time', 'loan_count', 'loans_per_year',
+    'total_volume', 'active_debt', 'active_monthly_emi', 'active_as_of',
+]
+
+
+def compute_credit_summaries(customer_ids=None, today=None):
+    """Build unsaved summaries from the raw loans table"""
+    today = today or date.today()
+    customers = Customer.objects.all()  # type: ignore
+    loans = Loan.objects.all()  # type: ignore
+    if customer_ids is not None:
+        customers = customers.filter(customer_id__in=customer_ids)
+        loans = loans.filter(customer_id__in=customer_ids)
+
+    summaries = {
+        customer_id: CustomerCreditSummary(customer_id=customer_id, active_as_of=today)
+        for customer_id in customers.values_list('customer_id', flat=True)
+    }
+
+    totals = loans.values('customer_id').annotate(
+        loan_count=Count('loan_id'),
+        total_emis=Sum('tenure'),
+        emis_paid_on_time=Sum('emis_paid_on_time'),
+        total_volume=Sum('loan_amount'),
+        active_debt=Sum('loan_amount', filter=Q(end_date__gt=today)),
+        active_monthly_emi=Sum('monthly_repayment', filter=Q(end_date__gt=today)),
+    ).order_by()
+    for row in totals:
+        summary = summaries[row['customer_id']]
+        summary.loan_count = row['loan_count']
+        summary.total_emis = row['total_emis']
+        summary.emis_paid_on_time = row['emis_paid_on_time']
+        summary.total_volume = row['total_volume']
+        summary.active_debt = row['active_debt'] or Decimal('0.00')
+        summary.active_monthly_emi = row['active_monthly_emi'] or Decimal('0.00')
+
+    per_year = loans.values('customer_id', year=ExtractYear('start_date')).annotate(
+        count=Count('loan_id')
+    ).order_by()
+    for row in per_year:
+        summaries[row['customer_id']].loans_per_year[str(row['year'])] = row['count']
+
+    return summaries
+
+
+def rebuild_credit_summaries(customer_ids=None, today=None, loans_changed=True):
+    """Recompute summaries from scratch and upsert them
+
+    Pass loans_changed=False when only the summaries were missing, so the
+    customers' version stamps stay put.
+    """
+    summaries = compute_credit_summaries(customer_ids, today)
+    with transaction.atomic():
+        CustomerCreditSummary.objects.bulk_create(  # type: ignore
+            summaries.values(),
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=SUMMARY_FIELDS + ['updated_at'],
+        )
+        _sync_current_debt(summaries.keys(), loans_changed)
+    return summaries
+
+
+def record_new_loan(loan):
+    """Fold a freshly created loan into its customer's summary"""
+    today = date.today()
+    with transaction.atomic():
+        summary = _locked_summary(loan.customer_id, today)
+        if summary is None:
+            # A rebuild already reads the new loan from the table
+            return rebuild_credit_summaries([loan.customer_id], today)[loan.customer_id]
+
+        year = str(loan.start_date.year)
+        summary.loan_count += 1
+        summary.total_emis += loan.tenure
+        summary.emis_paid_on_time += loan.emis_paid_on_time
+        summary.loans_per_year[year] = summary.loans_per_year.get(year, 0) + 1
+        summary.total_volume += Decimal(str(loan.loan_amount))
+        if loan.end_date > summary.active_as_of:
+            summary.active_debt += Decimal(str(loan.loan_amount))
+            summary.active_monthly_emi += Decimal(str(loan.monthly_repayment))
+        summary.save()
+        _sync_current_debt([loan.customer_id])
+    return summary
+
+
+def expire_credit_summaries(customer_ids=None, today=None):
+    """Drop loans that ended since each summary was last brought up to date"""
+    today = today or date.today()
+    with transaction.atomic():
+        stale = CustomerCreditSummary.objects.select_for_update().filter(  # type: ignore
+            active_as_of__lt=today
+        )
+        if customer_ids is not None:
+            stale = stale.filter(customer_id__in=customer_ids)
+        summaries = {summary.customer_id: summary for summary in stale}
+        if not summaries:
+            return 0
+
+        expired = Loan.objects.filter(  # type: ignore
+            customer_id__in=summaries.keys(),
+            end_date__gt=F('customer__credit_summary__active_as_of'),
+            end_date__lte=today,
+        ).values('customer_id').annotate(
+            debt=Sum('loan_amount'),
+            emi=Sum('monthly_repayment'),
+        ).order_by()
+        changed = []
+        for row in expired:
+            summary = summaries[row['customer_id']]
+            summary.active_debt -= row['debt']
+            summary.active_monthly_emi -= row['emi']
+            changed.append(summary.customer_id)
+
+        for summary in summaries.values():
+            summary.active_as_of = today
+        CustomerCreditSummary.objects.bulk_update(  # type: ignore
+            summaries.values(), ['active_debt', 'active_monthly_emi', 'active_as_of']
+        )
+        _sync_current_debt(changed, loans_changed=False)  # Ended loans still show in loan payloads
+    return len(summaries)
+
+
+def get_credit_summary(customer, today=None):
+    """Read a customer's summary by primary key, creating or expiring it if needed"""
+    today = today or date.today()
+    try:
+        summary = CustomerCreditSummary.objects.get(customer_id=customer.pk)  # type: ignore
+    except CustomerCreditSummary.DoesNotExist:  # type: ignore
+        return rebuild_credit_summaries([customer.pk], today, loans_changed=False)[customer.pk]
+    if summary.active_as_of < today:
+        expire_credit_summaries([customer.pk], today)
+        summary.refresh_from_db()
+    return summary
+
+
+def get_credit_summaries(customers, today=None):
+    """Bulk get_credit_summary with a constant number of queries"""
+    today = today or date.today()
+    customer_ids = [customer.pk for customer in customers]
+    summaries = CustomerCreditSummary.objects.in_bulk(customer_ids)  # type: ignore
+
+    stale = [pk for pk, summary in summaries.items() if summary.active_as_of < today]
+    if stale:
+        expire_credit_summaries(stale, today)
+        summaries.update(CustomerCreditSummary.objects.in_bulk(stale))  # type: ignore
+
+    missing = [pk for pk in customer_ids if pk not in summaries]
+    if missing:
+        summaries.update(rebuild_credit_summaries(missing, today, loans_changed=False))
+    return summaries
+
+
+def summary_components(summary, today=None):
+    """Map a summary onto the inputs of the credit score"""
+    today = today or date.today()
+    return {
+        'num_loans': summary.loan_count,
+        'total_emis': summary.total_emis,
+        'paid_on_time': summary.emis_paid_on_time,
+        'current_year_loans': summary.loans_per_year.get(str(today.year), 0),
+        'total_loan_amount': summary.total_volume,
+        'current_debt': summary.active_debt,
+    }
+
+
+def _locked_summary(customer_id, today):
+    """Fetch a summary row for update, bringing its active fields up to today"""
+    expire_credit_summaries([customer_id], today)
+    return CustomerCreditSummary.objects.select_for_update().filter(  # type: ignore
+        customer_id=customer_id
+    ).first()
+
+
+def _sync_current_debt(customer_ids, loans_changed=True):
+    """Mirror summary active debt onto Customer.current_debt
+
+    current_debt is in no versioned payload, so the version stamp only moves
+    when the customer's loans changed too.
+    """
+    customer_ids = list(customer_ids)
+    if not customer_ids:
+        return
+    values = {
+        'current_debt': Subquery(
+            CustomerCreditSummary.objects.filter(  # type: ignore
+                customer_id=OuterRef('customer_id')
+            ).values('active_debt')[:1]
+        )
+    }
+    if loans_changed:
+        # update() skips auto_now, so the version stamp is moved explicitly
+        values['updated_at'] = timezone.now()
+    Customer.objects.filter(customer_id__in=customer_ids).update(**values)  # type: ignore
@@ -1,87 +1,489 @@
 import pandas as pd
-from celery import shared_task
+from celery import chord, current_task, group, shared_task
 from decimal import Decimal
-from datetime import datetime
-from .models import Customer, Loan
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Customer, IngestionRun, Loan
+from . import applications, idempotency, scoring, summaries
+from .cache import invalidate_customer, invalidate_customers
+from .readers import count_rows, file_fingerprint, iter_batches, split_rows
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+CUSTOMER_COLUMNS = {
+    'Customer ID': 'customer_id',
+    'First Name': 'first_name',
+    'Last Name': 'last_name',
+    'Age': 'age',
+    'Phone Number': 'phone_number',
+    'Monthly Salary': 'monthly_salary',
+    'Approved Limit': 'approved_limit',
+}
 
-@shared_task
-def ingest_customer_data():
-    """Background task to ingest customer data from Excel file"""
+LOAN_COLUMNS = {
+    'Customer ID': 'customer_id',
+    'Loan ID': 'loan_id',
+    'Loan Amount': 'loan_amount',
+    'Tenure': 'tenure',
+    'Interest Rate': 'interest_rate',
+    'Monthly payment': 'monthly_repayment',
+    'EMIs paid on Time': 'emis_paid_on_time',
+    'Date of Approval': 'start_date',
+    'End Date': 'end_date',
+}
+
+
+@shared_task(bind=True)
+def ingest_customer_data(self, path=None, chunk_size=None, update_existing=False, resume=True):
+    """Background task to ingest customer data from an Excel, CSV or Parquet file"""
     try:
-        df = pd.read_excel('/app/customer_data.xlsx')
-        customers_created = 0
-        
-        for _, row in df.iterrows():
-            try:
-                customer, created = Customer.objects.get_or_create(  # type: ignore
-                    customer_id=row['Customer ID'],
-                    defaults={
-                        'first_name': row['First Name'],
-                        'last_name': row['Last Name'],
-                        'age': int(row['Age']),
-                        'phone_number': str(row['Phone Number']),
-                        'monthly_salary': Decimal(str(row['Monthly Salary'])),
-                        'approved_limit': Decimal(str(row['Approved Limit'])),
-                        'current_debt': 0,
-                    }
-                )
-                if created:
-                    customers_created += 1
-                    logger.info(f"Created customer: {customer.first_name} {customer.last_name}")
-            except Exception as e:
-                logger.error(f"Error creating customer {row['Customer ID']}: {str(e)}")
-                continue
-        
-        return f"Successfully ingested {customers_created} customers"
+        return ingest_customers(path, chunk_size, update_existing, resume, _publish_progress(self))
     except Exception as e:
         logger.error(f"Error ingesting customer data: {str(e)}")
-        return f"Error ingesting customer data: {str(e)}"
+        return {'error': str(e)}
 
 
-@shared_task
-def ingest_loan_data():
-    """Background task to ingest loan data from Excel file"""
+@shared_task(bind=True)
+def ingest_loan_data(self, path=None, chunk_size=None, update_existing=False, resume=True):
+    """Background task to ingest loan data from an Excel, CSV or Parquet file"""
     try:
-        df = pd.read_excel('/app/loan_data.xlsx')
-        loans_created = 0
-        
-        for _, row in df.iterrows():
-            try:
-                customer = Customer.objects.get(customer_id=row['Customer ID'])  # type: ignore
-                
-                # Convert date strings to datetime objects
-                start_date = pd.to_datetime(row['Date of Approval']).date()  # type: ignore
-                end_date = pd.to_datetime(row['End Date']).date()  # type: ignore
-                
-                loan, created = Loan.objects.get_or_create(  # type: ignore
-                    loan_id=row['Loan ID'],
-                    defaults={
-                        'customer': customer,
-                        'loan_amount': Decimal(str(row['Loan Amount'])),
-                        'tenure': int(row['Tenure']),
-                        'interest_rate': Decimal(str(row['Interest Rate'])),
-                        'monthly_repayment': Decimal(str(row['Monthly payment'])),
-                        'emis_paid_on_time': int(row['EMIs paid on Time']),
-                        'start_date': start_date,
-                        'end_date': end_date,
-                    }
-                )
-                if created:
-                    loans_created += 1
-                    logger.info(f"Created loan: {loan.loan_id} for customer {customer.first_name}")
-                    
-            except Customer.DoesNotExist:  # type: ignore
-                logger.warning(f"Customer {row['Customer ID']} not found for loan {row['Loan ID']}")
-                continue
-            except Exception as e:
-                logger.error(f"Error creating loan {row['Loan ID']}: {str(e)}")
-                continue
-                
-        return f"Successfully ingested {loans_created} loans"
+        return ingest_loans(path, chunk_size, update_existing, resume, _publish_progress(self))
     except Exception as e:
         logger.error(f"Error ingesting loan data: {str(e)}")
-        return f"Error ingesting loan data: {str(e)}"
\ No newline at end of file
+        return {'error': str(e)}
+
+
+def parallel_ingestion(customer_path=None, loan_path=None, parallel=4, chunk_size=None,
+                       update_existing=False, resume=True):
+    """Celery workflow fanning both files out as row ranges, customers before loans"""
+    customer_path = customer_path or settings.CUSTOMER_DATA_PATH
+    loan_path = loan_path or settings.LOAN_DATA_PATH
+    customer_ranges = group(
+        ingest_customer_range.s(customer_path, start, stop, chunk_size, update_existing, resume)
+        for start, stop in split_rows(count_rows(customer_path), parallel)
+    )
+    loan_ranges = split_rows(count_rows(loan_path), parallel)
+    return chord(customer_ranges, start_loan_ingestion.s(
+        loan_path, loan_ranges, chunk_size, update_existing, resume
+    ))
+
+
+@shared_task(bind=True)
+def ingest_customer_range(self, path, start, stop, chunk_size=None, update_existing=False,
+                          resume=True):
+    """Ingest rows [start, stop) of a customer file"""
+    return _ingest_range('customers', path, start, stop, chunk_size, update_existing, resume,
+                         ingest_customer_chunk, _publish_progress(self))
+
+
+@shared_task(bind=True)
+def ingest_loan_range(self, path, start, stop, chunk_size=None, update_existing=False,
+                      resume=True):
+    """Ingest rows [start, stop) of a loan file; summaries are rebuilt once at the end
+
+    The result lists the customers whose loans changed, for the final callback.
+    """
+    touched = set()
+    result = _ingest_range('loans', path, start, stop, chunk_size, update_existing, resume,
+                           ingest_loan_chunk, _publish_progress(self), refresh_summaries=False,
+                           touched=touched)
+    result['customer_ids'] = sorted(touched)
+    return result
+
+
+@shared_task(bind=True)
+def start_loan_ingestion(self, customer_results, path, ranges, chunk_size=None,
+                         update_existing=False, resume=True):
+    """Chord callback for the customer stage: replaces itself with the loan chord"""
+    reset_id_sequences(Customer)
+    loan_ranges = group(
+        ingest_loan_range.s(path, start, stop, chunk_size, update_existing, resume)
+        for start, stop in ranges
+    )
+    workflow = chord(loan_ranges, finish_ingestion.s(customer_results))
+    if self.request.is_eager:
+        # replace() freezes results in the backend, which eager runs don't have
+        return workflow.apply().get()
+    return self.replace(workflow)
+
+
+@shared_task
+def finish_ingestion(loan_results, customer_results):
+    """Final callback: refresh derived data and aggregate counts and errors"""
+    reset_id_sequences(Loan)
+    # Only customers whose loans changed; ranges that failed still list what they committed
+    customer_ids = sorted(set().union(*(result.get('customer_ids', []) for result in loan_results)))
+    batch_size = settings.INGEST_CHUNK_SIZE
+    for start in range(0, len(customer_ids), batch_size):
+        batch = customer_ids[start:start + batch_size]
+        summaries.rebuild_credit_summaries(batch)
+        invalidate_customers(batch)
+
+    result = {
+        'customers': _combine(customer_results),
+        'loans': _combine(loan_results),
+    }
+    logger.info(f"Parallel ingestion finished: {result}")
+    return result
+
+
+def _ingest_range(kind, path, start, stop, chunk_size, update_existing, resume, ingest_chunk,
+                  progress, **options):
+    try:
+        result = _ingest(kind, path, chunk_size, update_existing, ingest_chunk, start, stop,
+                         resume, progress, **options)
+        result['errors'] = []
+    except Exception as e:
+        # Reported to the final callback instead of failing the whole chord
+        logger.error(f"Error ingesting {kind} rows {start}-{stop}: {str(e)}")
+        result = {'rows': 0, 'ok': 0, 'skipped': 0, 'failed': 0, 'seconds': 0.0,
+                  'errors': [f"rows {start}-{stop}: {str(e)}"]}
+    return result
+
+
+def _publish_progress(task):
+    """Progress callback exposing the run's counters as the task's PROGRESS state"""
+    def publish(run):
+        if task.request.id and not task.request.is_eager:
+            task.update_state(state='PROGRESS', meta=run.progress())
+    return publish
+
+
+def _combine(results):
+    combined = {'rows': 0, 'ok': 0, 'skipped': 0, 'failed': 0, 'seconds': 0.0, 'errors': []}
+    for result in results:
+        for key in ('rows', 'ok', 'skipped', 'failed'):
+            combined[key] += result[key]
+        # Ranges run concurrently, so the slowest one bounds the stage
+        combined['seconds'] = max(combined['seconds'], result['seconds'])
+        combined['errors'].extend(result['errors'])
+    return combined
+
+
+def ingest_customers(path=None, chunk_size=None, update_existing=False, resume=True, progress=None):
+    """Stream a customer file into the database in fixed-size batches"""
+    result = _ingest(
+        'customers', path or settings.CUSTOMER_DATA_PATH, chunk_size, update_existing,
+        ingest_customer_chunk, resume=resume, progress=progress
+    )
+    if result['failed']:
+        logger.warning(f"Rejected {result['failed']} invalid or conflicting customer rows")
+    reset_id_sequences(Customer)
+    return result
+
+
+def ingest_loans(path=None, chunk_size=None, update_existing=False, resume=True, progress=None):
+    """Stream a loan file into the database in fixed-size batches"""
+    result = _ingest(
+        'loans', path or settings.LOAN_DATA_PATH, chunk_size, update_existing,
+        ingest_loan_chunk, resume=resume, progress=progress
+    )
+    if result['failed']:
+        logger.warning(f"Rejected {result['failed']} invalid or orphaned loan rows")
+    reset_id_sequences(Loan)
+    return result
+
+
+def _ingest(kind, path, chunk_size, update_existing, ingest_chunk, start=0, stop=None,
+            resume=True, progress=None, **options):
+    run = open_ingestion_run(kind, path, chunk_size, update_existing, start, stop, resume)
+    touched = options.get('touched')
+    try:
+        if touched is not None and run.next_row > start:
+            # Loan chunks committed before a restart changed their customers too
+            for chunk in iter_batches(path, run.chunk_size, start, run.next_row):
+                ids = pd.to_numeric(chunk['Customer ID'], errors='coerce').dropna()
+                touched.update(ids.astype('int64').tolist())
+        started = time.perf_counter()
+        for chunk in iter_batches(path, run.chunk_size, run.next_row, stop):
+            # The chunk and its checkpoint commit together, so a crash never double-counts
+            with transaction.atomic():
+                _, skipped, failed = ingest_chunk(chunk, update_existing, **options)
+                run.record_chunk(len(chunk), skipped, failed, time.perf_counter() - started)
+            if progress:
+                progress(run)
+            started = time.perf_counter()
+    except Exception as e:
+        run.refresh_from_db()
+        run.status, run.error = IngestionRun.FAILED, str(e)
+        run.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+
+    run.status, run.finished_at = IngestionRun.COMPLETED, timezone.now()
+    run.save(update_fields=['status', 'finished_at', 'updated_at'])
+    if progress:
+        progress(run)
+    return {
+        'run': run.pk,
+        'rows': run.rows_processed,
+        'ok': run.rows_ok,
+        'skipped': run.rows_skipped,
+        'failed': run.rows_failed,
+        'seconds': run.seconds,
+    }
+
+
+def open_ingestion_run(kind, path, chunk_size=None, update_existing=False, start=0, stop=None,
+                       resume=True):
+    """Return the unfinished run for this file and range, or start a new one"""
+    fingerprint = file_fingerprint(path)
+    task_id = current_task.request.id if current_task else None
+    run = None
+    if resume:
+        run = IngestionRun.objects.filter(  # type: ignore
+            kind=kind,
+            fingerprint=fingerprint,
+            start_row=start,
+            stop_row=stop,
+            update_existing=update_existing,
+            status__in=[IngestionRun.RUNNING, IngestionRun.FAILED],
+        ).first()
+    if run is None:
+        total = (stop if stop is not None else count_rows(path)) - start
+        return IngestionRun.objects.create(  # type: ignore
+            kind=kind,
+            path=str(path),
+            fingerprint=fingerprint,
+            start_row=start,
+            stop_row=stop,
+            total_rows=total,
+            chunk_size=chunk_size or settings.INGEST_CHUNK_SIZE,
+            update_existing=update_existing,
+            task_id=task_id or '',
+        )
+
+    # The stored chunk size is kept, since the checkpoint is counted in chunks
+    logger.info(f"Resuming {kind} ingestion run {run.pk} at row {run.next_row}")
+    run.status, run.error, run.task_id = IngestionRun.RUNNING, '', task_id or run.task_id
+    run.save(update_fields=['status', 'error', 'task_id', 'updated_at'])
+    return run
+
+
+def ingest_customer_chunk(df, update_existing=False):
+    """Validate and bulk write one chunk of customer rows, returning (created, skipped, failed)
+
+    Rows that fail validation or reuse another customer's phone number are failed;
+    duplicates and, unless updating, customers that already exist are skipped.
+    """
+    rows = _clean(df, CUSTOMER_COLUMNS, ['customer_id', 'age'], ['monthly_salary', 'approved_limit'], [])
+    rows['phone_number'] = _as_text(rows['phone_number'])
+    invalid = len(df) - len(rows)
+    # First occurrence wins, as with the previous row-by-row get_or_create
+    rows = rows.drop_duplicates('customer_id').drop_duplicates('phone_number')
+
+    # One query finds both existing ids and phone numbers owned by other customers
+    known = dict(
+        Customer.objects.filter(  # type: ignore
+            Q(customer_id__in=rows['customer_id'].tolist())
+            | Q(phone_number__in=rows['phone_number'].tolist())
+        ).values_list('phone_number', 'customer_id')
+    )
+    existing = set(known.values())
+    owner = rows['phone_number'].map(known)
+    conflicting = ~(owner.isna() | (owner == rows['customer_id']))
+    rows = rows[~conflicting]
+    failed = invalid + int(conflicting.sum())
+    if not update_existing:
+        rows = rows[~rows['customer_id'].isin(existing)]
+    skipped = len(df) - failed - len(rows)  # Duplicates and, unless updating, existing customers
+
+    customers = [
+        Customer(
+            customer_id=row.customer_id,
+            first_name=row.first_name,
+            last_name=row.last_name,
+            age=row.age,
+            phone_number=row.phone_number,
+            monthly_salary=Decimal(str(row.monthly_salary)),
+            approved_limit=Decimal(str(row.approved_limit)),
+            current_debt=0,
+        )
+        for row in rows.itertuples(index=False)
+    ]
+    with transaction.atomic():
+        Customer.objects.bulk_create(  # type: ignore
+            customers,
+            **_conflict_options(update_existing, ['customer_id'], [
+                'first_name', 'last_name', 'age', 'phone_number', 'monthly_salary', 'approved_limit',
+                'updated_at',
+            ])
+        )
+        if update_existing:
+            for customer_id in existing.intersection(rows['customer_id'].tolist()):
+                _invalidate_on_commit(customer_id)
+
+    created = int((~rows['customer_id'].isin(existing)).sum())
+    return created, skipped, failed
+
+
+def ingest_loan_chunk(df, update_existing=False, refresh_summaries=True, touched=None):
+    """Validate and bulk write one chunk of loan rows, returning (created, skipped, failed)
+
+    Invalid rows and loans of unknown customers are failed; duplicate loan ids
+    and, unless updating, loans that already exist are skipped. The customers
+    whose summaries change are added to touched when given.
+    """
+    rows = _clean(
+        df, LOAN_COLUMNS,
+        ['customer_id', 'loan_id', 'tenure', 'emis_paid_on_time'],
+        ['loan_amount', 'interest_rate', 'monthly_repayment'],
+        ['start_date', 'end_date'],
+    )
+    invalid = len(df) - len(rows)
+    rows = rows.drop_duplicates('loan_id')
+
+    # Customer foreign keys are resolved with one query per chunk
+    customer_ids = set(
+        Customer.objects.filter(  # type: ignore
+            customer_id__in=rows['customer_id'].unique().tolist()
+        ).values_list('customer_id', flat=True)
+    )
+    orphaned = ~rows['customer_id'].isin(customer_ids)
+    for row in rows[orphaned].itertuples(index=False):
+        logger.warning(f"Customer {row.customer_id} not found for loan {row.loan_id}")
+    rows = rows[~orphaned]
+    failed = invalid + int(orphaned.sum())
+
+    existing = dict(
+        Loan.objects.filter(loan_id__in=rows['loan_id'].tolist())  # type: ignore
+        .values_list('loan_id', 'customer_id')
+    )
+    if not update_existing:
+        rows = rows[~rows['loan_id'].isin(existing.keys())]
+    skipped = len(df) - failed - len(rows)
+
+    loans = [
+        Loan(
+            loan_id=row.loan_id,
+            customer_id=row.customer_id,
+            loan_amount=Decimal(str(row.loan_amount)),
+            tenure=row.tenure,
+            interest_rate=Decimal(str(row.interest_rate)),
+            monthly_repayment=Decimal(str(row.monthly_repayment)),
+            emis_paid_on_time=row.emis_paid_on_time,
+            start_date=row.start_date,
+            end_date=row.end_date,
+        )
+        for row in rows.itertuples(index=False)
+    ]
+    # Customers whose summaries change: new owners, plus previous owners on update
+    changed = set(rows['customer_id'].tolist())
+    if update_existing:
+        changed.update(existing.values())
+    if touched is not None:
+        touched.update(changed)
+
+    with transaction.atomic():
+        Loan.objects.bulk_create(  # type: ignore
+            loans,
+            **_conflict_options(update_existing, ['loan_id'], [
+                'customer', 'loan_amount', 'tenure', 'interest_rate', 'monthly_repayment',
+                'emis_paid_on_time', 'start_date', 'end_date',
+            ])
+        )
+        # bulk_create skips signals, so summaries and caches are refreshed here
+        if changed and refresh_summaries:
+            summaries.rebuild_credit_summaries(changed)
+            for customer_id in changed:
+                _invalidate_on_commit(customer_id)
+
+    created = int((~rows['loan_id'].isin(existing.keys())).sum())
+    return created, skipped, failed
+
+
+def reset_id_sequences(*models):
+    """Move auto-increment sequences past ingested ids so new inserts don't collide"""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def _clean(df, columns, integer_columns, decimal_columns, date_columns):
+    """Rename spreadsheet columns and drop rows that fail type conversion"""
+    rows = df.rename(columns=columns)[list(columns.values())].copy()
+    for column in integer_columns + decimal_columns:
+        rows[column] = pd.to_numeric(rows[column], errors='coerce')
+    for column in date_columns:
+        rows[column] = pd.to_datetime(rows[column], errors='coerce')
+    rows = rows.dropna()
+    for column in integer_columns:
+        rows[column] = rows[column].astype('int64')
+    for column in date_columns:
+        rows[column] = rows[column].dt.date
+    return rows
+
+
+def _as_text(series):
+    """Render identifiers such as phone numbers without a trailing '.0'"""
+    if pd.api.types.is_float_dtype(series):
+        series = series.astype('int64')
+    return series.astype(str).str.strip()
+
+
+def _conflict_options(update_existing, unique_fields, update_fields):
+    if update_existing:
+        return {
+            'update_conflicts': True,
+            'unique_fields': unique_fields,
+            'update_fields': update_fields,
+        }
+    return {'ignore_conflicts': True}
+
+
+def _invalidate_on_commit(customer_id):
+    transaction.on_commit(lambda: invalidate_customer(customer_id))
+
+
+@shared_task
+def expire_credit_summaries():
+    """Nightly task removing ended loans from active debt and EMI totals"""
+    expired = summaries.expire_credit_summaries()
+    return f"Brought {expired} credit summaries up to date"
+
+
+@shared_task
+def process_loan_applications(customer_id):
+    """Decide a customer's queued loan applications in submission order"""
+    decided = applications.process_pending_applications(customer_id)
+    return f"Decided {decided} loan applications of customer {customer_id}"
+
+
+def enqueue_loan_applications(customer_id):
+    """Queue process_loan_applications; requeue_loan_applications retries if the broker is down"""
+    try:
+        process_loan_applications.delay(customer_id)
+    except Exception as e:
+        logger.warning(f"Could not queue loan applications of customer {customer_id}: {e}")
+
+
+@shared_task
+def requeue_loan_applications():
+    """Periodic task queueing customers whose applications have waited too long, e.g. after a lost task"""
+    customer_ids = applications.stale_application_customers(
+        timedelta(seconds=settings.LOAN_APPLICATION_REQUEUE_SECONDS)
+    )
+    for customer_id in customer_ids:
+        enqueue_loan_applications(customer_id)
+    return f"Requeued loan applications of {len(customer_ids)} customers"
+
+
+@shared_task
+def expire_idempotency_keys():
+    """Hourly task deleting Idempotency-Key records the database fallback kept past their TTL"""
+    deleted = idempotency.expire_idempotency_keys()
+    return f"Deleted {deleted} expired idempotency keys"
+
+
+@shared_task
+def rescore_customers():
+    """Nightly task recomputing every customer's score snapshot in bulk"""
+    result = scoring.rescore_customers()
+    result['mismatches'] = len(result['mismatches'])
+    return result
@@ -1,9 +1,120 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import json
+import os
+import pstats
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+import threading
+from asgiref.sync import async_to_sync, sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from rest_framework import status
 from decimal import Decimal
-from .models import Customer, Loan
-from .utils import calculate_credit_score, calculate_monthly_installment
+from datetime import date, timedelta
+from io import StringIO
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from . import applications, async_views, idempotency, renderers, views
+from .admission import db_latency, limiter
+from .amortization import amortization_schedule, iter_schedule_rows
+from .cache import credit_cache, credit_profile_key, response_cache, seconds_until_midnight_utc
+from .models import (
+    CreditScoreSnapshot,
+    Customer,
+    CustomerCreditSummary,
+    IdempotencyKey,
+    IngestionRun,
+    Loan,
+    LoanApplication,
+    RequestProfile,
+)
+from .readers import iter_batches, split_rows
+from .routers import PrimaryReplicaRouter
+from .renderers import FastJSONRenderer
+from .scoring import rescore_customers, verify_snapshots
+from .serializers import CustomerLoanSerializer, LoanDetailSerializer
+from .tasks import (
+    _ingest,
+    expire_credit_summaries as expire_credit_summaries_task,
+    expire_idempotency_keys,
+    rescore_customers as rescore_customers_task,
+    finish_ingestion,
+    ingest_customer_chunk,
+    ingest_customer_range,
+    ingest_customers,
+    ingest_loan_chunk,
+    ingest_loan_range,
+    parallel_ingestion,
+    process_loan_applications,
+    requeue_loan_applications,
+    reset_id_sequences,
+)
+from .summaries import (
+    compute_credit_summaries,
+    expire_credit_summaries,
+    get_credit_summary,
+    rebuild_credit_summaries,
+)
+from .utils import (
+    calculate_credit_score,
+    calculate_credit_scores,
+    calculate_monthly_installment,
+    calculate_monthly_installments,
+    credit_score_aggregates,
+    aget_credit_profile,
+    get_credit_profile,
+    get_credit_profiles,
+    read_credit_profile,
+    round_to_nearest_lakh,
+)
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+_cache_override = override_settings(CACHES=LOCMEM_CACHES)
+
+
+def setUpModule():
+    # Keep the suite off any real Redis so cached profiles never leak between runs
+    _cache_override.enable()
+    credit_cache.clear()
+
+
+def tearDownModule():
+    _cache_override.disable()
+
+
+def legacy_credit_score(customer):
+    """Row-by-row credit score, kept as the reference for the aggregate engine"""
+    loans = list(Loan.objects.filter(customer=customer))  # type: ignore
+    if not loans:
+        return 50
+    total_emis = sum(loan.tenure for loan in loans)
+    paid_on_time = sum(loan.emis_paid_on_time for loan in loans)
+    on_time_ratio = paid_on_time / total_emis if total_emis > 0 else 0
+    num_loans = len(loans)
+    current_year_loans = sum(1 for loan in loans if loan.start_date.year == date.today().year)
+    total_loan_amount = sum(loan.loan_amount for loan in loans)
+    current_debt = sum(loan.loan_amount for loan in loans if loan.end_date > date.today())
+    if current_debt > customer.approved_limit:
+        return 0
+    score = 0
+    score += on_time_ratio * 40
+    score += min(num_loans * 5, 20)
+    score += min(current_year_loans * 10, 20)
+    score += min(float(total_loan_amount) / 1000000 * 10, 20)
+    return min(max(score, 0), 100)
 
 
 class CreditSystemTestCase(TestCase):
@@ -84,3 +195,1940 @@ class CreditSystemTestCase(TestCase):
         emi = calculate_monthly_installment(100000, 12, 12.0)
         self.assertIsInstance(emi, float)
         self.assertGreater(emi, 0)
+
+
+class CreditScoreAggregateTestCase(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.customers = [
+            Customer.objects.create(  # type: ignore
+                first_name='Test',
+                last_name=f'User{i}',
+                age=30,
+                phone_number=f'90000000{i:02d}',
+                monthly_salary=50000,
+                approved_limit=limit
+            )
+            for i, limit in enumerate([1800000, 1800000, 300000, 1800000])
+        ]
+        history = [
+            # (customer index, amount, tenure, paid on time, start offset, end offset)
+            (0, '150000.00', 24, 20, -400, 200),
+            (0, '275000.50', 12, 12, -900, -500),
+            (0, '90000.00', 36, 30, -10, 1000),
+            (1, '1200000.00', 60, 10, -30, 1700),
+            (1, '800000.00', 48, 48, -2000, -500),
+            (2, '250000.00', 12, 6, -100, 260),
+            (2, '100000.00', 12, 6, -50, 310),
+        ]
+        for index, amount, tenure, paid, start, end in history:
+            Loan.objects.create(  # type: ignore
+                customer=self.customers[index],
+                loan_amount=Decimal(amount),
+                tenure=tenure,
+                interest_rate=Decimal('11.50'),
+                monthly_repayment=Decimal('5000.00'),
+                emis_paid_on_time=paid,
+                start_date=self.today + timedelta(days=start),
+                end_date=self.today + timedelta(days=end)
+            )
+
+    def test_matches_row_by_row_scores(self):
+        """Aggregate scoring gives the same scores as the row-by-row version"""
+        for customer in self.customers:
+            self.assertEqual(calculate_credit_score(customer), legacy_credit_score(customer))
+
+    def test_single_query(self):
+        """Scoring one customer issues a single aggregate query"""
+        with self.assertNumQueries(1):
+            calculate_credit_score(self.customers[0])
+
+    def test_debt_over_limit_scores_zero(self):
+        """Active debt above the approved limit zeroes the score"""
+        self.assertEqual(calculate_credit_score(self.customers[2]), 0)
+
+    def test_bulk_scores(self):
+        """Bulk scoring matches per-customer scoring in one grouped query"""
+        with self.assertNumQueries(1):
+            scores = calculate_credit_scores(self.customers)
+        self.assertEqual(scores, {
+            customer.customer_id: legacy_credit_score(customer)
+            for customer in self.customers
+        })
+        self.assertEqual(scores[self.customers[3].customer_id], 50)
+
+    def test_current_year_range_boundaries(self):
+        """The current-year date range includes Jan 1 and Dec 31 and nothing past them"""
+        customer = self.customers[3]
+        for start in [date(2023, 12, 31), date(2024, 1, 1), date(2024, 12, 31), date(2025, 1, 1)]:
+            Loan.objects.create(  # type: ignore
+                customer=customer, loan_amount=1000, tenure=6, interest_rate=10,
+                monthly_repayment=170, emis_paid_on_time=0,
+                start_date=start, end_date=start + timedelta(days=180)
+            )
+        totals = Loan.objects.filter(customer=customer).aggregate(  # type: ignore
+            **credit_score_aggregates(date(2024, 6, 1))
+        )
+        self.assertEqual(totals['current_year_loans'], 2)
+
+    def test_query_benchmark_rolls_back(self):
+        """benchmark_loan_queries works on a scratch copy, never locking out readers of the loans table"""
+        from loans.management.commands.benchmark_loan_queries import Command
+        explain, locks = Command.explain, []
+
+        def explain_and_check_locks(command, queryset, repeat):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_locks WHERE relation = to_regclass(current_schema() || '.loans') "
+                    "AND mode = 'AccessExclusiveLock'"
+                )
+                locks.append(cursor.fetchone()[0])
+            return explain(command, queryset, repeat)
+
+        loans = Loan.objects.count()  # type: ignore
+        out = StringIO()
+        with mock.patch.object(Command, 'explain', explain_and_check_locks):
+            call_command('benchmark_loan_queries', customers=20, loans_per_customer=5, repeat=1, stdout=out)
+        self.assertIn('expired loans (batch)', out.getvalue())
+        self.assertEqual(set(locks), {0})
+        self.assertEqual(Customer.objects.count(), 4)  # type: ignore
+        self.assertEqual(Loan.objects.count(), loans)  # type: ignore
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, Loan._meta.db_table)  # type: ignore
+        self.assertIn('loans_customer_end_date_idx', indexes)
+
+
+class CreditSummaryTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.today = date.today()
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Test',
+            last_name='User',
+            age=30,
+            phone_number='1234567890',
+            monthly_salary=50000,
+            approved_limit=1800000
+        )
+
+    def add_loan(self, amount, emi, start, end):
+        return Loan.objects.create(  # type: ignore
+            customer=self.customer,
+            loan_amount=Decimal(amount),
+            tenure=12,
+            interest_rate=Decimal('10.00'),
+            monthly_repayment=Decimal(emi),
+            emis_paid_on_time=6,
+            start_date=self.today + timedelta(days=start),
+            end_date=self.today + timedelta(days=end)
+        )
+
+    def assert_summary_matches_loans(self):
+        stored = CustomerCreditSummary.objects.get(pk=self.customer.pk)  # type: ignore
+        expected = compute_credit_summaries([self.customer.pk])[self.customer.pk]
+        for field in ['total_emis', 'emis_paid_on_time', 'loan_count', 'loans_per_year',
+                      'total_volume', 'active_debt', 'active_monthly_emi']:
+            self.assertEqual(getattr(stored, field), getattr(expected, field), field)
+
+    def test_create_loan_updates_summary(self):
+        """create-loan folds the new loan into the summary and current_debt"""
+        self.add_loan('100000.00', '9000.00', -400, 100)
+        response = self.client.post('/loans/create-loan/', {
+            'customer_id': self.customer.customer_id,
+            'loan_amount': 100000,
+            'interest_rate': 16.0,
+            'tenure': 12
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assert_summary_matches_loans()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_debt, Decimal('200000.00'))
+
+    def test_expiry_drops_ended_loans(self):
+        """Loans ending between refreshes leave the active totals"""
+        self.add_loan('100000.00', '9000.00', -400, 5)
+        self.add_loan('50000.00', '4000.00', -400, 100)
+        expire_credit_summaries(today=self.today + timedelta(days=10))
+        summary = CustomerCreditSummary.objects.get(pk=self.customer.pk)  # type: ignore
+        self.assertEqual(summary.active_debt, Decimal('50000.00'))
+        self.assertEqual(summary.active_monthly_emi, Decimal('4000.00'))
+        self.assertEqual(summary.active_as_of, self.today + timedelta(days=10))
+
+    def test_eligibility_reads_one_summary_row(self):
+        """Eligibility reads the summary instead of the loans table"""
+        self.add_loan('100000.00', '9000.00', -400, 100)
+        from .utils import check_loan_eligibility
+        with self.assertNumQueries(1):
+            check_loan_eligibility(self.customer, Decimal('100000'), Decimal('12'), 12)
+
+    def test_missing_summary_is_built_on_read(self):
+        """A customer without a summary row gets one on first read"""
+        self.add_loan('100000.00', '9000.00', -400, 100)
+        CustomerCreditSummary.objects.all().delete()  # type: ignore
+        summary = get_credit_summary(self.customer)
+        self.assertEqual(summary.loan_count, 1)
+        self.assert_summary_matches_loans()
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        """The reconcile command rewrites summaries that drifted"""
+        self.add_loan('100000.00', '9000.00', -400, 100)
+        CustomerCreditSummary.objects.filter(pk=self.customer.pk).update(loan_count=7)  # type: ignore
+        out = StringIO()
+        call_command('reconcile_credit_summaries', stdout=out)
+        self.assertIn('loan_count 7 -> 1', out.getvalue())
+        self.assertIn('1 of 1 summaries drifted', out.getvalue())
+        self.assert_summary_matches_loans()
+
+    def test_reconcile_ignores_missing_summaries_without_loans(self):
+        """Freshly ingested customers without loans have no summary yet, which is not drift"""
+        Customer.objects.create(  # type: ignore
+            first_name='No', last_name='Loans', age=30, phone_number='1234567891',
+            monthly_salary=50000, approved_limit=1800000
+        )
+        self.add_loan('100000.00', '9000.00', -400, 100)
+        CustomerCreditSummary.objects.all().delete()  # type: ignore
+        out = StringIO()
+        call_command('reconcile_credit_summaries', stdout=out)
+        self.assertIn(f'Customer {self.customer.pk}: summary missing', out.getvalue())
+        self.assertIn('1 of 2 summaries drifted', out.getvalue())
+        self.assertEqual(CustomerCreditSummary.objects.count(), 1)  # type: ignore
+
+
+class CreditCacheTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        credit_cache.clear()
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Test',
+            last_name='User',
+            age=30,
+            phone_number='1234567890',
+            monthly_salary=50000,
+            approved_limit=1800000
+        )
+        self.payload = {
+            'customer_id': self.customer.customer_id,
+            'loan_amount': 100000,
+            'interest_rate': 16.0,
+            'tenure': 12
+        }
+
+    def test_repeated_checks_skip_database(self):
+        """A second eligibility check is served from the cache"""
+        self.client.post('/loans/check-eligibility/', self.payload, format='json')
+        with self.assertNumQueries(0):
+            response = self.client.post('/loans/check-eligibility/', self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        self.assertEqual(credit_cache.stats()['hits'], 1)
+        self.assertEqual(credit_cache.stats()['misses'], 1)
+
+    def test_create_loan_invalidates_profile(self):
+        """Creating a loan drops the customer's cached profile after commit"""
+        self.assertEqual(get_credit_profile(self.customer.customer_id)['current_emis'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/loans/create-loan/', self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # type: ignore
+        profile = get_credit_profile(self.customer.customer_id)
+        self.assertEqual(profile['current_emis'], Decimal(str(response.data['monthly_installment'])))  # type: ignore
+
+    def test_unknown_customer_is_not_cached(self):
+        """Missing customers are looked up again rather than cached"""
+        self.assertIsNone(get_credit_profile(999999))
+        self.assertIsNone(credit_cache.get(credit_profile_key(999999)))
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:1/0',
+        'OPTIONS': {'socket_connect_timeout': 0.1},
+    }})
+    def test_falls_back_to_local_lru(self):
+        """With Redis unreachable, profiles are cached in-process"""
+        get_credit_profile(self.customer.customer_id)
+        with self.assertNumQueries(0):
+            profile = get_credit_profile(self.customer.customer_id)
+        self.assertEqual(profile['customer_id'], self.customer.customer_id)
+        self.assertFalse(credit_cache.stats()['redis_available'])
+        self.assertEqual(credit_cache.stats()['errors'], 1)
+
+    def test_entries_expire_at_midnight_utc(self):
+        """Cache entries never outlive the UTC day they were computed on"""
+        self.assertLessEqual(seconds_until_midnight_utc(), 24 * 60 * 60)
+        self.assertIn(date.today().isoformat(), credit_profile_key(1))
+
+
+class BatchEligibilityTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        credit_cache.clear()
+        today = date.today()
+        self.customers = []
+        for i, salary in enumerate([50000, 20000, 150000, 80000]):
+            customer = Customer.objects.create(  # type: ignore
+                first_name='Test',
+                last_name=f'User{i}',
+                age=30,
+                phone_number=f'91000000{i:02d}',
+                monthly_salary=salary,
+                approved_limit=36 * salary
+            )
+            for j in range(i):
+                Loan.objects.create(  # type: ignore
+                    customer=customer,
+                    loan_amount=Decimal('300000.00'),
+                    tenure=24,
+                    interest_rate=Decimal('12.50'),
+                    monthly_repayment=Decimal('7500.00') * j,
+                    emis_paid_on_time=12 + j,
+                    start_date=today - timedelta(days=100 * j),
+                    end_date=today + timedelta(days=200)
+                )
+            self.customers.append(customer)
+
+    def applications(self):
+        return [
+            {
+                'customer_id': customer.customer_id,
+                'loan_amount': amount,
+                'interest_rate': rate,
+                'tenure': tenure
+            }
+            for customer in self.customers
+            for amount, rate, tenure in [(100000, 10.5, 12), (500000, 16.0, 36), (250000, 0, 24)]
+        ]
+
+    def test_matches_single_endpoint(self):
+        """Each batch result equals the single check-eligibility response"""
+        applications = self.applications()
+        response = self.client.post('/loans/check-eligibility/batch/', applications, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        for application, result in zip(applications, response.data['results']):  # type: ignore
+            single = self.client.post('/loans/check-eligibility/', application, format='json')
+            self.assertEqual(result, single.data)  # type: ignore
+
+    def test_constant_query_count(self):
+        """Query count does not grow with the number of customers"""
+        applications = self.applications()
+        rebuild_credit_summaries()
+        credit_cache.clear()
+        with self.assertNumQueries(2):
+            self.client.post('/loans/check-eligibility/batch/', applications[:3], format='json')
+        credit_cache.clear()
+        with self.assertNumQueries(2):
+            self.client.post('/loans/check-eligibility/batch/', applications, format='json')
+
+    def test_per_item_errors(self):
+        """Unknown customers and invalid items fail individually"""
+        applications = self.applications()[:1] + [
+            {'customer_id': 999999, 'loan_amount': 1000, 'interest_rate': 12, 'tenure': 12},
+            {'customer_id': self.customers[0].customer_id, 'loan_amount': 'abc', 'interest_rate': 12, 'tenure': 12},
+        ]
+        response = self.client.post('/loans/check-eligibility/batch/', applications, format='json')
+        results = response.data['results']  # type: ignore
+        self.assertIn('approval', results[0])
+        self.assertEqual(results[1], {'customer_id': 999999, 'error': 'Customer not found'})
+        self.assertIn('loan_amount', results[2])
+
+    def test_rejects_non_list_payload(self):
+        """The batch endpoint expects a JSON list"""
+        response = self.client.post('/loans/check-eligibility/batch/', {'customer_id': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+
+    def test_vectorized_emi_matches_scalar(self):
+        """Array EMIs are identical to the scalar function"""
+        terms = [(amount, tenure, rate)
+                 for amount in [1000, 99999.99, 250000, 1234567.89]
+                 for tenure in [1, 6, 12, 60, 360]
+                 for rate in [0, 0.01, 7.25, 12, 16.5, 99.99]]
+        amounts, tenures, rates = zip(*terms)
+        emis = calculate_monthly_installments(amounts, tenures, rates)
+        for (amount, tenure, rate), emi in zip(terms, emis.tolist()):
+            self.assertEqual(emi, calculate_monthly_installment(amount, tenure, rate))
+
+
+class AmortizationScheduleTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        customer = Customer.objects.create(  # type: ignore
+            first_name='Test',
+            last_name='User',
+            age=30,
+            phone_number='1234567890',
+            monthly_salary=50000,
+            approved_limit=1800000
+        )
+        self.loan = Loan.objects.create(  # type: ignore
+            customer=customer,
+            loan_amount=Decimal('100000.00'),
+            tenure=12,
+            interest_rate=Decimal('12.00'),
+            monthly_repayment=Decimal(str(calculate_monthly_installment(100000, 12, 12))),
+            emis_paid_on_time=0,
+            start_date=date.today(),
+            end_date=date.today() + timedelta(days=360)
+        )
+
+    def test_schedule_amortizes_loan(self):
+        """Principal repaid adds up to the loan and the balance ends at zero"""
+        schedule = amortization_schedule(100000, 360, 9.5)
+        self.assertEqual(len(schedule['month']), 360)
+        self.assertAlmostEqual(schedule['principal'].sum(), 100000, delta=1)
+        self.assertEqual(schedule['balance'][-1], 0)
+        self.assertTrue((schedule['balance'][:-1] > 0).all())
+
+    def test_rows_match_full_schedule(self):
+        """Chunked row iteration yields the same rows as one full schedule"""
+        schedule = amortization_schedule(250000, 100, 14)
+        rows = list(iter_schedule_rows(250000, 100, 14, chunk_size=7))
+        self.assertEqual([row['balance'] for row in rows], schedule['balance'].tolist())
+        self.assertEqual([row['month'] for row in rows], list(range(1, 101)))
+
+    def test_schedule_endpoint_streams_rows(self):
+        """The schedule endpoint streams one JSON row per month"""
+        response = self.client.get(f'/loans/view-loan/{self.loan.loan_id}/schedule/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        self.assertTrue(response.streaming)  # type: ignore
+        lines = b''.join(response.streaming_content).decode().splitlines()  # type: ignore
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0]['payment'], float(self.loan.monthly_repayment))
+        self.assertEqual(rows[-1]['balance'], 0)
+
+    def test_schedule_missing_loan(self):
+        """Unknown loans return 404"""
+        response = self.client.get('/loans/view-loan/999999/schedule/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)  # type: ignore
+
+
+class BulkIngestionTestCase(TestCase):
+    def setUp(self):
+        self.customers = pd.DataFrame({
+            'Customer ID': [501, 502, 503, 502],
+            'First Name': ['Asha', 'Ravi', 'Mira', 'Dup'],
+            'Last Name': ['K', 'S', 'P', 'D'],
+            'Age': [30, 45, 28, 50],
+            'Phone Number': [9000000501, 9000000502, 9000000503, 9000000599],
+            'Monthly Salary': [50000, 72000, 'n/a', 10000],
+            'Approved Limit': [1800000, 2600000, 1000000, 300000],
+        })
+        self.loans = pd.DataFrame({
+            'Customer ID': [501, 501, 502, 777],
+            'Loan ID': [9001, 9002, 9003, 9004],
+            'Loan Amount': [300000, 150000, 500000, 1000],
+            'Tenure': [24, 12, 60, 6],
+            'Interest Rate': [10.5, 12.25, 9.0, 15.0],
+            'Monthly payment': [13912, 13327, 10379, 174],
+            'EMIs paid on Time': [20, 12, 14, 6],
+            'Date of Approval': pd.to_datetime(['2020-01-05', '2019-03-01', '2024-07-10', '2024-01-01']),
+            'End Date': pd.to_datetime(['2022-01-05', '2020-03-01', '2029-07-10', '2024-07-01']),
+        })
+
+    def test_customer_chunk(self):
+        """Valid customers are bulk inserted, duplicates skipped and bad rows failed"""
+        self.assertEqual(ingest_customer_chunk(self.customers), (2, 1, 1))
+        customer = Customer.objects.get(pk=501)  # type: ignore
+        self.assertEqual(customer.phone_number, '9000000501')
+        self.assertEqual(customer.monthly_salary, Decimal('50000.00'))
+
+    def test_loan_chunk_constant_queries(self):
+        """A loan chunk resolves customers once and refreshes summaries in bulk"""
+        ingest_customer_chunk(self.customers)
+        with self.assertNumQueries(12):
+            counts = ingest_loan_chunk(self.loans)
+        self.assertEqual(counts, (3, 0, 1))
+        summary = CustomerCreditSummary.objects.get(pk=501)  # type: ignore
+        self.assertEqual(summary.loan_count, 2)
+        self.assertEqual(summary.total_volume, Decimal('450000.00'))
+
+    def test_reingest_keeps_or_updates_rows(self):
+        """Re-ingesting skips existing rows unless updates are requested"""
+        ingest_customer_chunk(self.customers)
+        ingest_loan_chunk(self.loans)
+        changed = self.loans.assign(**{'Loan Amount': [310000, 150000, 500000, 1000]})
+        self.assertEqual(ingest_loan_chunk(changed), (0, 3, 1))
+        self.assertEqual(Loan.objects.get(pk=9001).loan_amount, Decimal('300000.00'))  # type: ignore
+        self.assertEqual(ingest_loan_chunk(changed, update_existing=True), (0, 0, 1))
+        self.assertEqual(Loan.objects.get(pk=9001).loan_amount, Decimal('310000.00'))  # type: ignore
+        self.assertEqual(
+            CustomerCreditSummary.objects.get(pk=501).total_volume, Decimal('460000.00')  # type: ignore
+        )
+
+    def test_phone_owned_by_other_customer_fails(self):
+        """A row reusing another customer's phone number is rejected"""
+        ingest_customer_chunk(self.customers)
+        clash = self.customers.iloc[:1].assign(**{'Customer ID': [600]})
+        self.assertEqual(ingest_customer_chunk(clash), (0, 0, 1))
+
+    def test_sequences_reset_after_ingestion(self):
+        """New customers and loans get ids past the ingested ones"""
+        ingest_customer_chunk(self.customers)
+        ingest_loan_chunk(self.loans)
+        reset_id_sequences(Customer, Loan)
+        customer = Customer.objects.create(  # type: ignore
+            first_name='New', last_name='User', age=30, phone_number='1234567890',
+            monthly_salary=50000, approved_limit=1800000
+        )
+        self.assertGreater(customer.customer_id, 502)
+
+
+class StreamingReaderTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.xlsx = str(settings.BASE_DIR / 'customer_data.xlsx')
+        self.expected = pd.read_excel(self.xlsx)
+
+    def write(self, name, writer):
+        path = os.path.join(self.tmpdir.name, name)
+        writer(path)
+        return path
+
+    def assert_batches_match(self, path, batch_size=64):
+        batches = list(iter_batches(path, batch_size))
+        self.assertTrue(all(len(batch) <= batch_size for batch in batches))
+        self.assertEqual(len(batches), -(-len(self.expected) // batch_size))
+        combined = pd.concat(batches, ignore_index=True)
+        self.assertEqual(list(combined.columns), list(self.expected.columns))
+        self.assertEqual(combined['Customer ID'].tolist(), self.expected['Customer ID'].tolist())
+        self.assertEqual(combined['Phone Number'].tolist(), self.expected['Phone Number'].tolist())
+
+    def test_xlsx_batches(self):
+        """Excel files are read row by row in read-only mode"""
+        self.assert_batches_match(self.xlsx)
+
+    def test_csv_batches(self):
+        """CSV files are read in chunks"""
+        self.assert_batches_match(self.write('customers.csv', lambda p: self.expected.to_csv(p, index=False)))
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow not installed')
+    def test_parquet_batches(self):
+        """Parquet files are read batch by batch"""
+        self.assert_batches_match(self.write('customers.parquet', lambda p: self.expected.to_parquet(p)))
+
+    def test_unsupported_file_type(self):
+        """Unknown extensions are rejected up front"""
+        with self.assertRaises(ValueError):
+            iter_batches('customers.json', 100)
+
+    def test_ingest_from_csv_path(self):
+        """The ingestion tasks accept any supported file path"""
+        path = self.write('customers.csv', lambda p: self.expected.to_csv(p, index=False))
+        result = ingest_customers(path, chunk_size=50)
+        self.assertEqual((result['rows'], result['ok']), (300, 300))
+        self.assertEqual(Customer.objects.count(), 300)  # type: ignore
+
+
+class ParallelIngestionTestCase(TestCase):
+    def setUp(self):
+        self.customer_path = str(settings.BASE_DIR / 'customer_data.xlsx')
+        self.loan_path = str(settings.BASE_DIR / 'loan_data.xlsx')
+
+    def test_split_rows(self):
+        """Rows are split into contiguous, non-overlapping ranges"""
+        self.assertEqual(split_rows(10, 3), [(0, 4), (4, 8), (8, 10)])
+        self.assertEqual(split_rows(2, 5), [(0, 1), (1, 2)])
+
+    def test_workflow_aggregates_ranges(self):
+        """Customer ranges finish before loan ranges and totals are aggregated"""
+        workflow = parallel_ingestion(self.customer_path, self.loan_path, parallel=3, chunk_size=100)
+        # apply() runs the chords eagerly, standing in for the worker pool
+        outcome = workflow.apply().get()
+        self.assertEqual(outcome['customers']['ok'], 300)
+        self.assertEqual(outcome['loans']['rows'], 782)
+        self.assertEqual(outcome['loans']['errors'], [])
+        self.assertEqual(Loan.objects.count(), 753)  # type: ignore
+        borrowers = Loan.objects.values('customer_id').distinct().count()  # type: ignore
+        self.assertEqual(CustomerCreditSummary.objects.count(), borrowers)  # type: ignore
+
+    def test_only_customers_with_imported_loans_are_rebuilt(self):
+        """The final callback leaves customers the loan ranges did not touch alone"""
+        ingest_customers(self.customer_path)
+        bystander = Customer.objects.create(  # type: ignore
+            first_name='Not', last_name='Imported', age=30, phone_number='9700000000',
+            monthly_salary=50000, approved_limit=1800000
+        )
+        version = Customer.objects.get(pk=bystander.pk).updated_at  # type: ignore
+        expected = sorted(set(pd.read_excel(self.loan_path)['Customer ID'][:10].tolist()) & set(
+            Customer.objects.values_list('customer_id', flat=True)  # type: ignore
+        ))
+
+        # A range crashing after its first chunk still reports that chunk's customers once resumed
+        calls = []
+
+        def crash_on_second_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('worker lost')
+            return ingest_loan_chunk(*args, **kwargs)
+
+        with mock.patch('loans.tasks.ingest_loan_chunk', crash_on_second_chunk):
+            self.assertTrue(ingest_loan_range(self.loan_path, 0, 10, chunk_size=5)['errors'])
+        result = ingest_loan_range(self.loan_path, 0, 10, chunk_size=5)
+        self.assertEqual(result['customer_ids'], expected)
+
+        finish_ingestion([result], [])
+        self.assertEqual(sorted(CustomerCreditSummary.objects.values_list('customer_id', flat=True)),  # type: ignore
+                         expected)
+        self.assertEqual(Customer.objects.get(pk=bystander.pk).updated_at, version)  # type: ignore
+
+    def test_range_errors_are_reported(self):
+        """A failing range is reported by the final callback instead of aborting"""
+        outcome = finish_ingestion(
+            [ingest_loan_range('missing.csv', 0, 10)],
+            [ingest_customer_range(self.customer_path, 0, 10)]
+        )
+        self.assertEqual(outcome['customers']['ok'], 10)
+        self.assertEqual(len(outcome['loans']['errors']), 1)
+
+
+class CheckpointedIngestionTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'customers.csv')
+        pd.read_excel(settings.BASE_DIR / 'customer_data.xlsx').to_csv(self.path, index=False)
+
+    def crash_after(self, chunks):
+        calls = []
+
+        def ingest_chunk(df, update_existing):
+            if len(calls) == chunks:
+                raise RuntimeError('worker lost')
+            calls.append(len(df))
+            return ingest_customer_chunk(df, update_existing)
+        return ingest_chunk
+
+    def test_run_records_checkpoint_and_timings(self):
+        """A completed run stores its counters and one timing per chunk"""
+        result = ingest_customers(self.path, chunk_size=50)
+        run = IngestionRun.objects.get(pk=result['run'])  # type: ignore
+        self.assertEqual(run.status, IngestionRun.COMPLETED)
+        self.assertEqual((run.total_rows, run.chunks_committed, len(run.chunk_timings)), (300, 6, 6))
+        self.assertEqual((run.rows_ok, run.rows_skipped, run.rows_failed), (300, 0, 0))
+        self.assertEqual(run.progress()['percent'], 100.0)
+
+    def test_resume_from_last_committed_chunk(self):
+        """After a crash the next run continues from the checkpoint without double counting"""
+        with self.assertRaises(RuntimeError):
+            _ingest('customers', self.path, 50, False, self.crash_after(2))
+        run = IngestionRun.objects.get()  # type: ignore
+        self.assertEqual((run.status, run.chunks_committed, run.next_row), (IngestionRun.FAILED, 2, 100))
+        self.assertEqual(Customer.objects.count(), 100)  # type: ignore
+
+        result = ingest_customers(self.path, chunk_size=50)
+        self.assertEqual(result['run'], run.pk)
+        self.assertEqual((result['rows'], result['ok'], result['skipped']), (300, 300, 0))
+        self.assertEqual(Customer.objects.count(), 300)  # type: ignore
+
+    def test_changed_file_or_restart_starts_new_run(self):
+        """A different fingerprint, or resume=False, does not reuse the checkpoint"""
+        with self.assertRaises(RuntimeError):
+            _ingest('customers', self.path, 50, False, self.crash_after(1))
+        result = ingest_customers(self.path, chunk_size=50, resume=False)
+        self.assertEqual(result['skipped'], 50)
+        self.assertEqual(IngestionRun.objects.count(), 2)  # type: ignore
+        with open(self.path, 'a') as f:
+            f.write('\n')
+        with self.assertRaises(RuntimeError):
+            _ingest('customers', self.path, 50, False, self.crash_after(0))
+        self.assertEqual(IngestionRun.objects.count(), 3)  # type: ignore
+
+    def test_xlsx_batches_keep_row_offsets(self):
+        """Blank spreadsheet rows still count towards the batch size"""
+        path = os.path.join(self.tmpdir.name, 'blank.xlsx')
+        pd.DataFrame({'Customer ID': [1, None, 3, 4, 5]}).to_excel(path, index=False)
+        batches = [batch['Customer ID'].tolist() for batch in iter_batches(path, 2)]
+        self.assertEqual(batches, [[1], [3, 4], [5]])
+        resumed = [batch['Customer ID'].tolist() for batch in iter_batches(path, 2, start=2)]
+        self.assertEqual(resumed, [[3, 4], [5]])
+
+    def test_status_command(self):
+        """ingestion_status reports progress and throughput"""
+        result = ingest_customers(self.path, chunk_size=100)
+        out = StringIO()
+        call_command('ingestion_status', '--all', stdout=out)
+        self.assertIn(f"Run {result['run']} [completed] customers", out.getvalue())
+        self.assertIn('100.0% (300/300 rows, 3 chunks), 300 ok, 0 skipped, 0 failed', out.getvalue())
+
+
+class ConcurrentLoanCreationTestCase(TransactionTestCase):
+    def setUp(self):
+        self.customers = [
+            Customer.objects.create(  # type: ignore
+                first_name='Con', last_name=str(i), age=35, phone_number=f'880000000{i}',
+                monthly_salary=100000, approved_limit=3600000
+            )
+            for i in range(2)
+        ]
+        # Each loan's EMI (~29942) fits the 50000 headroom alone, but not twice
+        self.payload = {'loan_amount': 337000, 'interest_rate': 12, 'tenure': 12}
+
+    def post(self, customer, barrier=None):
+        try:
+            if barrier:
+                barrier.wait()
+            return APIClient().post(
+                '/loans/create-loan/', {'customer_id': customer.customer_id, **self.payload}, format='json'
+            )
+        finally:
+            connections.close_all()
+
+    def test_simultaneous_applications_are_serialized(self):
+        """Concurrent applications for one customer cannot exceed the EMI limit"""
+        count = 8
+        barrier = threading.Barrier(count)
+        with ThreadPoolExecutor(count) as pool:
+            responses = list(pool.map(lambda _: self.post(self.customers[0], barrier), range(count)))
+        approved = [r for r in responses if r.status_code == status.HTTP_201_CREATED]  # type: ignore
+        self.assertEqual(len(approved), 1)
+        self.assertEqual(Loan.objects.filter(customer=self.customers[0]).count(), 1)  # type: ignore
+
+    def test_other_customers_are_not_blocked(self):
+        """A locked customer does not hold up applications from other customers"""
+        with transaction.atomic():
+            Customer.objects.select_for_update().get(pk=self.customers[0].pk)  # type: ignore
+            with ThreadPoolExecutor(1) as pool:
+                response = pool.submit(self.post, self.customers[1]).result(timeout=10)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # type: ignore
+
+    def test_deleting_customer_removes_loans_and_summary(self):
+        """Cascaded loan deletes do not rebuild the summary of the customer being deleted"""
+        self.post(self.customers[0])
+        self.customers[0].delete()
+        self.assertFalse(CustomerCreditSummary.objects.filter(pk=self.customers[0].pk).exists())  # type: ignore
+
+
+class CustomerLoansPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Page', last_name='User', age=40, phone_number='9100000000',
+            monthly_salary=90000, approved_limit=3200000
+        )
+        self.empty = Customer.objects.create(  # type: ignore
+            first_name='No', last_name='Loans', age=40, phone_number='9100000001',
+            monthly_salary=90000, approved_limit=3200000
+        )
+        self.loans = [
+            Loan.objects.create(  # type: ignore
+                customer=self.customer, loan_amount=100000 + i, tenure=12, interest_rate=Decimal('10.50'),
+                monthly_repayment=Decimal('8815.00'), emis_paid_on_time=i,
+                start_date=date(2023, 1, 1), end_date=date(2024, 1, 1)
+            )
+            for i in range(5)
+        ]
+        self.url = f'/loans/view-loans/{self.customer.customer_id}/'
+
+    def test_full_list_in_one_query(self):
+        """Without pagination parameters the plain list is returned from a single query"""
+        with self.assertNumQueries(2):  # Version stamp, then the list
+            response = self.client.get(self.url)
+        data = response.json()  # type: ignore
+        self.assertEqual([loan['loan_id'] for loan in data], [loan.loan_id for loan in self.loans])
+        self.assertEqual(data[0]['loan_amount'], '100000.00')
+        self.assertEqual(data[4]['repayments_left'], 8)
+
+    def test_missing_customer_in_one_query(self):
+        """An unknown customer is a 404 without a separate existence check"""
+        with self.assertNumQueries(2):  # Version stamp, then the list
+            response = self.client.get('/loans/view-loans/999999/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)  # type: ignore
+
+    def test_customer_without_loans(self):
+        """A known customer with no loans gets an empty list"""
+        response = self.client.get(f'/loans/view-loans/{self.empty.customer_id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        self.assertEqual(response.data, [])  # type: ignore
+
+    def test_keyset_pages(self):
+        """Pages follow next_cursor until it runs out"""
+        seen, cursor = [], None
+        while True:
+            params = {'page_size': 2, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(self.url, params)
+            seen.extend(loan['loan_id'] for loan in response.data['results'])  # type: ignore
+            cursor = response.data['next_cursor']  # type: ignore
+            if cursor is None:
+                break
+        self.assertEqual(seen, [loan.loan_id for loan in self.loans])
+
+    def test_page_size_is_capped(self):
+        """page_size cannot exceed VIEW_LOANS_MAX_PAGE_SIZE"""
+        with override_settings(VIEW_LOANS_MAX_PAGE_SIZE=3):
+            response = self.client.get(self.url, {'page_size': 50})
+        self.assertEqual(len(response.data['results']), 3)  # type: ignore
+        self.assertEqual(response.data['next_cursor'], self.loans[2].loan_id)  # type: ignore
+
+    def test_invalid_parameters(self):
+        """Non-numeric or non-positive cursors and page sizes are rejected"""
+        for params in [{'cursor': 'abc'}, {'page_size': 0}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+
+    def test_stream_matches_list(self):
+        """The NDJSON stream carries the same items as the list response"""
+        with override_settings(VIEW_LOANS_STREAM_CHUNK_SIZE=2):
+            response = self.client.get(self.url, {'stream': 'true', 'cursor': self.loans[0].loan_id})
+            lines = b''.join(response.streaming_content).decode().splitlines()  # type: ignore
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        expected = self.client.get(self.url).json()[1:]  # type: ignore
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_stream_missing_customer(self):
+        """Streaming an unknown customer is still a 404"""
+        response = self.client.get('/loans/view-loans/999999/', {'stream': '1'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)  # type: ignore
+
+
+class FastReadPathTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Non-ASCII text and U+2028 exercise the renderer's escaping rules
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Zoë\u2028', last_name='Ng\u2029 "Q"', age=33, phone_number='9200000000',
+            monthly_salary=Decimal('123456.70'), approved_limit=4400000
+        )
+        for amount, rate in [(Decimal('5.10'), Decimal('7.00')), (Decimal('999999.99'), Decimal('24.75'))]:
+            Loan.objects.create(  # type: ignore
+                customer=self.customer, loan_amount=amount, tenure=36, interest_rate=rate,
+                monthly_repayment=Decimal('0.15'), emis_paid_on_time=40,
+                start_date=date(2022, 1, 1), end_date=date(2025, 1, 1)
+            )
+        self.loans = list(Loan.objects.filter(customer=self.customer).order_by('loan_id'))  # type: ignore
+
+    def test_view_loan_bytes_match_serializer(self):
+        """view-loan renders exactly what LoanDetailSerializer and JSONRenderer produced"""
+        loan = Loan.objects.select_related('customer').get(pk=self.loans[0].pk)  # type: ignore
+        expected = JSONRenderer().render(LoanDetailSerializer(loan).data)
+        with self.assertNumQueries(2):  # Version stamp, then the payload
+            response = self.client.get(f'/loans/view-loan/{loan.loan_id}/')
+        self.assertEqual(response.content, expected)  # type: ignore
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_view_loans_bytes_match_serializer(self):
+        """view-loans renders exactly what CustomerLoanSerializer and JSONRenderer produced"""
+        expected = JSONRenderer().render(CustomerLoanSerializer(self.loans, many=True).data)
+        response = self.client.get(f'/loans/view-loans/{self.customer.customer_id}/')
+        self.assertEqual(response.content, expected)  # type: ignore
+        self.assertIn(b'"repayments_left":-4', response.content)  # type: ignore
+
+    def test_error_bytes_match(self):
+        """Error bodies are unchanged"""
+        response = self.client.get('/loans/view-loan/999999/')
+        self.assertEqual(response.content, JSONRenderer().render({'error': 'Loan not found'}))  # type: ignore
+
+    def test_stdlib_fallback_matches(self):
+        """Without orjson the renderer produces the same bytes"""
+        data = CustomerLoanSerializer(self.loans, many=True).data
+        raw = [{**item, 'note': self.customer.first_name} for item in self.client.get(
+            f'/loans/view-loans/{self.customer.customer_id}/').json()]  # type: ignore
+        fast = FastJSONRenderer().render(raw)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(raw), fast)
+        self.assertEqual(fast, JSONRenderer().render(raw))
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_read_path_benchmark_reports_identical_bodies(self):
+        """benchmark_read_paths compares both paths on the same rolled-back data"""
+        out = StringIO()
+        call_command('benchmark_read_paths', loans=5, seconds=0.05, stdout=out)
+        lines = out.getvalue().splitlines()[1:]
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(all(line.endswith('True') for line in lines))
+        self.assertEqual(Customer.objects.count(), 1)  # type: ignore
+
+
+class ConditionalReadTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        response_cache.clear()
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Etag', last_name='Reader', age=40, phone_number='9300000000',
+            monthly_salary=100000, approved_limit=3600000
+        )
+        self.loan = Loan.objects.create(  # type: ignore
+            customer=self.customer, loan_amount=Decimal('50000'), tenure=12,
+            interest_rate=Decimal('10'), monthly_repayment=Decimal('4395.79'), emis_paid_on_time=3,
+            start_date=date(2023, 1, 1), end_date=date.today() + timedelta(days=200)
+        )
+        self.urls = [
+            f'/loans/view-loan/{self.loan.loan_id}/',
+            f'/loans/view-loans/{self.customer.customer_id}/',
+        ]
+
+    def test_matching_etag_returns_304_without_payload_query(self):
+        """A revalidation that still matches costs one stamp query and no body"""
+        for url in self.urls:
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn('Last-Modified', first)
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')  # type: ignore
+            self.assertEqual(response['ETag'], first['ETag'])
+
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        """New loans and customer edits both move the version stamp"""
+        before = [self.client.get(url)['ETag'] for url in self.urls]
+        response = self.client.post('/loans/create-loan/', {
+            'customer_id': self.customer.customer_id, 'loan_amount': 10000,
+            'interest_rate': 20, 'tenure': 12
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        after_loan = [self.client.get(url)['ETag'] for url in self.urls]
+        self.assertNotEqual(before[0], after_loan[0])
+        self.assertNotEqual(before[1], after_loan[1])
+
+        self.customer.refresh_from_db()
+        self.customer.first_name = 'Renamed'
+        self.customer.save()
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=after_loan[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['customer']['first_name'], 'Renamed')  # type: ignore
+
+    def test_daily_expiry_keeps_the_etag(self):
+        """Loans ending move current_debt, which no versioned payload shows"""
+        before = [self.client.get(url)['ETag'] for url in self.urls]
+        get_credit_summary(self.customer)
+        expire_credit_summaries(today=date.today() + timedelta(days=300))
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_debt, 0)
+        self.assertEqual([self.client.get(url)['ETag'] for url in self.urls], before)
+
+    def test_ingestion_changes_the_etag(self):
+        """Re-ingesting a customer with updates invalidates cached reads"""
+        etag = self.client.get(self.urls[1])['ETag']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'customer_data.xlsx')
+            pd.DataFrame([{
+                'Customer ID': self.customer.customer_id, 'First Name': 'Etag', 'Last Name': 'Reader',
+                'Age': 41, 'Phone Number': '9300000000', 'Monthly Salary': 120000, 'Approved Limit': 4300000,
+            }]).to_excel(path, index=False)
+            ingest_customers(path, update_existing=True)
+        response = self.client.get(self.urls[1], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_resources_are_not_versioned(self):
+        response = self.client.get('/loans/view-loan/999999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=60)
+    def test_response_cache_serves_repeat_reads(self):
+        """Cached payloads skip the payload query and retire when the stamp moves"""
+        for url in self.urls:
+            expected = self.client.get(url).content
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.content, expected)  # type: ignore
+
+        Loan.objects.filter(pk=self.loan.pk).first().delete()  # type: ignore
+        response = self.client.get(self.urls[1])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])  # type: ignore
+
+
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.async_client = AsyncClient()
+        credit_cache.clear()
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Async', last_name='Reader', age=45, phone_number='9400000000',
+            monthly_salary=90000, approved_limit=3200000
+        )
+        for i in range(5):
+            Loan.objects.create(  # type: ignore
+                customer=self.customer, loan_amount=Decimal(20000 + i), tenure=24,
+                interest_rate=Decimal('11.50'), monthly_repayment=Decimal('936.83'), emis_paid_on_time=i,
+                start_date=date.today() - timedelta(days=30 * i), end_date=date.today() + timedelta(days=300)
+            )
+        self.loan = Loan.objects.filter(customer=self.customer).order_by('loan_id').first()  # type: ignore
+
+    async def assert_same_response(self, sync_url, async_url, method='get', payload=None):
+        sync_response = await sync_to_async(getattr(self.client, method))(sync_url, payload, format='json')
+        if method == 'post':
+            response = await self.async_client.post(async_url, payload, content_type='application/json')
+        else:
+            response = await self.async_client.get(async_url, payload)
+        self.assertEqual(response.status_code, sync_response.status_code)
+        self.assertEqual(response.content, sync_response.content)
+        return response
+
+    async def test_read_endpoints_match_sync(self):
+        """Async view-loan and view-loans return the same status and bytes"""
+        customer_id = self.customer.customer_id
+        for path, params in [
+            (f'view-loan/{self.loan.loan_id}/', None),
+            ('view-loan/999999/', None),
+            (f'view-loans/{customer_id}/', None),
+            (f'view-loans/{customer_id}/', {'page_size': 2}),
+            (f'view-loans/{customer_id}/', {'page_size': 2, 'cursor': self.loan.loan_id + 2}),
+            (f'view-loans/{customer_id}/', {'page_size': 0}),
+            ('view-loans/999999/', None),
+        ]:
+            await self.assert_same_response(f'/loans/{path}', f'/loans/async/{path}', payload=params)
+
+    async def test_stream_matches_sync(self):
+        path = f'view-loans/{self.customer.customer_id}/'
+        with override_settings(VIEW_LOANS_STREAM_CHUNK_SIZE=2):
+            sync_response = await sync_to_async(self.client.get)(f'/loans/{path}', {'stream': 'true'})
+            expected = b''.join(await sync_to_async(list)(sync_response.streaming_content))
+            response = await self.async_client.get(f'/loans/async/{path}', {'stream': 'true'})
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(body, expected)
+        self.assertEqual(len(body.splitlines()), 5)
+
+    async def test_conditional_get(self):
+        url = f'/loans/async/view-loan/{self.loan.loan_id}/'
+        first = await self.async_client.get(url)
+        response = await self.async_client.get(url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+        sync_response = await sync_to_async(self.client.get)(f'/loans/view-loan/{self.loan.loan_id}/')
+        self.assertEqual(first['ETag'], sync_response['ETag'])
+
+    async def test_check_eligibility_matches_sync(self):
+        """Fresh, cached and invalid requests match the DRF view"""
+        payload = {'customer_id': self.customer.customer_id, 'loan_amount': 50000,
+                   'interest_rate': 10, 'tenure': 12}
+        await self.assert_same_response('/loans/check-eligibility/', '/loans/async/check-eligibility/',
+                                        'post', payload)
+        await sync_to_async(credit_cache.clear)()
+        await self.assert_same_response('/loans/check-eligibility/', '/loans/async/check-eligibility/',
+                                        'post', payload)
+        await self.assert_same_response('/loans/check-eligibility/', '/loans/async/check-eligibility/',
+                                        'post', {**payload, 'customer_id': 999999})
+        await self.assert_same_response('/loans/check-eligibility/', '/loans/async/check-eligibility/',
+                                        'post', {**payload, 'tenure': 'x'})
+        response = await self.async_client.get('/loans/async/check-eligibility/')
+        self.assertEqual(response.status_code, 405)
+
+    @override_settings(ASYNC_DB_CONCURRENCY=2)
+    def test_database_access_is_bounded(self):
+        """No more than ASYNC_DB_CONCURRENCY wrapped views run at once per event loop"""
+        running, peak = 0, 0
+
+        async def view(request):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return HttpResponse()
+
+        bounded = async_views.bounded_db_access(view)
+
+        async def burst():
+            await asyncio.gather(*(bounded(None) for _ in range(6)))
+
+        async_to_sync(burst)()
+        self.assertEqual(peak, 2)
+
+    def test_profile_without_current_summary_is_aggregated(self):
+        """A stale or missing summary is aggregated from loans rather than rewritten"""
+        expected = get_credit_profile(self.customer.customer_id, use_cache=False)
+        CustomerCreditSummary.objects.filter(customer=self.customer).update(  # type: ignore
+            active_as_of=date.today() - timedelta(days=400)
+        )
+        credit_cache.clear()
+        self.assertEqual(async_to_sync(aget_credit_profile)(self.customer.customer_id), expected)
+        self.assertEqual(
+            CustomerCreditSummary.objects.get(customer=self.customer).active_as_of,  # type: ignore
+            date.today() - timedelta(days=400)
+        )
+        CustomerCreditSummary.objects.filter(customer=self.customer).delete()  # type: ignore
+        credit_cache.clear()
+        self.assertEqual(async_to_sync(aget_credit_profile)(self.customer.customer_id), expected)
+        self.assertIsNone(async_to_sync(aget_credit_profile)(999999))
+
+
+class ReadReplicaRoutingTestCase(TransactionTestCase):
+    """A second alias on the test database stands in for a replica"""
+
+    def setUp(self):
+        self.client = APIClient()
+        connections.settings['replica_test'] = {**connections['default'].settings_dict}
+        self.addCleanup(self.remove_replica)
+        replicas = override_settings(DATABASE_REPLICAS=['replica_test'])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        credit_cache.clear()
+
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Replica', last_name='Reader', age=38, phone_number='9500000000',
+            monthly_salary=100000, approved_limit=3600000
+        )
+        self.loan = Loan.objects.create(  # type: ignore
+            customer=self.customer, loan_amount=Decimal('40000'), tenure=12,
+            interest_rate=Decimal('12'), monthly_repayment=Decimal('3553.95'), emis_paid_on_time=12,
+            start_date=date(2022, 1, 1), end_date=date.today() + timedelta(days=60)
+        )
+        cache.clear()  # Drops the pins set by the fixture writes
+
+    def remove_replica(self):
+        connections['replica_test'].close()
+        del connections['replica_test']
+        del connections.settings['replica_test']
+
+    def queries_by_alias(self, request):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica_test']) as replica:
+            response = request()
+        return response, [q['sql'] for q in primary.captured_queries], [q['sql'] for q in replica.captured_queries]
+
+    def test_reads_go_to_the_replica(self):
+        for url in [f'/loans/view-loan/{self.loan.loan_id}/', f'/loans/view-loans/{self.customer.customer_id}/']:
+            response, primary, replica = self.queries_by_alias(lambda: self.client.get(url))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(primary, [])
+            self.assertTrue(replica)
+
+    def test_eligibility_reads_replica_without_writing(self):
+        """A stale summary is aggregated on the replica instead of being refreshed there"""
+        expected = get_credit_profile(self.customer.customer_id, use_cache=False)
+        CustomerCreditSummary.objects.filter(customer=self.customer).update(  # type: ignore
+            active_as_of=date(2020, 1, 1)
+        )
+        cache.clear()
+        payload = {'customer_id': self.customer.customer_id, 'loan_amount': 10000,
+                   'interest_rate': 12, 'tenure': 12}
+        response, primary, replica = self.queries_by_alias(
+            lambda: self.client.post('/loans/check-eligibility/', payload, format='json')
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, [])
+        self.assertTrue(all(sql.startswith('SELECT') for sql in replica))
+        self.assertEqual(credit_cache.get(credit_profile_key(self.customer.customer_id)), expected)
+
+    def test_writes_pin_the_customer_to_the_primary(self):
+        """create_loan writes the primary, and the customer's next reads stay there"""
+        payload = {'customer_id': self.customer.customer_id, 'loan_amount': 10000,
+                   'interest_rate': 14, 'tenure': 12}
+        response, primary, replica = self.queries_by_alias(
+            lambda: self.client.post('/loans/create-loan/', payload, format='json')
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(replica, [])
+        loan_id = response.json()['loan_id']  # type: ignore
+
+        for request in [
+            lambda: self.client.get(f'/loans/view-loan/{loan_id}/'),
+            lambda: self.client.get(f'/loans/view-loans/{self.customer.customer_id}/'),
+            lambda: self.client.post('/loans/check-eligibility/', payload, format='json'),
+        ]:
+            response, primary, replica = self.queries_by_alias(request)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(replica, [])
+
+        cache.clear()  # The pin expires
+        response, primary, replica = self.queries_by_alias(
+            lambda: self.client.get(f'/loans/view-loan/{loan_id}/')
+        )
+        self.assertEqual(primary, [])
+        self.assertTrue(replica)
+
+    def test_replica_reads_racing_a_write_expire_with_the_pin(self):
+        """A replica read that lost the race to a loan write is only cached until the pin lapses"""
+        payload = {'customer_id': self.customer.customer_id, 'loan_amount': 10000,
+                   'interest_rate': 14, 'tenure': 12}
+        stale = get_credit_profile(self.customer.customer_id, use_cache=False)
+        set_profile = credit_cache.set
+        timeouts = []
+
+        def write_then_cache(key, profile, timeout):
+            # The loan commits, invalidating the key, after the replica returned the old rows
+            if not timeouts:
+                self.assertEqual(APIClient().post('/loans/create-loan/', payload, format='json').status_code, 201)
+            timeouts.append(timeout)
+            set_profile(key, profile, timeout)
+
+        with mock.patch.object(credit_cache, 'set', side_effect=write_then_cache):
+            response = self.client.post('/loans/check-eligibility/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(timeouts, [settings.REPLICA_PIN_SECONDS])
+        self.assertEqual(credit_cache.get(credit_profile_key(self.customer.customer_id)), stale)
+
+        # Reads on the primary while the pin lasts are cached for the day
+        credit_cache.delete_many([credit_profile_key(self.customer.customer_id)])
+        with mock.patch.object(credit_cache, 'set', side_effect=write_then_cache):
+            self.client.post('/loans/check-eligibility/', payload, format='json')
+        self.assertAlmostEqual(timeouts[1], seconds_until_midnight_utc(), delta=2)
+        self.assertNotEqual(credit_cache.get(credit_profile_key(self.customer.customer_id)), stale)
+
+    def test_replicas_are_not_migrated(self):
+        router = PrimaryReplicaRouter()
+        self.assertFalse(router.allow_migrate('replica_test', 'loans'))
+        self.assertTrue(router.allow_migrate('default', 'loans'))
+
+
+class RequestMetricsTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Metric', last_name='Reader', age=35, phone_number='9200000000',
+            monthly_salary=80000, approved_limit=2900000
+        )
+        self.loan = Loan.objects.create(  # type: ignore
+            customer=self.customer, loan_amount=Decimal('50000'), tenure=12,
+            interest_rate=Decimal('10'), monthly_repayment=Decimal('4395.79'), emis_paid_on_time=3,
+            start_date=date(2023, 1, 1), end_date=date.today() + timedelta(days=200)
+        )
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_latency_and_sql_are_recorded_per_view(self):
+        labels = {'view': 'view_loan', 'method': 'GET'}
+        before = {
+            name: self.sample(name, **labels)
+            for name in ['credit_request_db_queries_count', 'credit_request_db_queries_sum',
+                         'credit_request_db_seconds_sum']
+        }
+        latency_before = self.sample('credit_request_duration_seconds_count', status='200', **labels)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/loans/view-loan/{self.loan.loan_id}/')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.sample('credit_request_db_queries_count', **labels),
+                         before['credit_request_db_queries_count'] + 1)
+        self.assertEqual(self.sample('credit_request_db_queries_sum', **labels),
+                         before['credit_request_db_queries_sum'] + len(queries.captured_queries))
+        self.assertGreater(self.sample('credit_request_db_seconds_sum', **labels),
+                           before['credit_request_db_seconds_sum'])
+        self.assertEqual(self.sample('credit_request_duration_seconds_count', status='200', **labels),
+                         latency_before + 1)
+
+    async def test_async_views_are_recorded(self):
+        labels = {'view': 'async_view_customer_loans', 'method': 'GET'}
+        before = self.sample('credit_request_db_queries_sum', **labels)
+        response = await AsyncClient().get(f'/loans/async/view-loans/{self.customer.customer_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(self.sample('credit_request_db_queries_sum', **labels), before + 2)
+
+    def test_unmatched_paths_share_a_label(self):
+        before = self.sample('credit_request_duration_seconds_count',
+                             view='<unmatched>', method='GET', status='404')
+        self.client.get('/no-such-page/1/')
+        self.client.get('/no-such-page/2/')
+        self.assertEqual(self.sample('credit_request_duration_seconds_count',
+                                     view='<unmatched>', method='GET', status='404'), before + 2)
+
+    def test_celery_task_durations(self):
+        labels = {'task': 'loans.tasks.expire_credit_summaries', 'state': 'SUCCESS'}
+        before = self.sample('credit_celery_task_duration_seconds_count', **labels)
+        expire_credit_summaries_task.apply()
+        self.assertEqual(self.sample('credit_celery_task_duration_seconds_count', **labels), before + 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get(f'/loans/view-loan/{self.loan.loan_id}/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('credit_request_db_queries_bucket{', body)
+        self.assertIn('view="view_loan"', body)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_INTERNAL_IPS=['10.0.0.0/8'])
+class RequestProfilingTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()  # Profiles are cached per customer id, so the view would skip the database
+        credit_cache.clear()
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Profiled', last_name='Customer', age=38, phone_number='9100000000',
+            monthly_salary=75000, approved_limit=2700000
+        )
+        self.payload = {'customer_id': self.customer.customer_id, 'loan_amount': 100000,
+                        'interest_rate': 12, 'tenure': 12}
+
+    def check(self, **extra):
+        return self.client.post('/loans/check-eligibility/', self.payload, format='json', **extra)
+
+    def test_internal_address_with_header_is_profiled(self):
+        response = self.check(HTTP_X_PROFILE='1', REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])  # type: ignore
+        self.assertEqual(profile.view_name, 'check_eligibility')
+        self.assertEqual(profile.requested_by, '10.1.2.3')
+        self.assertGreater(profile.query_count, 0)
+        self.assertEqual(len(profile.queries), profile.query_count)
+        self.assertIn('customers', profile.queries[0]['sql'])
+        functions = [row['function'] for row in profile.top_functions]
+        self.assertTrue(any('check_eligibility' in function for function in functions))
+
+        # The stored stats load with pstats
+        with tempfile.NamedTemporaryFile(suffix='.prof') as f:
+            f.write(bytes(profile.stats))
+            f.flush()
+            self.assertTrue(pstats.Stats(f.name).total_calls)
+
+    def test_staff_users_are_profiled_from_anywhere(self):
+        staff = User.objects.create_user('analyst', password='x', is_staff=True)
+        self.client.force_login(staff)
+        response = self.check(HTTP_X_PROFILE='1')
+        self.assertEqual(RequestProfile.objects.get(pk=response['X-Profile-Id']).requested_by, 'analyst')  # type: ignore
+
+    def test_requests_that_may_not_profile(self):
+        self.assertNotIn('X-Profile-Id', self.check(REMOTE_ADDR='10.1.2.3'))  # No header
+        self.assertNotIn('X-Profile-Id', self.check(HTTP_X_PROFILE='1'))  # External, not staff
+        self.client.force_login(User.objects.create_user('customer', password='x'))
+        self.assertNotIn('X-Profile-Id', self.check(HTTP_X_PROFILE='1'))
+        with override_settings(PROFILING_ENABLED=False):
+            self.assertNotIn('X-Profile-Id', self.check(HTTP_X_PROFILE='1', REMOTE_ADDR='10.1.2.3'))
+        self.assertFalse(RequestProfile.objects.exists())  # type: ignore
+
+    @override_settings(PROFILING_KEEP=2)
+    def test_old_profiles_are_pruned(self):
+        ids = [int(self.check(HTTP_X_PROFILE='1', REMOTE_ADDR='10.1.2.3')['X-Profile-Id']) for _ in range(4)]
+        self.assertEqual(list(RequestProfile.objects.values_list('pk', flat=True).order_by('pk')), ids[2:])  # type: ignore
+
+    def test_admin_pages(self):
+        profile_id = self.check(HTTP_X_PROFILE='1', REMOTE_ADDR='10.1.2.3')['X-Profile-Id']
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        response = self.client.get('/admin/loans/requestprofile/')
+        self.assertContains(response, '/loans/check-eligibility/')
+        response = self.client.get(f'/admin/loans/requestprofile/{profile_id}/change/')
+        self.assertContains(response, 'check_eligibility')
+        self.assertContains(response, 'SELECT')
+        response = self.client.get(f'/admin/loans/requestprofile/{profile_id}/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="request-profile-{profile_id}.prof"')
+
+
+class ScoreSnapshotTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        credit_cache.clear()
+        today = date.today()
+        self.customers = []
+        for i, loans in enumerate([
+            [],  # New customer
+            [(250000, 24, 24, date(2018, 1, 1), date(2020, 1, 1))],  # Only ended loans
+            [(100000, 12, 5, today - timedelta(days=40), today + timedelta(days=300)),
+             (333333.33, 36, 30, date(2019, 6, 1), today + timedelta(days=100)),
+             (50000, 6, 0, date(today.year, 1, 1), today + timedelta(days=10))],
+            [(5000000, 60, 10, date(2022, 3, 1), today + timedelta(days=900))],  # Debt above the limit
+        ]):
+            customer = Customer.objects.create(  # type: ignore
+                first_name='Snapshot', last_name=str(i), age=30, phone_number=f'90000000{i:02d}',
+                monthly_salary=60000, approved_limit=2200000
+            )
+            for amount, tenure, paid, start, end in loans:
+                Loan.objects.create(  # type: ignore
+                    customer=customer, loan_amount=Decimal(str(amount)), tenure=tenure, interest_rate=Decimal('11'),
+                    monthly_repayment=Decimal(str(calculate_monthly_installment(amount, tenure, 11))),
+                    emis_paid_on_time=paid, start_date=start, end_date=end
+                )
+            self.customers.append(customer)
+        # Snapshots only describe customers last written before their loans were read
+        Customer.objects.update(updated_at=timezone.now() - timedelta(minutes=5))  # type: ignore
+
+    def test_vectorized_scores_match_scalar(self):
+        result = rescore_customers(chunk_size=2, sample_size=10)
+        self.assertEqual(result['customers'], 4)
+        self.assertEqual(result['loans'], 5)
+        self.assertEqual((result['sampled'], result['mismatches']), (4, []))
+        for customer in Customer.objects.all():  # type: ignore
+            summary = get_credit_summary(customer)
+            snapshot = CreditScoreSnapshot.objects.get(customer=customer)  # type: ignore
+            self.assertEqual(snapshot.credit_score, calculate_credit_score(customer, summary))
+            self.assertEqual(snapshot.active_monthly_emi, summary.active_monthly_emi)
+            self.assertEqual(snapshot.active_debt, summary.active_debt)
+        scores = dict(CreditScoreSnapshot.objects.values_list('customer_id', 'credit_score'))  # type: ignore
+        self.assertEqual(scores[self.customers[0].customer_id], 50)
+        self.assertEqual(scores[self.customers[3].customer_id], 0)
+
+    def test_profiles_read_current_snapshots(self):
+        rescore_customers(sample_size=0)
+        customer = self.customers[2]
+        expected = get_credit_profile(customer.customer_id, use_cache=False)
+        credit_cache.clear()
+        cache.clear()
+        with self.assertNumQueries(1):  # Customer and snapshot in one join
+            self.assertEqual(get_credit_profile(customer.customer_id), expected)
+        credit_cache.clear()
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(read_credit_profile(customer.customer_id), expected)
+        credit_cache.clear()
+        cache.clear()
+        self.assertEqual(get_credit_profiles([customer.customer_id])[customer.customer_id], expected)
+
+    def test_writes_after_rescoring_fall_back_to_summaries(self):
+        rescore_customers(sample_size=0)
+        customer = self.customers[0]
+        Loan.objects.create(  # type: ignore
+            customer=customer, loan_amount=Decimal('100000'), tenure=12, interest_rate=Decimal('11'),
+            monthly_repayment=Decimal('8838.17'), emis_paid_on_time=0,
+            start_date=date.today(), end_date=date.today() + timedelta(days=365)
+        )
+        credit_cache.clear()
+        cache.clear()
+        profile = get_credit_profile(customer.customer_id)
+        self.assertEqual(profile['current_emis'], Decimal('8838.17'))
+        self.assertNotEqual(profile['credit_score'], 50)
+
+        # The sample skips snapshots that no longer describe their customer
+        self.assertEqual(verify_snapshots(10, date.today())[0], 3)
+
+    def test_verification_reports_mismatches(self):
+        rescore_customers(sample_size=0)
+        CreditScoreSnapshot.objects.filter(customer=self.customers[2]).update(credit_score=99)  # type: ignore
+        with self.assertLogs('loans.scoring', 'ERROR'):
+            sampled, mismatches = verify_snapshots(10, date.today())
+        self.assertEqual(sampled, 4)
+        self.assertEqual([m['customer_id'] for m in mismatches], [self.customers[2].customer_id])
+
+    def test_verification_of_fresh_snapshots_is_read_only(self):
+        # As right after generate_data: customers written moments before the rescore
+        Customer.objects.update(updated_at=timezone.now())  # type: ignore
+        CustomerCreditSummary.objects.all().delete()  # type: ignore
+        rescore_customers(sample_size=0)
+        versions = dict(Customer.objects.values_list('customer_id', 'updated_at'))  # type: ignore
+        self.assertEqual(verify_snapshots(10, date.today()), (4, []))
+        self.assertFalse(CustomerCreditSummary.objects.exists())  # type: ignore
+        self.assertEqual(dict(Customer.objects.values_list('customer_id', 'updated_at')), versions)  # type: ignore
+
+    def test_nightly_task(self):
+        result = rescore_customers_task.apply().get()
+        self.assertEqual((result['customers'], result['mismatches']), (4, 0))
+        self.assertIn('rescore-customers', settings.CELERY_BEAT_SCHEDULE)
+
+
+class ScaleBenchmarkTestCase(TransactionTestCase):
+    def test_generated_data_is_consistent(self):
+        """generate_data follows the registration and EMI rules, and --delete removes it"""
+        Customer.objects.create(  # type: ignore
+            first_name='Real', last_name='Customer', age=30, phone_number='9600000000',
+            monthly_salary=50000, approved_limit=1800000
+        )
+        call_command('generate_data', customers=50, loans=400, batch_size=150, summary_batch_size=20,
+                     stdout=StringIO())
+        generated = Customer.objects.filter(phone_number__startswith='5')  # type: ignore
+        self.assertEqual(generated.count(), 50)
+        self.assertEqual(Loan.objects.count(), 400)  # type: ignore
+        for customer in generated:
+            self.assertEqual(customer.approved_limit, round_to_nearest_lakh(36 * customer.monthly_salary))
+        for loan in Loan.objects.all()[:50]:  # type: ignore
+            expected = calculate_monthly_installment(loan.loan_amount, loan.tenure, loan.interest_rate)
+            self.assertAlmostEqual(float(loan.monthly_repayment), expected, delta=0.011)
+            self.assertLessEqual(loan.emis_paid_on_time, loan.tenure)
+        summaries = compute_credit_summaries()
+        for summary in CustomerCreditSummary.objects.all():  # type: ignore
+            self.assertEqual(summary.loan_count, summaries[summary.customer_id].loan_count)
+        self.assertEqual(CustomerCreditSummary.objects.count(), 50)  # type: ignore
+
+        # New rows still get fresh ids after the explicit-id inserts
+        loan = Loan.objects.create(  # type: ignore
+            customer=generated.first(), loan_amount=1000, tenure=6, interest_rate=10,
+            monthly_repayment=171.56, emis_paid_on_time=0, start_date=date.today(), end_date=date.today()
+        )
+        self.assertGreater(loan.loan_id, 400)
+
+        # Real customers whose numbers merely start like generated ones are kept
+        for phone_number in ['5999999999', '5000000001', '51']:
+            real = Customer.objects.create(  # type: ignore
+                first_name='Real', last_name='Customer', age=30, phone_number=phone_number,
+                monthly_salary=50000, approved_limit=1800000
+            )
+        Loan.objects.create(  # type: ignore
+            customer=real, loan_amount=1000, tenure=6, interest_rate=10,
+            monthly_repayment=171.56, emis_paid_on_time=0, start_date=date.today(), end_date=date.today()
+        )
+        call_command('generate_data', delete=True, stdout=StringIO())
+        self.assertEqual(Customer.objects.count(), 4)  # type: ignore
+        self.assertEqual(list(Loan.objects.values_list('customer_id', flat=True)), [real.pk])  # type: ignore
+
+    def test_delete_after_rescore(self):
+        """--delete also removes the score snapshots and loan applications of generated customers"""
+        call_command('generate_data', customers=10, loans=40, stdout=StringIO())
+        rescore_customers(sample_size=0)
+        loan = Loan.objects.first()  # type: ignore
+        for decided_loan in (loan, None):
+            LoanApplication.objects.create(  # type: ignore
+                customer_id=loan.customer_id, loan_amount=1000, interest_rate=12, tenure=6, loan=decided_loan
+            )
+        self.assertEqual(CreditScoreSnapshot.objects.count(), 10)  # type: ignore
+        call_command('generate_data', delete=True, stdout=StringIO())
+        self.assertFalse(Customer.objects.exists())  # type: ignore
+        self.assertFalse(CreditScoreSnapshot.objects.exists())  # type: ignore
+        self.assertFalse(LoanApplication.objects.exists())  # type: ignore
+
+    def test_load_test_report(self):
+        """load_test drives every endpoint in the mix and saves a comparable JSON report"""
+        call_command('generate_data', customers=20, loans=100, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            out = StringIO()
+            call_command('load_test', requests=40, warmup=0, threads=2, output=path, seed=1,
+                         mix='register=1,check-eligibility=1,create-loan=1,view-loan=1,view-loans=1', stdout=out)
+            with open(path) as f:
+                report = json.load(f)
+            call_command('load_test', requests=5, warmup=0, threads=1, output=os.path.join(directory, 'next.json'),
+                         compare=path, stdout=out)
+        self.assertIn('Change against', out.getvalue())
+        self.assertEqual(
+            set(report['endpoints']), {'register', 'check-eligibility', 'create-loan', 'view-loan', 'view-loans'}
+        )
+        # A seeded run of a fixed size sends the same requests every time
+        self.assertEqual(report['overall']['requests'], 40)
+        self.assertEqual(sum(stats['requests'] for stats in report['endpoints'].values()), 40)
+        view_loan = report['endpoints']['view-loan']
+        self.assertEqual(set(view_loan['latency_ms']), {'mean', 'p50', 'p95', 'p99', 'max'})
+        self.assertGreaterEqual(view_loan['queries_per_request']['mean'], 1)
+        self.assertEqual(report['overall']['errors'], 0)
+
+    def test_unknown_endpoint_in_mix(self):
+        with self.assertRaises(CommandError):
+            call_command('load_test', mix='view-loan=1,delete-everything=1', stdout=StringIO())
+
+
+class LoanOfferTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        credit_cache.clear()
+        today = date.today()
+        # A new customer scores 50, so the lowest rate approved for them is 12%
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Offer', last_name='User', age=35, phone_number='9300000001',
+            monthly_salary=75000, approved_limit=2700000
+        )
+        Loan.objects.create(  # type: ignore
+            customer=Customer.objects.create(  # type: ignore
+                first_name='Other', last_name='User', age=35, phone_number='9300000002',
+                monthly_salary=75000, approved_limit=2700000
+            ),
+            loan_amount=Decimal('200000'), tenure=24, interest_rate=Decimal('12'),
+            monthly_repayment=Decimal('9414.69'), emis_paid_on_time=24,
+            start_date=today - timedelta(days=30), end_date=today + timedelta(days=700)
+        )
+
+    def offer(self, customer_id, **params):
+        return self.client.get(f'/loans/offer/{customer_id}/', params)
+
+    def check(self, customer_id, amount, rate, tenure):
+        return self.client.post('/loans/check-eligibility/', {
+            'customer_id': customer_id, 'loan_amount': amount, 'interest_rate': rate, 'tenure': tenure
+        }, format='json').json()
+
+    def test_offers_are_the_largest_approved_amounts(self):
+        """check-eligibility approves every offered amount and rejects one paisa more"""
+        for customer in Customer.objects.all():  # type: ignore
+            response = self.offer(customer.customer_id, interest_rate='9.5', tenures='1,6,13,36,360')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            rate = data['corrected_interest_rate'] or data['interest_rate']
+            self.assertEqual([offer['tenure'] for offer in data['offers']], [1, 6, 13, 36, 360])
+            for offer in data['offers']:
+                amount = Decimal(str(offer['max_loan_amount']))
+                self.assertGreater(amount, 0)
+                approved = self.check(customer.customer_id, str(amount), rate, offer['tenure'])
+                self.assertTrue(approved['approval'])
+                self.assertEqual(approved['monthly_installment'], offer['monthly_installment'])
+                rejected = self.check(customer.customer_id, str(amount + Decimal('0.01')), rate, offer['tenure'])
+                self.assertFalse(rejected['approval'])
+
+    def test_rate_is_raised_to_the_score_band(self):
+        data = self.offer(self.customer.customer_id, interest_rate='8').json()
+        self.assertEqual(data['minimum_interest_rate'], 12.0)
+        self.assertEqual(data['corrected_interest_rate'], 12.0)
+        self.assertEqual(data['monthly_headroom'], 37500.0)
+        self.assertEqual([offer['tenure'] for offer in data['offers']], settings.OFFER_TENURES)
+        self.assertTrue(data['approval'])
+
+        data = self.offer(self.customer.customer_id, interest_rate='14').json()
+        self.assertIsNone(data['corrected_interest_rate'])
+        self.assertEqual(data['interest_rate'], 14.0)
+
+    def test_no_offers_without_headroom_or_score(self):
+        Loan.objects.create(  # type: ignore
+            customer=self.customer, loan_amount=Decimal('3000000'), tenure=60, interest_rate=Decimal('12'),
+            monthly_repayment=Decimal('40000'), emis_paid_on_time=0,
+            start_date=date.today() - timedelta(days=30), end_date=date.today() + timedelta(days=1800)
+        )
+        cache.clear()
+        credit_cache.clear()
+        data = self.offer(self.customer.customer_id, interest_rate='20').json()
+        self.assertFalse(data['approval'])
+        self.assertIsNone(data['minimum_interest_rate'])
+        self.assertEqual(data['monthly_headroom'], 0.0)
+        self.assertTrue(all(offer['max_loan_amount'] == 0 for offer in data['offers']))
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.offer(999999, interest_rate='12').status_code, status.HTTP_404_NOT_FOUND)
+        for params in [{}, {'interest_rate': '-1'}, {'interest_rate': '12', 'tenures': '12,abc'},
+                       {'interest_rate': '12', 'tenures': '0,12'}, {'interest_rate': '12', 'tenures': '361'}]:
+            response = self.offer(self.customer.customer_id, **params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class IdempotencyKeyTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        credit_cache.clear()
+        idempotency.store._down_until = 0.0
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Retry', last_name='User', age=35, phone_number='9400000001',
+            monthly_salary=100000, approved_limit=3600000
+        )
+        self.payload = {'customer_id': self.customer.customer_id, 'loan_amount': 200000,
+                        'interest_rate': 12, 'tenure': 12}
+
+    def post(self, key, payload=None, barrier=None):
+        try:
+            if barrier:
+                barrier.wait()
+            return APIClient().post('/loans/create-loan/', payload or self.payload, format='json',
+                                    HTTP_IDEMPOTENCY_KEY=key)
+        finally:
+            connections.close_all()
+
+    def test_retries_replay_the_first_response(self):
+        first = self.post('retry-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)  # type: ignore
+        with self.assertNumQueries(0):
+            replay = self.post('retry-1')
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assertEqual(replay.json(), first.json())  # type: ignore
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(Loan.objects.filter(customer=self.customer).count(), 1)  # type: ignore
+
+        # Another key is another application
+        self.assertNotEqual(self.post('retry-2').json()['loan_id'], first.json()['loan_id'])  # type: ignore
+
+    def test_concurrent_duplicates_wait_for_the_first(self):
+        count = 6
+        barrier = threading.Barrier(count)
+        with ThreadPoolExecutor(count) as pool:
+            responses = list(pool.map(lambda _: self.post('storm', barrier=barrier), range(count)))
+        self.assertEqual({r.status_code for r in responses}, {status.HTTP_201_CREATED})  # type: ignore
+        self.assertEqual(len({r.json()['loan_id'] for r in responses}), 1)  # type: ignore
+        self.assertEqual(Loan.objects.filter(customer=self.customer).count(), 1)  # type: ignore
+
+    def test_key_reused_for_another_request(self):
+        self.post('reused')
+        response = self.post('reused', {**self.payload, 'loan_amount': 100000})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)  # type: ignore
+        self.assertEqual(self.post('x' * 256).status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+
+    def test_keys_belong_to_the_customer(self):
+        other = Customer.objects.create(  # type: ignore
+            first_name='Other', last_name='User', age=35, phone_number='9400000002',
+            monthly_salary=100000, approved_limit=3600000
+        )
+        first = self.post('shared')
+        second = self.post('shared', {**self.payload, 'customer_id': other.customer_id})
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assertFalse(second.has_header('Idempotent-Replayed'))
+        self.assertNotEqual(second.json()['loan_id'], first.json()['loan_id'])  # type: ignore
+        self.assertEqual(Loan.objects.filter(customer=other).count(), 1)  # type: ignore
+
+    def hold_in_flight(self, key, acquired, release):
+        # Another request's connection holding the in-flight lock
+        try:
+            with idempotency.in_flight(key) as held:
+                if held:
+                    acquired.set()
+                    release.wait(10)
+        finally:
+            connections.close_all()
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0.1)
+    def test_in_flight_request_past_the_wait(self):
+        key = idempotency.idempotency_key('create-loan', f'customer:{self.customer.customer_id}', 'slow')
+        acquired, release = threading.Event(), threading.Event()
+        holder = threading.Thread(target=self.hold_in_flight, args=(key, acquired, release))
+        holder.start()
+        try:
+            self.assertTrue(acquired.wait(10))
+            # Held past any lock timeout: duplicates still wait rather than run
+            response = self.post('slow')
+        finally:
+            release.set()
+            holder.join()
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)  # type: ignore
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Loan.objects.exists())  # type: ignore
+
+        # Once the first request finishes, the retry runs
+        self.assertEqual(self.post('slow').status_code, status.HTTP_201_CREATED)  # type: ignore
+
+    def test_database_fallback_while_redis_is_down(self):
+        backend = type(caches['default'])
+        with mock.patch.object(backend, 'set', side_effect=ConnectionError('down')), \
+                mock.patch.object(backend, 'get', side_effect=ConnectionError('down')), \
+                self.assertLogs('loans.idempotency', 'WARNING'):
+            first = self.post('fallback')
+            replay = self.post('fallback')
+        self.assertEqual(replay.json(), first.json())  # type: ignore
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        row = IdempotencyKey.objects.get()  # type: ignore
+        key = idempotency.idempotency_key('create-loan', f'customer:{self.customer.customer_id}', 'fallback')
+        self.assertEqual((row.key, row.status_code), (key, 201))
+        self.assertEqual(Loan.objects.count(), 1)  # type: ignore
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())  # type: ignore
+        expire_idempotency_keys()
+        self.assertFalse(IdempotencyKey.objects.exists())  # type: ignore
+
+
+@override_settings(
+    ADMISSION_CONTROL_ENABLED=True,
+    RATE_LIMITS={'customer': (60, 2), 'client': (60, 3)},
+    SHED_LATENCY_MS={'low': 20, 'normal': 80},
+)
+class AdmissionControlTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        credit_cache.clear()
+        limiter.clear()
+        db_latency.clear()
+        self.customers = [
+            Customer.objects.create(  # type: ignore
+                first_name='Busy', last_name=str(i), age=35, phone_number=f'950000000{i}',
+                monthly_salary=100000, approved_limit=3600000
+            )
+            for i in range(2)
+        ]
+
+    def tearDown(self):
+        limiter.clear()
+        db_latency.clear()
+
+    def check(self, customer):
+        return self.client.post('/loans/check-eligibility/', {
+            'customer_id': customer.customer_id, 'loan_amount': 100000, 'interest_rate': 12, 'tenure': 12
+        }, format='json')
+
+    async def async_check(self, customer):
+        return await AsyncClient().post(
+            '/loans/async/check-eligibility/', {'customer_id': customer.customer_id}, content_type='application/json'
+        )
+
+    def shed_count(self, view, priority, reason):
+        return REGISTRY.get_sample_value(
+            'credit_requests_shed_total', {'view': view, 'priority': priority, 'reason': reason}
+        ) or 0
+
+    def test_rate_limits_per_customer_and_client(self):
+        before = self.shed_count('check_eligibility', 'low', 'customer_rate_limit')
+        codes = [self.check(self.customers[0]).status_code for _ in range(3)]  # type: ignore
+        self.assertEqual(codes, [200, 200, 429])
+        limited = self.check(self.customers[0])
+        self.assertEqual(int(limited['Retry-After']), 1)
+        self.assertEqual(self.shed_count('check_eligibility', 'low', 'customer_rate_limit'), before + 2)
+
+        # The other customer has a bucket of their own, but the client's empties
+        codes = [self.check(self.customers[1]).status_code for _ in range(2)]  # type: ignore
+        self.assertEqual(codes, [200, 429])
+        self.assertGreater(self.shed_count('check_eligibility', 'low', 'client_rate_limit'), 0)
+
+    def test_low_priority_is_shed_first_under_database_latency(self):
+        db_latency.seconds = 0.05  # Past the low threshold, below the normal one
+        loan = Loan.objects.create(  # type: ignore
+            customer=self.customers[0], loan_amount=Decimal('50000'), tenure=12, interest_rate=Decimal('10'),
+            monthly_repayment=Decimal('4395.79'), emis_paid_on_time=0,
+            start_date=date.today(), end_date=date.today() + timedelta(days=360)
+        )
+        with mock.patch('loans.admission.random.random', return_value=0.5), \
+                self.assertNumQueries(0):
+            shed = self.check(self.customers[0])
+            async_shed = async_to_sync(self.async_check)(self.customers[0])
+        self.assertEqual(shed.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)  # type: ignore
+        self.assertEqual(shed['Retry-After'], str(settings.SHED_RETRY_AFTER))
+        self.assertEqual(async_shed.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        with mock.patch('loans.admission.random.random', return_value=0.5):
+            self.assertEqual(self.client.get(f'/loans/view-loan/{loan.loan_id}/').status_code, 200)  # type: ignore
+            created = self.client.post('/loans/create-loan/', {
+                'customer_id': self.customers[1].customer_id, 'loan_amount': 100000, 'interest_rate': 12,
+                'tenure': 12
+            }, format='json')
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)  # type: ignore
+
+    def test_latency_follows_observed_queries(self):
+        db_latency.observe(0, 0)
+        self.assertEqual(db_latency.seconds, 0)
+        for _ in range(200):
+            db_latency.observe(0.5, 10)
+        self.assertAlmostEqual(db_latency.seconds, 0.05, places=4)
+        with override_settings(ADMISSION_CONTROL_ENABLED=False):
+            self.assertEqual(self.check(self.customers[0]).status_code, status.HTTP_200_OK)  # type: ignore
+
+
+class LoanApplicationQueueTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        credit_cache.clear()
+        self.client = APIClient()
+        self.customer = Customer.objects.create(  # type: ignore
+            first_name='Queued', last_name='User', age=35, phone_number='9600000001',
+            monthly_salary=100000, approved_limit=3600000
+        )
+        # Each 337000 loan's EMI (~29942) fits the 50000 headroom alone, but not twice
+        self.payload = {'customer_id': self.customer.customer_id, 'loan_amount': 337000,
+                        'interest_rate': 12, 'tenure': 12}
+
+    def submit(self, **changes):
+        return self.client.post('/loans/applications/', {**self.payload, **changes}, format='json')
+
+    def test_submission_is_decided_by_the_worker(self):
+        with mock.patch.object(process_loan_applications, 'delay') as delay:
+            response = self.submit()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)  # type: ignore
+        data = response.json()  # type: ignore
+        self.assertEqual(data['status'], 'pending')
+        self.assertEqual(response['Location'], f"/loans/applications/{data['application_id']}/")
+        delay.assert_called_once_with(self.customer.customer_id)
+        self.assertFalse(Loan.objects.exists())  # type: ignore
+
+        pending = self.client.get(response['Location']).json()  # type: ignore
+        self.assertEqual((pending['status'], pending['loan_approved'], pending['loan_id']), ('pending', None, None))
+
+        process_loan_applications.apply(args=[self.customer.customer_id])
+        decided = self.client.get(response['Location']).json()  # type: ignore
+        loan = Loan.objects.get()  # type: ignore
+        self.assertEqual(decided['status'], 'approved')
+        self.assertTrue(decided['loan_approved'])
+        self.assertEqual(decided['loan_id'], loan.loan_id)
+        self.assertEqual(decided['monthly_installment'], calculate_monthly_installment(337000, 12, 12))
+        self.assertIsNotNone(decided['processed_at'])
+
+    def test_applications_are_decided_in_submission_order(self):
+        with mock.patch.object(process_loan_applications, 'delay'):
+            # With one loan taken the score falls to the 16% band
+            ids = [self.submit(loan_amount=amount, interest_rate=rate).json()['application_id']  # type: ignore
+                   for amount, rate in [(337000, 12), (337000, 12), (100000, 16)]]
+
+        def work(_):
+            try:
+                return applications.process_pending_applications(self.customer.customer_id)
+            finally:
+                connections.close_all()
+
+        # Workers racing on one customer decide each application once, oldest first
+        with ThreadPoolExecutor(4) as pool:
+            self.assertEqual(sum(pool.map(work, range(4))), 3)
+        statuses = [LoanApplication.objects.get(pk=pk).status for pk in ids]  # type: ignore
+        self.assertEqual(statuses, ['approved', 'rejected', 'approved'])
+        self.assertEqual(Loan.objects.count(), 2)  # type: ignore
+
+    def test_failed_application_does_not_block_the_next(self):
+        with mock.patch.object(process_loan_applications, 'delay'):
+            first = self.submit().json()['application_id']  # type: ignore
+            second = self.submit(loan_amount=100000).json()['application_id']  # type: ignore
+        apply_for_loan = applications.apply_for_loan
+        calls = []
+
+        def flaky(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError('scoring failed')
+            return apply_for_loan(*args)
+
+        with mock.patch.object(applications, 'apply_for_loan', flaky), self.assertLogs('loans.applications', 'ERROR'):
+            applications.process_pending_applications(self.customer.customer_id)
+        failed = LoanApplication.objects.get(pk=first)  # type: ignore
+        self.assertEqual((failed.status, failed.error), ('failed', 'scoring failed'))
+        self.assertEqual(LoanApplication.objects.get(pk=second).status, 'approved')  # type: ignore
+
+    def test_applications_left_pending_are_requeued(self):
+        with mock.patch.object(process_loan_applications, 'delay', side_effect=ConnectionError('broker down')), \
+                self.assertLogs('loans.tasks', 'WARNING'):
+            response = self.submit()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)  # type: ignore
+
+        LoanApplication.objects.update(submitted_at=timezone.now() - timedelta(minutes=10))  # type: ignore
+        with mock.patch.object(process_loan_applications, 'delay') as delay:
+            requeue_loan_applications.apply()
+        delay.assert_called_once_with(self.customer.customer_id)
+
+    def test_invalid_submissions(self):
+        self.assertEqual(self.submit(customer_id=999999).status_code, status.HTTP_404_NOT_FOUND)  # type: ignore
+        self.assertEqual(self.submit(loan_amount='lots').status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        self.assertEqual(self.client.get('/loans/applications/999999/').status_code,  # type: ignore
+                         status.HTTP_404_NOT_FOUND)
+        self.assertFalse(LoanApplication.objects.exists())  # type: ignore
+
+
+class BulkRegistrationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Customer.objects.create(  # type: ignore
+            first_name='Existing', last_name='User', age=40, phone_number='9700000000',
+            monthly_salary=50000, approved_limit=1800000
+        )
+
+    def registration(self, i, **changes):
+        return {'first_name': 'Bulk', 'last_name': f'User{i}', 'age': 30,
+                'monthly_income': 41234 + i * 1000, 'phone_number': f'97100{i:05d}', **changes}
+
+    def register(self, registrations):
+        return self.client.post('/loans/register/batch/', registrations, format='json')
+
+    def test_rows_match_single_registrations(self):
+        registrations = [
+            self.registration(0),
+            self.registration(1, phone_number='9700000000'),  # Already registered
+            self.registration(2, age=12),
+            self.registration(3, phone_number='9710000000'),  # Repeats row 0
+            self.registration(4),
+        ]
+        response = self.register(registrations)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        data = response.json()  # type: ignore
+        results = data['results']
+        self.assertEqual(data['created'], 2)
+        self.assertEqual(results[1], {'phone_number': ['Phone number already exists.']})
+        self.assertIn('age', results[2])
+        self.assertEqual(results[3], {'phone_number': ['Phone number repeats row 0 of this batch.']})
+
+        for index in (0, 4):
+            customer = Customer.objects.get(pk=results[index]['customer_id'])  # type: ignore
+            self.assertEqual(customer.phone_number, registrations[index]['phone_number'])
+            self.assertEqual(customer.approved_limit,
+                             round_to_nearest_lakh(36 * Decimal(registrations[index]['monthly_income'])))
+            single = self.client.post('/loans/register/', self.registration(index + 50), format='json').json()
+            self.assertEqual(set(results[index]), set(single))  # type: ignore
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        with CaptureQueriesContext(connection) as small:
+            self.register([self.registration(i) for i in range(3)])
+        with CaptureQueriesContext(connection) as large:
+            response = self.register([self.registration(i) for i in range(100, 400)])
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(response.json()['created'], 300)  # type: ignore
+        self.assertEqual(Customer.objects.count(), 304)  # type: ignore
+
+    def test_phone_registered_during_the_batch(self):
+        """A phone number taken after the duplicate check fails its row only"""
+        Customer.objects.create(  # type: ignore
+            first_name='Racer', last_name='User', age=30, phone_number='9710000001',
+            monthly_salary=30000, approved_limit=1100000
+        )
+        registered_phone_numbers = views._registered_phone_numbers
+        checks = []
+
+        def check_before_the_race(phone_numbers):
+            checks.append(phone_numbers)
+            return set() if len(checks) == 1 else registered_phone_numbers(phone_numbers)
+
+        with mock.patch.object(views, '_registered_phone_numbers', check_before_the_race):
+            results = self.register([self.registration(0), self.registration(1)]).json()['results']  # type: ignore
+        self.assertEqual(results[1], {'phone_number': ['Phone number already exists.']})
+        self.assertEqual(Customer.objects.get(pk=results[0]['customer_id']).last_name, 'User0')  # type: ignore
+
+    def test_invalid_batches(self):
+        self.assertEqual(self.register(self.registration(0)).status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        with override_settings(REGISTRATION_BATCH_MAX_SIZE=2):
+            response = self.register([self.registration(i) for i in range(3)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        self.assertEqual(Customer.objects.count(), 1)  # type: ignore
@@ -1,50 +1,90 @@
 from decimal import Decimal
-from datetime import datetime, date
-from .models import Loan, Customer
-import math
+from datetime import date
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from .cache import credit_cache, credit_profile_key, seconds_until_midnight_utc
+from .models import Loan, Customer, CustomerCreditSummary
+from .routers import current_read_alias
+from .summaries import get_credit_summaries, get_credit_summary, summary_components
+import numpy as np
 
 
-def calculate_credit_score(customer):
-    """Calculate credit score based on historical data"""
-    loans = Loan.objects.filter(customer=customer)  # type: ignore
-    
-    if not loans.exists():  # type: ignore
+def credit_score_aggregates(today=None):
+    """Conditional aggregates for the five credit score components"""
+    today = today or date.today()
+    return {
+        'num_loans': Count('loan_id'),
+        'total_emis': Sum('tenure'),
+        'paid_on_time': Sum('emis_paid_on_time'),
+        # A half-open date range keeps the filter sargable on (customer, start_date)
+        'current_year_loans': Count('loan_id', filter=Q(
+            start_date__gte=date(today.year, 1, 1), start_date__lt=date(today.year + 1, 1, 1)
+        )),
+        'total_loan_amount': Sum('loan_amount'),
+        'current_debt': Sum('loan_amount', filter=Q(end_date__gt=today)),
+    }
+
+
+def score_from_components(components, approved_limit):
+    """Turn aggregated loan history into a credit score"""
+    if not components or not components['num_loans']:
         return 50  # Default score for new customers
-    
+
     # Component 1: Past loans paid on time (40% weightage)
-    total_emis = sum(loan.tenure for loan in loans)
-    paid_on_time = sum(loan.emis_paid_on_time for loan in loans)
+    total_emis = components['total_emis'] or 0
+    paid_on_time = components['paid_on_time'] or 0
     on_time_ratio = paid_on_time / total_emis if total_emis > 0 else 0
-    
+
     # Component 2: Number of loans taken (20% weightage)
-    num_loans = loans.count()  # type: ignore
-    
+    num_loans = components['num_loans']
+
     # Component 3: Loan activity in current year (20% weightage)
-    current_year = datetime.now().year
-    current_year_loans = loans.filter(start_date__year=current_year).count()  # type: ignore
-    
+    current_year_loans = components['current_year_loans']
+
     # Component 4: Loan approved volume (20% weightage)
-    total_loan_amount = sum(loan.loan_amount for loan in loans)
-    
+    total_loan_amount = components['total_loan_amount'] or 0
+
     # Component 5: Current debt vs approved limit
-    current_debt = sum(
-        loan.loan_amount for loan in loans 
-        if loan.end_date > date.today()
-    )
-    
-    if current_debt > customer.approved_limit:
+    current_debt = components['current_debt'] or 0
+
+    if current_debt > approved_limit:
         return 0
-    
+
     # Calculate score (weighted average)
     score = 0
     score += on_time_ratio * 40  # 40% weight for payment history
     score += min(num_loans * 5, 20)  # Up to 20 points for loan history
     score += min(current_year_loans * 10, 20)  # Up to 20 points for current activity
     score += min(float(total_loan_amount) / 1000000 * 10, 20)  # Up to 20 points for volume
-    
+
     return min(max(score, 0), 100)
 
 
+def calculate_credit_score(customer, summary=None):
+    """Calculate credit score based on historical data"""
+    summary = summary or get_credit_summary(customer)
+    return score_from_components(summary_components(summary), customer.approved_limit)
+
+
+def calculate_credit_scores(customers):
+    """Calculate credit scores for many customers with one grouped query"""
+    customers = list(customers)
+    rows = (
+        Loan.objects.filter(customer__in=customers)  # type: ignore
+        .values('customer_id')
+        .annotate(**credit_score_aggregates())
+        .order_by()
+    )
+    components = {row['customer_id']: row for row in rows}
+    return {
+        customer.customer_id: score_from_components(
+            components.get(customer.customer_id), customer.approved_limit
+        )
+        for customer in customers
+    }
+
+
 def calculate_monthly_installment(loan_amount, tenure, interest_rate):
     """Calculate monthly installment using compound interest formula"""
     P = float(loan_amount)
@@ -59,6 +99,84 @@ def calculate_monthly_installment(loan_amount, tenure, interest_rate):
     return round(emi, 2)
 
 
+def calculate_monthly_installments(loan_amounts, tenures, interest_rates):
+    """Vectorized calculate_monthly_installment over arrays of loan terms"""
+    P = np.asarray(loan_amounts, dtype=np.float64)
+    r = np.asarray(interest_rates, dtype=np.float64) / (12 * 100)  # Monthly interest rates
+    n = np.asarray(tenures, dtype=np.int64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        emi = P * r * (1 + r) ** n / ((1 + r) ** n - 1)
+    rounded = np.round(emi, 2)
+    # np.round can differ from Python's round only next to a half-cent tie,
+    # so re-round those few values the scalar way to keep results identical
+    cents = emi * 100
+    tolerance = np.maximum(1e-6, np.abs(cents) * 1e-15)
+    ties = np.flatnonzero(np.abs(cents - np.floor(cents) - 0.5) < tolerance)
+    rounded[ties] = [round(value, 2) for value in emi[ties].tolist()]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(r == 0, P / n, rounded)
+
+
+def batch_loan_eligibility(profiles, loan_amounts, interest_rates, tenures):
+    """Vectorized eligibility_from_profile for many applications at once"""
+    rates = np.asarray(interest_rates, dtype=np.float64)
+    new_emis = calculate_monthly_installments(loan_amounts, tenures, rates)
+
+    # Compare in thousandths of a rupee, where salary/2 and existing EMIs are exact
+    current = np.array([int(p['current_emis'] * 1000) for p in profiles], dtype=np.float64)
+    limit = np.array([int(p['monthly_salary'] * 500) for p in profiles], dtype=np.float64)
+    within_limit = current + np.round(new_emis * 1000, 6) <= limit
+
+    scores = np.array([p['credit_score'] for p in profiles], dtype=np.float64)
+    approved = within_limit & (
+        (scores > 50)
+        | ((scores > 30) & (scores <= 50) & (rates >= 12))
+        | ((scores > 10) & (scores <= 30) & (rates >= 16))
+    )
+    return approved, scores, new_emis
+
+
+def max_loan_amounts(headroom, tenures, interest_rate):
+    """Largest loan amounts whose EMI fits in headroom, for each tenure
+
+    Inverts the calculate_monthly_installment formula in closed form, then
+    steps back a paisa where EMI rounding would overshoot. Returns the amounts
+    and their EMIs as arrays.
+    """
+    limit = int(Decimal(headroom) * 1000)  # Thousandths of a rupee, as in batch_loan_eligibility
+    n = np.asarray(tenures, dtype=np.int64)
+    r = float(interest_rate) / (12 * 100)
+    rates = np.full(n.shape, float(interest_rate))
+    if limit <= 0:
+        return np.zeros(n.shape), np.zeros(n.shape)
+
+    if r == 0:
+        # Interest-free EMIs are P / n, unrounded: P in paise is at most limit * n / 10
+        amounts = (limit * n // 10) / 100
+    else:
+        growth = (1 + r) ** n
+        factor = r * growth / (growth - 1)  # EMI per rupee borrowed
+        # EMIs are rounded to the paisa, so up to half a paisa over the last whole paisa still fits
+        amounts = np.floor(((limit // 10) / 100 + 0.005) / factor * 100) / 100
+    # Comparing the float EMI with the float headroom orders them as
+    # eligibility_from_profile's Decimal comparison does
+    emis = calculate_monthly_installments(amounts, n, rates)
+    amounts = np.round(np.where(emis > limit / 1000, amounts - 0.01, amounts), 2)
+    return amounts, calculate_monthly_installments(amounts, n, rates)
+
+
+def minimum_interest_rate(credit_score):
+    """Lowest rate eligibility_from_profile approves for a credit score; None if it approves none"""
+    if credit_score > 50:
+        return 0.0
+    elif credit_score > 30:
+        return 12.0
+    elif credit_score > 10:
+        return 16.0
+    return None
+
+
 def get_corrected_interest_rate(credit_score, requested_rate):
     """Get corrected interest rate based on credit score"""
     if credit_score > 50:
@@ -71,21 +189,187 @@ def get_corrected_interest_rate(credit_score, requested_rate):
         return None  # Loan not approved
 
 
-def check_loan_eligibility(customer, loan_amount, interest_rate, tenure):
+def get_credit_profile(customer_id, customer=None, use_cache=True):
+    """Cached credit score and active EMI load for a customer, None if unknown
+
+    use_cache=False reads the summary table directly, for callers holding the
+    customer lock: cache invalidation only runs after the previous holder commits.
+    """
+    key = credit_profile_key(customer_id)
+    if use_cache:
+        profile = credit_cache.get(key)
+        if profile is not None:
+            return profile
+
+    if customer is None:
+        customer = _with_snapshot(Customer.objects).filter(customer_id=customer_id).first()  # type: ignore
+        if customer is None:
+            return None
+    # Callers passing the customer hold its lock, and read the summary they write
+    profile = _snapshot_profile(customer) or _build_profile(customer, get_credit_summary(customer))
+    if use_cache:
+        credit_cache.set(key, profile, seconds_until_midnight_utc())
+    return profile
+
+
+def get_credit_profiles(customer_ids):
+    """Bulk get_credit_profile; unknown customers are left out of the result"""
+    keys = {customer_id: credit_profile_key(customer_id) for customer_id in set(customer_ids)}
+    cached = credit_cache.get_many(keys.values())
+    profiles = {
+        customer_id: cached[key] for customer_id, key in keys.items() if key in cached
+    }
+
+    missing = [customer_id for customer_id in keys if customer_id not in profiles]
+    if missing:
+        customers = _with_snapshot(Customer.objects).in_bulk(missing)  # type: ignore
+        fresh = {customer_id: _snapshot_profile(customer) for customer_id, customer in customers.items()}
+        unscored = [customer for customer in customers.values() if fresh[customer.customer_id] is None]
+        summaries = get_credit_summaries(unscored)
+        for customer in unscored:
+            fresh[customer.customer_id] = _build_profile(customer, summaries[customer.customer_id])
+        credit_cache.set_many(
+            {keys[customer_id]: profile for customer_id, profile in fresh.items()},
+            seconds_until_midnight_utc()
+        )
+        profiles.update(fresh)
+    return profiles
+
+
+def read_credit_profile(customer_id):
+    """get_credit_profile without writes, so it can run on a read replica
+
+    A summary that is missing or not yet expired up to today is not written
+    here: the profile is aggregated from the loans instead, and the next read on
+    the primary brings the summary up to date.
+    """
+    key = credit_profile_key(customer_id)
+    profile = credit_cache.get(key)
+    if profile is not None:
+        return profile
+
+    customer = _with_snapshot(Customer.objects).filter(customer_id=customer_id).first()  # type: ignore
+    if customer is None:
+        return None
+    today = date.today()
+    profile = _snapshot_profile(customer, today)
+    if profile is None:
+        summary = _current_summaries(customer_id, today).first()
+        if summary is not None:
+            profile = _build_profile(customer, summary)
+        else:
+            profile = _aggregated_profile(customer, Loan.objects.filter(  # type: ignore
+                customer_id=customer_id
+            ).aggregate(**_profile_aggregates(today)))
+    credit_cache.set(key, profile, _profile_timeout())
+    return profile
+
+
+async def aget_credit_profile(customer_id):
+    """read_credit_profile for async views; cache round-trips run off the event loop"""
+    key = credit_profile_key(customer_id)
+    profile = await sync_to_async(credit_cache.get, thread_sensitive=False)(key)
+    if profile is not None:
+        return profile
+
+    customer = await _with_snapshot(Customer.objects).filter(customer_id=customer_id).afirst()  # type: ignore
+    if customer is None:
+        return None
+    today = date.today()
+    profile = _snapshot_profile(customer, today)
+    if profile is None:
+        summary = await _current_summaries(customer_id, today).afirst()
+        if summary is not None:
+            profile = _build_profile(customer, summary)
+        else:
+            profile = _aggregated_profile(customer, await Loan.objects.filter(  # type: ignore
+                customer_id=customer_id
+            ).aaggregate(**_profile_aggregates(today)))
+    await sync_to_async(credit_cache.set, thread_sensitive=False)(key, profile, _profile_timeout())
+    return profile
+
+
+def _profile_timeout():
+    """Cache lifetime of a profile read_credit_profile just read
+
+    A lagging replica can return rows from before a write whose invalidation has
+    already run, so replica reads are only cached for as long as writes pin the
+    customer to the primary. Primary reads last the day.
+    """
+    if current_read_alias() is not None:
+        return settings.REPLICA_PIN_SECONDS
+    return seconds_until_midnight_utc()
+
+
+def _with_snapshot(customers):
+    return customers.select_related('score_snapshot')
+
+
+def _snapshot_profile(customer, today=None):
+    """Profile from the nightly score snapshot, None unless it was loaded and is current"""
+    # Only read when joined in by _with_snapshot(), to never cost a query
+    if not Customer.score_snapshot.is_cached(customer):  # type: ignore
+        return None
+    snapshot = getattr(customer, 'score_snapshot', None)
+    if snapshot is None or not snapshot.is_current(customer, today or date.today()):
+        return None
+    return _profile(customer, snapshot.credit_score, snapshot.active_monthly_emi)
+
+
+def _current_summaries(customer_id, today):
+    return CustomerCreditSummary.objects.filter(  # type: ignore
+        customer_id=customer_id, active_as_of__gte=today
+    )
+
+
+def _profile_aggregates(today):
+    return {
+        **credit_score_aggregates(today),
+        'active_emi': Sum('monthly_repayment', filter=Q(end_date__gt=today)),
+    }
+
+
+def _aggregated_profile(customer, totals):
+    return _profile_from_components(customer, totals, totals['active_emi'] or Decimal('0'))
+
+
+def _build_profile(customer, summary):
+    return _profile_from_components(customer, summary_components(summary), summary.active_monthly_emi)
+
+
+def _profile_from_components(customer, components, current_emis):
+    return _profile(customer, score_from_components(components, customer.approved_limit), current_emis)
+
+
+def _profile(customer, credit_score, current_emis):
+    return {
+        'customer_id': customer.customer_id,
+        'monthly_salary': Decimal(str(customer.monthly_salary)),
+        'approved_limit': Decimal(str(customer.approved_limit)),
+        'credit_score': credit_score,
+        'current_emis': current_emis,
+    }
+
+
+def check_loan_eligibility(customer, loan_amount, interest_rate, tenure, use_cache=True):
     """Check if customer is eligible for loan"""
-    # Calculate credit score
-    credit_score = calculate_credit_score(customer)
+    profile = get_credit_profile(customer.customer_id, customer, use_cache)
+    return eligibility_from_profile(profile, loan_amount, interest_rate, tenure)
+
+
+def eligibility_from_profile(profile, loan_amount, interest_rate, tenure):
+    """Check loan eligibility against a customer's credit profile"""
+    credit_score = profile['credit_score']
     
     # Check current EMIs
-    current_loans = Loan.objects.filter(customer=customer, end_date__gt=date.today())  # type: ignore
-    current_emis = sum(loan.monthly_repayment for loan in current_loans)
+    current_emis = profile['current_emis']
     
     # Calculate new EMI
     new_emi = calculate_monthly_installment(loan_amount, tenure, interest_rate)
     total_emis = current_emis + Decimal(str(new_emi))
     
     # Check if total EMIs exceed 50% of monthly salary
-    if total_emis > customer.monthly_salary * Decimal('0.5'):
+    if total_emis > profile['monthly_salary'] * Decimal('0.5'):
         return False, credit_score, None
     
     # Check credit score eligibility
@@ -1,19 +1,40 @@
+import json
+from itertools import chain, islice
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, FilteredRelation, Q
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
 from decimal import Decimal
-from datetime import date, timedelta
-from .models import Customer, Loan
+from .models import Customer, Loan, LoanApplication
+from .admission import HIGH, LOW, NORMAL, admitted
+from .amortization import iter_schedule_rows
+from .applications import application_status_data, apply_for_loan
+from .conditional import customer_loans_version, loan_version, versioned
+from .idempotency import idempotent
+from .renderers import FastJSONRenderer, encode_decimal
+from .routers import choose_replica, reads_from_replica, replica_reads
 from .serializers import *
+from .tasks import enqueue_loan_applications
 from .utils import (
+    batch_loan_eligibility,
     calculate_credit_score,
     calculate_monthly_installment,
-    check_loan_eligibility,
+    eligibility_from_profile,
+    get_credit_profile,
+    get_credit_profiles,
+    max_loan_amounts,
+    minimum_interest_rate,
+    read_credit_profile,
     round_to_nearest_lakh
 )
 
 
 @api_view(['POST'])
+@admitted(HIGH)
 def register_customer(request):
     """Register a new customer"""
     serializer = CustomerRegistrationSerializer(data=request.data)
@@ -32,119 +53,308 @@ def register_customer(request):
             approved_limit=approved_limit
         )
 
-        response_data = {
-            'customer_id': customer.customer_id,
-            'name': f"{customer.first_name} {customer.last_name}",
-            'age': customer.age,
-            'monthly_income': customer.monthly_salary,
-            'approved_limit': customer.approved_limit,
-            'phone_number': customer.phone_number
-        }
-
-        return Response(response_data, status=status.HTTP_201_CREATED)
+        return Response(registration_response_data(customer), status=status.HTTP_201_CREATED)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def registration_response_data(customer):
+    """register response body for a created customer"""
+    return {
+        'customer_id': customer.customer_id,
+        'name': f"{customer.first_name} {customer.last_name}",
+        'age': customer.age,
+        'monthly_income': customer.monthly_salary,
+        'approved_limit': customer.approved_limit,
+        'phone_number': customer.phone_number
+    }
+
+
 @api_view(['POST'])
+@admitted(HIGH)
+def register_customers_batch(request):
+    """Register a list of customers in one call"""
+    registrations = request.data
+    if not isinstance(registrations, list):
+        return Response(
+            {'error': 'Expected a list of customers'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(registrations) > settings.REGISTRATION_BATCH_MAX_SIZE:
+        return Response(
+            {'error': f'At most {settings.REGISTRATION_BATCH_MAX_SIZE} customers per batch'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    results = [None] * len(registrations)
+    valid = []
+    for index, registration in enumerate(registrations):
+        serializer = BulkCustomerRegistrationSerializer(data=registration)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = serializer.errors
+
+    # Phone numbers already registered, in one query; repeats within the batch
+    # keep their first row, as sequential registrations would
+    taken = _registered_phone_numbers(data['phone_number'] for _, data in valid)  # type: ignore
+    first_rows = {}
+    new_customers = []
+    for index, data in valid:
+        phone_number = data['phone_number']  # type: ignore
+        if phone_number in taken:
+            results[index] = {'phone_number': ['Phone number already exists.']}
+        elif phone_number in first_rows:
+            results[index] = {'phone_number': [f'Phone number repeats row {first_rows[phone_number]} of this batch.']}
+        else:
+            first_rows[phone_number] = index
+            new_customers.append((index, Customer(
+                first_name=data['first_name'],  # type: ignore
+                last_name=data['last_name'],  # type: ignore
+                age=data['age'],  # type: ignore
+                phone_number=phone_number,
+                monthly_salary=data['monthly_income'],  # type: ignore
+                approved_limit=round_to_nearest_lakh(36 * data['monthly_income'])  # type: ignore
+            )))
+
+    created = _create_customers(new_customers, results)
+    for index, customer in created:
+        results[index] = registration_response_data(customer)
+
+    return Response({'created': len(created), 'results': results}, status=status.HTTP_200_OK)
+
+
+def _registered_phone_numbers(phone_numbers):
+    return set(Customer.objects.filter(  # type: ignore
+        phone_number__in=list(phone_numbers)
+    ).values_list('phone_number', flat=True))
+
+
+def _create_customers(new_customers, results):
+    """bulk_create the (row, customer) pairs; returns those created
+
+    Rows whose phone number was registered concurrently, after the duplicate
+    check, get an error in results and the rest are inserted again.
+    """
+    while new_customers:
+        try:
+            with transaction.atomic():
+                Customer.objects.bulk_create([customer for _, customer in new_customers])  # type: ignore
+            return new_customers
+        except IntegrityError:
+            taken = _registered_phone_numbers(customer.phone_number for _, customer in new_customers)
+            if not taken:
+                raise
+            for index, customer in new_customers:
+                if customer.phone_number in taken:
+                    results[index] = {'phone_number': ['Phone number already exists.']}
+            new_customers = [
+                (index, customer) for index, customer in new_customers if customer.phone_number not in taken
+            ]
+    return []
+
+
+@api_view(['POST'])
+@admitted(LOW)
 def check_eligibility(request):
     """Check loan eligibility for a customer"""
     serializer = LoanEligibilitySerializer(data=request.data)
     if serializer.is_valid():
         data = serializer.validated_data  # type: ignore
 
-        try:
-            customer = Customer.objects.get(customer_id=data['customer_id'])  # type: ignore
-        except Customer.DoesNotExist:  # type: ignore
+        # Cached per customer, so repeated checks skip the database. Replicas take
+        # the write-free path; on the primary a stale summary is refreshed.
+        replica = choose_replica(customer_id=data['customer_id'])  # type: ignore
+        with replica_reads(replica):
+            profile = (read_credit_profile if replica else get_credit_profile)(data['customer_id'])  # type: ignore
+        if profile is None:
             return Response(
                 {'error': 'Customer not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Check loan eligibility
-        is_eligible, credit_score, corrected_rate = check_loan_eligibility(
-            customer,
-            data['loan_amount'],  # type: ignore
-            data['interest_rate'],  # type: ignore
-            data['tenure']  # type: ignore
+        return Response(eligibility_response_data(profile, data), status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+def eligibility_response_data(profile, data):
+    """check-eligibility response body for validated request data"""
+    # Check loan eligibility
+    is_eligible, credit_score, corrected_rate = eligibility_from_profile(
+        profile,
+        data['loan_amount'],
+        data['interest_rate'],
+        data['tenure']
+    )
+
+    # Calculate monthly installment
+    interest_rate_to_use = corrected_rate if corrected_rate else data['interest_rate']
+    monthly_installment = calculate_monthly_installment(
+        data['loan_amount'],
+        data['tenure'],
+        interest_rate_to_use
+    )
+
+    return {
+        'customer_id': data['customer_id'],
+        'approval': is_eligible,
+        'interest_rate': float(data['interest_rate']),
+        'corrected_interest_rate': float(corrected_rate) if corrected_rate else None,
+        'tenure': data['tenure'],
+        'monthly_installment': monthly_installment
+    }
+
+
+@api_view(['POST'])
+@admitted(LOW)
+def check_eligibility_batch(request):
+    """Check loan eligibility for a list of applications in one call"""
+    applications = request.data
+    if not isinstance(applications, list):
+        return Response(
+            {'error': 'Expected a list of applications'},
+            status=status.HTTP_400_BAD_REQUEST
         )
+    if len(applications) > settings.ELIGIBILITY_BATCH_MAX_SIZE:
+        return Response(
+            {'error': f'At most {settings.ELIGIBILITY_BATCH_MAX_SIZE} applications per batch'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    results = [None] * len(applications)
+    valid = []
+    for index, application in enumerate(applications):
+        serializer = LoanEligibilitySerializer(data=application)
+        if not serializer.is_valid():
+            results[index] = serializer.errors
+        elif serializer.validated_data['tenure'] < 1:  # type: ignore
+            results[index] = {'tenure': ['Ensure this value is greater than or equal to 1.']}
+        else:
+            valid.append((index, serializer.validated_data))
+
+    # Profiles for every referenced customer come from one cache round-trip plus bulk queries
+    profiles = get_credit_profiles(data['customer_id'] for _, data in valid)  # type: ignore
+    known = []
+    for index, data in valid:
+        if data['customer_id'] in profiles:  # type: ignore
+            known.append((index, data))
+        else:
+            results[index] = {'customer_id': data['customer_id'], 'error': 'Customer not found'}  # type: ignore
 
-        # Calculate monthly installment
-        interest_rate_to_use = corrected_rate if corrected_rate else data['interest_rate']  # type: ignore
-        monthly_installment = calculate_monthly_installment(
-            data['loan_amount'],  # type: ignore
-            data['tenure'],  # type: ignore
-            interest_rate_to_use
+    if known:
+        approved, _, monthly_installments = batch_loan_eligibility(
+            [profiles[data['customer_id']] for _, data in known],  # type: ignore
+            [data['loan_amount'] for _, data in known],  # type: ignore
+            [data['interest_rate'] for _, data in known],  # type: ignore
+            [data['tenure'] for _, data in known]  # type: ignore
         )
+        for (index, data), is_eligible, monthly_installment in zip(
+            known, approved.tolist(), monthly_installments.tolist()
+        ):
+            # Approved applications keep their requested rate, as in check_eligibility
+            corrected_rate = data['interest_rate'] if is_eligible else None  # type: ignore
+            results[index] = {
+                'customer_id': data['customer_id'],  # type: ignore
+                'approval': is_eligible,
+                'interest_rate': float(data['interest_rate']),  # type: ignore
+                'corrected_interest_rate': float(corrected_rate) if corrected_rate else None,
+                'tenure': data['tenure'],  # type: ignore
+                'monthly_installment': monthly_installment
+            }
 
-        response_data = {
-            'customer_id': data['customer_id'],  # type: ignore
-            'approval': is_eligible,
-            'interest_rate': float(data['interest_rate']),  # type: ignore
-            'corrected_interest_rate': float(corrected_rate) if corrected_rate else None,
-            'tenure': data['tenure'],  # type: ignore
-            'monthly_installment': monthly_installment
-        }
+    return Response({'results': results}, status=status.HTTP_200_OK)
 
-        return Response(response_data, status=status.HTTP_200_OK)
 
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+@api_view(['GET'])
+@admitted(LOW)
+def loan_offer(request, customer_id):
+    """Largest approvable loan amount for each tenure in a grid"""
+    serializer = LoanOfferSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data  # type: ignore
+
+    replica = choose_replica(customer_id=customer_id)
+    with replica_reads(replica):
+        profile = (read_credit_profile if replica else get_credit_profile)(customer_id)
+    if profile is None:
+        return Response(
+            {'error': 'Customer not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    tenures = data.get('tenures') or settings.OFFER_TENURES  # type: ignore
+    return Response(
+        offer_response_data(profile, customer_id, data['interest_rate'], tenures),  # type: ignore
+        status=status.HTTP_200_OK
+    )
+
+
+def offer_response_data(profile, customer_id, interest_rate, tenures):
+    """offer response body: the EMI formula solved for the amount at every tenure at once"""
+    minimum_rate = minimum_interest_rate(profile['credit_score'])
+    # Same 50%-of-salary rule as eligibility_from_profile
+    headroom = profile['monthly_salary'] * Decimal('0.5') - profile['current_emis']
+    if minimum_rate is None:
+        rate = interest_rate
+        amounts = monthly_installments = [0.0] * len(tenures)
+    else:
+        rate = max(interest_rate, Decimal(str(minimum_rate)))
+        amounts, monthly_installments = max_loan_amounts(headroom, tenures, rate)
+        amounts, monthly_installments = amounts.tolist(), monthly_installments.tolist()
+
+    return {
+        'customer_id': customer_id,
+        'approval': any(amount > 0 for amount in amounts),
+        'interest_rate': float(interest_rate),
+        'corrected_interest_rate': float(rate) if rate != interest_rate else None,
+        'minimum_interest_rate': minimum_rate,
+        'monthly_headroom': float(max(headroom, Decimal('0'))),
+        'offers': [
+            {'tenure': tenure, 'max_loan_amount': amount, 'monthly_installment': monthly_installment}
+            for tenure, amount, monthly_installment in zip(tenures, amounts, monthly_installments)
+        ]
+    }
 
 
 @api_view(['POST'])
+@admitted(HIGH)
+@idempotent('create-loan')
 def create_loan(request):
     """Create a new loan"""
     serializer = LoanCreationSerializer(data=request.data)
     if serializer.is_valid():
         data = serializer.validated_data  # type: ignore
 
-        try:
-            customer = Customer.objects.get(customer_id=data['customer_id'])  # type: ignore
-        except Customer.DoesNotExist:  # type: ignore
-            return Response(
-                {'error': 'Customer not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        # The customer row lock serializes applications per customer, so two
+        # concurrent requests cannot both pass the EMI check; other customers
+        # are not blocked.
+        with transaction.atomic():
+            customer = Customer.objects.select_for_update().filter(  # type: ignore
+                customer_id=data['customer_id']  # type: ignore
+            ).first()
+            if customer is None:
+                return Response(
+                    {'error': 'Customer not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
 
-        # Check eligibility
-        is_eligible, credit_score, corrected_rate = check_loan_eligibility(
-            customer,
-            data['loan_amount'],  # type: ignore
-            data['interest_rate'],  # type: ignore
-            data['tenure']  # type: ignore
-        )
-
-        if not is_eligible:
-            return Response({
-                'loan_id': None,
-                'customer_id': data['customer_id'],  # type: ignore
-                'loan_approved': False,
-                'message': 'Loan not approved due to low credit score or high current EMI',
-                'monthly_installment': 0
-            }, status=status.HTTP_200_OK)
-
-        # Calculate monthly installment
-        interest_rate_to_use = corrected_rate if corrected_rate else data['interest_rate']  # type: ignore
-        monthly_installment = calculate_monthly_installment(
-            data['loan_amount'],  # type: ignore
-            data['tenure'],  # type: ignore
-            interest_rate_to_use
-        )
+            loan, monthly_installment = apply_for_loan(
+                customer,
+                data['loan_amount'],  # type: ignore
+                data['interest_rate'],  # type: ignore
+                data['tenure']  # type: ignore
+            )
 
-        # Create loan
-        start_date = date.today()
-        end_date = start_date + timedelta(days=data['tenure'] * 30)  # Approximate  # type: ignore
-
-        loan = Loan.objects.create(  # type: ignore
-            customer=customer,
-            loan_amount=data['loan_amount'],  # type: ignore
-            tenure=data['tenure'],  # type: ignore
-            interest_rate=interest_rate_to_use,
-            monthly_repayment=Decimal(str(monthly_installment)),
-            emis_paid_on_time=0,  # Initialize to 0 for new loans
-            start_date=start_date,
-            end_date=end_date
-        )
+            if loan is None:
+                return Response({
+                    'loan_id': None,
+                    'customer_id': data['customer_id'],  # type: ignore
+                    'loan_approved': False,
+                    'message': 'Loan not approved due to low credit score or high current EMI',
+                    'monthly_installment': 0
+                }, status=status.HTTP_200_OK)
 
         return Response({
             'loan_id': loan.loan_id,
@@ -157,30 +367,209 @@ def create_loan(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@admitted(HIGH)
+@idempotent('loan-application')
+def submit_loan_application(request):
+    """Queue a loan application for a worker to decide; poll its status URL for the outcome"""
+    serializer = LoanCreationSerializer(data=request.data)
+    if serializer.is_valid():
+        data = serializer.validated_data  # type: ignore
+        if not Customer.objects.filter(customer_id=data['customer_id']).exists():  # type: ignore
+            return Response(
+                {'error': 'Customer not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        with transaction.atomic():
+            application = LoanApplication.objects.create(  # type: ignore
+                customer_id=data['customer_id'],  # type: ignore
+                loan_amount=data['loan_amount'],  # type: ignore
+                interest_rate=data['interest_rate'],  # type: ignore
+                tenure=data['tenure']  # type: ignore
+            )
+            # Queued once the row is visible to the worker
+            transaction.on_commit(lambda: enqueue_loan_applications(application.customer_id))
+
+        status_url = reverse('view_loan_application', args=[application.pk])
+        return Response({
+            'application_id': application.pk,
+            'customer_id': application.customer_id,
+            'status': application.status,
+            'status_url': request.build_absolute_uri(status_url)
+        }, status=status.HTTP_202_ACCEPTED, headers={'Location': status_url})
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(['GET'])
+@admitted(LOW)
+def view_loan_application(request, application_id):
+    """Status of a queued loan application, with the loan once approved"""
+    application = LoanApplication.objects.filter(pk=application_id).first()  # type: ignore
+    if application is None:
+        return Response(
+            {'error': 'Loan application not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return Response(application_status_data(application), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@renderer_classes([FastJSONRenderer])
+@admitted(NORMAL)
+@reads_from_replica('loan')
+@versioned('loan', loan_version)
 def view_loan(request, loan_id):
     """View loan details"""
-    try:
-        loan = Loan.objects.select_related('customer').get(loan_id=loan_id)  # type: ignore
-        serializer = LoanDetailSerializer(loan)
-        return Response(serializer.data, status=status.HTTP_200_OK)  # type: ignore
-    except Loan.DoesNotExist:  # type: ignore
+    # Same payload as LoanDetailSerializer, built from one .values() row
+    loan = loan_detail_data(Loan.objects.filter(loan_id=loan_id))  # type: ignore
+    if loan is None:
         return Response(
             {'error': 'Loan not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+    return Response(loan, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@admitted(NORMAL)
+def view_loan_schedule(request, loan_id):
+    """Stream a loan's amortization schedule as one JSON object per line"""
+    loan = Loan.objects.filter(loan_id=loan_id).values(  # type: ignore
+        'loan_amount', 'tenure', 'interest_rate', 'monthly_repayment'
+    ).first()
+    if loan is None:
+        return Response(
+            {'error': 'Loan not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    rows = iter_schedule_rows(
+        loan['loan_amount'],
+        loan['tenure'],
+        loan['interest_rate'],
+        loan['monthly_repayment']
+    )
+    return StreamingHttpResponse(
+        (json.dumps(row) + '\n' for row in rows),
+        content_type='application/x-ndjson'
+    )
 
 
 @api_view(['GET'])
+@renderer_classes([FastJSONRenderer])
+@admitted(NORMAL)
+@reads_from_replica('customer')
+@versioned('customer-loans', customer_loans_version)
 def view_customer_loans(request, customer_id):
-    """View all loans for a customer"""
+    """View all loans for a customer
+
+    ?page_size=N and ?cursor=<last loan_id> page through the loans in loan_id order;
+    ?stream=true streams them as one JSON object per line.
+    """
     try:
-        customer = Customer.objects.get(customer_id=customer_id)  # type: ignore
-        loans = Loan.objects.filter(customer=customer)  # type: ignore
-        serializer = CustomerLoanSerializer(loans, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)  # type: ignore
-    except Customer.DoesNotExist:  # type: ignore
+        cursor, page_size = _loans_page_params(request.query_params)
+    except ValueError:
+        return Response(
+            {'error': 'cursor and page_size must be positive integers'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    rows = _customer_loan_rows(customer_id, cursor)
+    if _wants_stream(request.query_params):
+        return _stream_customer_loans(rows)
+
+    if page_size is not None:
+        rows = rows[:page_size + 1]  # One extra row tells whether another page follows
+    rows = list(rows)
+    if not rows:
+        return Response(
+            {'error': 'Customer not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return Response(_customer_loans_payload(rows, page_size), status=status.HTTP_200_OK)
+
+
+# Items carry the CustomerLoanSerializer fields, read straight from the join
+CUSTOMER_LOAN_FIELDS = CustomerLoanSerializer.Meta.fields
+
+
+def _customer_loan_rows(customer_id, after=None):
+    """A customer's loans after a loan_id, in one query
+
+    The loans are LEFT JOINed onto the customer row, so an unknown customer yields
+    no rows and a customer without (further) loans yields a single all-NULL row.
+    """
+    condition = Q(loans__loan_id__gt=after) if after is not None else Q()
+    return Customer.objects.filter(customer_id=customer_id).annotate(  # type: ignore
+        loan=FilteredRelation('loans', condition=condition)
+    ).annotate(
+        repayments_left=F('loan__tenure') - F('loan__emis_paid_on_time')
+    ).values_list(*[
+        field if field == 'repayments_left' else f'loan__{field}'
+        for field in CUSTOMER_LOAN_FIELDS
+    ]).order_by('loan__loan_id')
+
+
+def _loan_items(rows):
+    return [dict(zip(CUSTOMER_LOAN_FIELDS, row)) for row in rows if row[0] is not None]
+
+
+def _customer_loans_payload(rows, page_size=None):
+    """The plain list, or a page of it when page_size is set"""
+    loans = _loan_items(rows)
+    if page_size is None:
+        return loans
+    page = loans[:page_size]
+    return {
+        'results': page,
+        'next_cursor': page[-1]['loan_id'] if len(loans) > page_size else None,
+    }
+
+
+def _loans_page_params(params):
+    """cursor and effective page_size from query parameters; page_size is None when not paginating"""
+    cursor = _positive_int_param(params, 'cursor')
+    page_size = _positive_int_param(params, 'page_size')
+    if cursor is not None or page_size is not None:
+        page_size = min(page_size or settings.VIEW_LOANS_PAGE_SIZE, settings.VIEW_LOANS_MAX_PAGE_SIZE)
+    return cursor, page_size
+
+
+def _wants_stream(params):
+    return params.get('stream', '').lower() in ('1', 'true')
+
+
+def _stream_customer_loans(rows):
+    chunk_size = settings.VIEW_LOANS_STREAM_CHUNK_SIZE
+    rows = rows.iterator(chunk_size=chunk_size)
+    # The first row is fetched up front so an unknown customer still gets a 404
+    first = next(rows, None)
+    if first is None:
         return Response(
             {'error': 'Customer not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+
+    def lines():
+        remaining = chain([first], rows)
+        while chunk := list(islice(remaining, chunk_size)):
+            yield from _ndjson_lines(chunk)
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+def _ndjson_lines(rows):
+    for item in _loan_items(rows):
+        yield json.dumps(item, default=encode_decimal) + '\n'
+
+
+def _positive_int_param(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    value = int(value)
+    if value < 1:
+        raise ValueError(name)
+    return value